@@ -0,0 +1,43 @@
+import argparse
+import os
+
+from modules.batch import BatchRunner, FORMATS
+from modules.collection import load_levels
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Solve a directory or collection of levels')
+    parser.add_argument('levels', help='A map directory or a multi-level .xsb/.sok/.txt file')
+    parser.add_argument('--output', help='The results file', default='results.jsonl')
+    parser.add_argument('--format', help='The results format', choices=FORMATS)
+    parser.add_argument(
+        '--strategy', help='The strategy to solve the levels', default='astar')
+    parser.add_argument(
+        '--mode', help='Search single moves or whole pushes', choices=['move', 'push'],
+        default='push')
+    parser.add_argument(
+        '--heuristic', help='The heuristic of the informed strategies',
+        choices=['hungarian', 'greedy', 'manhattan'], default='hungarian')
+    parser.add_argument(
+        '--optimize', help='Shorten each solution by re-solving windows of it',
+        action='store_true')
+    parser.add_argument('--workers', help='Number of levels solved at once', type=int)
+    parser.add_argument('--timeout', help='Time limit per level in seconds', type=float)
+    parser.add_argument('--memory', help='Memory limit per level in MB', type=int)
+    parser.add_argument(
+        '--resume', help='Skip levels already in the results file and append to it',
+        action='store_true')
+    parser.add_argument(
+        '--level-cache', help='Directory keeping compiled levels, so their tables load from disk')
+    args = parser.parse_args()
+
+    format = args.format
+    if format is None:
+        format = 'csv' if os.path.splitext(args.output)[1].lower() == '.csv' else 'jsonl'
+    config = {'strategy': args.strategy, 'mode': args.mode, 'heuristic': args.heuristic,
+              'optimize': args.optimize}
+    runner = BatchRunner(load_levels(args.levels), args.output, format, config,
+                         args.workers, args.timeout, args.memory, args.resume,
+                         args.level_cache)
+    written = runner.run()
+    print("Results written:", written)
@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from modules.benchmark import Benchmark, compare, load_corpus, load_results, save_results
+from modules.portfolio import parse_members
+
+DEFAULT_STRATEGIES = 'astar:push:hungarian,astar:push:greedy,idastar:push:hungarian,astar:move:hungarian'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark solver strategies on a pinned corpus')
+    parser.add_argument('--corpus', help='The corpus manifest', default='benchmarks/corpus.json')
+    parser.add_argument(
+        '--strategies', help='Configurations as strategy[:mode[:heuristic]],...',
+        default=DEFAULT_STRATEGIES)
+    parser.add_argument('--tier', help='Only run levels of this tier', action='append')
+    parser.add_argument('--timeout', help='Time limit per case in seconds', type=float, default=60)
+    parser.add_argument('--repeat', help='Runs per case; the median time is kept', type=int, default=1)
+    parser.add_argument('--output', help='Where to write the results', default='benchmarks/results.json')
+    parser.add_argument('--baseline', help='A stored baseline to compare against')
+    parser.add_argument(
+        '--threshold', help='Allowed relative slowdown before flagging a regression', type=float,
+        default=0.1)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if args.tier:
+        corpus = [level for level in corpus if level['tier'] in args.tier]
+    benchmark = Benchmark(corpus, parse_members(args.strategies), args.timeout, args.repeat)
+
+    def report(name, result):
+        print(name, result['status'], round(result['time'], 3), result['expanded_states'],
+              result['peak_rss_kb'], result['moves'])
+
+    results = benchmark.run(report)
+    save_results(results, args.output)
+    print("Results written:", args.output)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for regression in regressions:
+            print("Regression:", regression)
+        if regressions:
+            sys.exit(1)
@@ -1,18 +1,34 @@
 import argparse
+import signal
+import sys
 
+from modules.checkpoint import Checkpoint
+from modules.collection import parse_levels
 from modules.game_state import GameState
-from modules.game_visualization import GameVisualization
+from modules.instrumentation import Instrumentation, print_progress
+from modules.level_compiler import LevelCache, load_level
+from modules.portfolio import Portfolio, DEFAULT_MEMBERS, parse_members
+from modules.solution_cache import SolutionCache
 from modules.solver import Solver
 
 
 def load_map(map_path):
-    """Load the map from the given path"""
-    f = open(map_path, 'r')
-    map = []
-    for line in f:
-        map.append(list(line.strip()))
-    f.close()
-    return map
+    """Load the first map of the given file, which may also be a collection"""
+    with open(map_path, 'r') as f:
+        levels = parse_levels(f.read())
+    if not levels:
+        raise Exception('No level in %s' % map_path)
+    return levels[0][1]
+
+
+def print_result(solver):
+    """Print the solution and statistics of a finished solver"""
+    print("Solution:", solver.get_solution())
+    print("Stats:", solver.stats)
+    if solver.portfolio_report is not None:
+        for report in solver.portfolio_report:
+            print("Member:", report)
+        print("Winner:", solver.portfolio_winner)
 
 
 if __name__ == '__main__':
@@ -20,15 +36,122 @@ if __name__ == '__main__':
     parser.add_argument('--map', help='The map file', default='maps/demo.txt')
     parser.add_argument(
         '--strategy', help='The strategy to solve the game', default='astar')
+    parser.add_argument(
+        '--mode', help='Search single moves or whole pushes', choices=['move', 'push'],
+        default='move')
+    parser.add_argument(
+        '--heuristic', help='The heuristic of the informed strategies',
+        choices=['hungarian', 'greedy', 'manhattan'], default='hungarian')
+    parser.add_argument(
+        '--compact-paths', help='Pack expanded nodes into a move trail to save memory',
+        action='store_true')
+    parser.add_argument(
+        '--table-memory', help='Transposition table size of idastar, in MB', type=int,
+        default=64)
+    parser.add_argument(
+        '--members', help='Portfolio members as strategy[:mode[:heuristic]],...')
+    parser.add_argument(
+        '--workers', help='Number of worker processes of portfolio and hdastar', type=int)
+    parser.add_argument(
+        '--deadline', help='Deadline in seconds of portfolio and anytime', type=float)
+    parser.add_argument(
+        '--best', help='Let the portfolio return the shortest solution found before the deadline',
+        action='store_true')
+    parser.add_argument(
+        '--progress', help='Print search progress every given number of seconds', type=float)
+    parser.add_argument(
+        '--phase-timing', help='Time move generation, heuristic and hashing separately',
+        action='store_true')
+    parser.add_argument('--profile', help='Write cProfile stats of the solve to this file')
+    parser.add_argument(
+        '--trace-memory', help='Record the peak traced memory of the solve',
+        action='store_true')
+    parser.add_argument('--cache', help='SQLite file caching solutions across runs')
+    parser.add_argument(
+        '--cache-size', help='Size limit of the solution cache, in MB', type=int, default=64)
+    parser.add_argument(
+        '--memory-budget', help='RAM for buffered states of the external strategy, in MB',
+        type=int, default=256)
+    parser.add_argument('--spill-dir', help='Directory for the state files of the external strategy')
+    parser.add_argument(
+        '--batch-size', help='Expand this many nodes at once in astar (needs NumPy)', type=int)
+    parser.add_argument(
+        '--weight', help='Heuristic weight of wastar and the first round of anytime', type=float,
+        default=2.0)
+    parser.add_argument(
+        '--weight-step', help='How much anytime lowers the weight each round', type=float,
+        default=0.5)
+    parser.add_argument(
+        '--tie-break', help='Order of equal-f nodes in astar and ucs: lowest h first or LIFO',
+        choices=['h', 'lifo'], default='h')
+    parser.add_argument('--checkpoint', help='File the astar or ucs search is saved to periodically')
+    parser.add_argument(
+        '--checkpoint-interval', help='Seconds between two checkpoint saves', type=float,
+        default=60.0)
+    parser.add_argument(
+        '--full-every', help='Rewrite the checkpoint in full every this many saves', type=int,
+        default=10)
+    parser.add_argument(
+        '--resume', help='Continue from the snapshot in the checkpoint file, if there is one',
+        action='store_true')
+    parser.add_argument(
+        '--macros', help='Collapse tunnel and goal-room pushes into macro steps (push mode)',
+        action='store_true')
+    parser.add_argument(
+        '--optimize', help='Shorten the solution found by re-solving windows of it',
+        action='store_true')
+    parser.add_argument(
+        '--optimize-time', help='Seconds --optimize may spend before it keeps its best result',
+        type=float)
+    parser.add_argument(
+        '--level-cache', help='Directory keeping compiled levels, so their tables load from disk')
+    parser.add_argument(
+        '--no-gui', help='Solve and print the result without opening a window',
+        action='store_true')
     args = parser.parse_args()
 
     map = load_map(args.map)
+    level = load_level(map, LevelCache(args.level_cache) if args.level_cache else None)
+    for problem in level.problems:
+        print("Warning:", problem, file=sys.stderr)
 
-    game_state = GameState(map)
+    game_state = GameState(level)
     strategy = args.strategy
-    solver = Solver(game_state, strategy)
-    solver.solve()
-    solution = solver.get_solution()
-  
-    game_visualization = GameVisualization(game_state, solution)
-    game_visualization.start()
+    members = parse_members(args.members) if args.members else DEFAULT_MEMBERS
+    portfolio = Portfolio(members, args.workers, args.deadline, args.best)
+    instrumentation = None
+    if args.progress is not None or args.phase_timing:
+        instrumentation = Instrumentation(args.progress or 1.0, phase_timing=args.phase_timing)
+        if args.progress is not None:
+            instrumentation.add_hook(print_progress)
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval, args.full_every)
+    cache = SolutionCache(args.cache, args.cache_size * 1024 * 1024) if args.cache else None
+    solver = Solver(game_state, strategy, args.mode, heuristic=args.heuristic,
+                    compact_paths=args.compact_paths, table_memory=args.table_memory,
+                    portfolio=portfolio, workers=args.workers, instrumentation=instrumentation,
+                    profile=args.profile, trace_memory=args.trace_memory, cache=cache,
+                    memory_budget=args.memory_budget, spill_dir=args.spill_dir,
+                    batch_size=args.batch_size, weight=args.weight,
+                    weight_step=args.weight_step, deadline=args.deadline, macros=args.macros,
+                    optimize=args.optimize, optimize_time=args.optimize_time,
+                    tie_break=args.tie_break,
+                    checkpoint=checkpoint, resume=args.resume)
+    if checkpoint is not None:
+        # A preempted job gets SIGTERM. The handler runs in the main thread, which
+        # is the window's in GUI mode, so it only asks the solver to save and return
+        signal.signal(signal.SIGTERM, lambda signum, frame: solver.stop())
+    if args.no_gui:
+        solver.solve()
+        print_result(solver)
+        if solver.stats.stopped:
+            sys.exit(1)
+    else:
+        # pygame is only imported when a window is opened
+        from modules.game_visualization import GameVisualization
+
+        # The window opens at once and the solver runs in the background
+        game_visualization = GameVisualization(game_state, solver=solver,
+                                               on_solved=print_result)
+        game_visualization.start()
@@ -0,0 +1,195 @@
+# Headless batch solving of level sets
+# Every level is solved in its own worker process with a time and memory
+# limit, and results are streamed to a JSON Lines or CSV file as they finish,
+# so an interrupted run can be resumed without solving finished levels again.
+#
+# Path: modules/batch.py
+
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows, where memory_limit is ignored
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('id', 'title', 'status', 'solution', 'moves', 'pushes',
+          'expanded_states', 'generated_states', 'time')
+
+# How often the runner checks worker deadlines
+POLL_INTERVAL = 0.1
+
+
+def solve_level(level_id, title, map, config, memory_limit, level_cache, results):
+    """Solve one level in a worker process and report the result to the queue
+
+    Levels that fail validation are reported as 'invalid' without searching.
+    """
+    # Imported here so the worker pays for the solver only after the fork
+    from modules.game_state import GameState
+    from modules.level_compiler import LevelCache, load_level
+    from modules.replay import replay, to_lurd
+    from modules.solver import Solver
+
+    sys.stdout = open(os.devnull, 'w')
+    if memory_limit and resource is not None:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    result = dict.fromkeys(FIELDS)
+    result.update(id=level_id, title=title)
+    try:
+        try:
+            level = load_level(map, LevelCache(level_cache) if level_cache else None)
+        except Exception:
+            level = None
+        if level is None or level.problems:
+            result['status'] = 'invalid'
+            results.put(result)
+            return
+        state = GameState(level)
+        solver = Solver(state, **config)
+        solver.solve()
+        solution = solver.get_solution()
+        result.update(time=round(solver.time, 3), expanded_states=solver.expanded_states,
+                      generated_states=solver.generated_states)
+        if solution is None:
+            result['status'] = 'unsolved'
+        else:
+            _, pushes = replay(state, solution)
+            result.update(status='solved', solution=to_lurd(state, solution),
+                          moves=len(solution), pushes=pushes)
+    except MemoryError:
+        result['status'] = 'memory'
+    results.put(result)
+
+
+def read_finished(path, format):
+    """Get the ids of the levels already recorded in an output file"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', newline='') as f:
+        if format == 'csv':
+            return set(row['id'] for row in csv.DictReader(f))
+        finished = set()
+        for line in f:
+            try:
+                finished.add(json.loads(line)['id'])
+            except ValueError:
+                pass  # A line cut short by a crash; the level is solved again
+        return finished
+
+
+class BatchRunner(object):
+    """Solve a list of (level_id, title, map) levels in parallel
+
+    Each result is written and flushed as soon as its level finishes. With
+    resume=True, levels already present in the output file are skipped and
+    new results are appended. With a level_cache directory, compiled levels
+    are shared between workers and runs.
+    """
+
+    def __init__(self, levels, output, format='jsonl', config=None, workers=None,
+                 timeout=None, memory_limit=None, resume=False, level_cache=None):
+        if format not in FORMATS:
+            raise Exception('Invalid format')
+        self.levels = levels
+        self.output = output
+        self.format = format
+        self.config = config or {}
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.resume = resume
+        self.level_cache = level_cache
+
+    def run(self):
+        """Solve every pending level and return the number of results written"""
+        finished = read_finished(self.output, self.format) if self.resume else set()
+        pending = [level for level in self.levels if level[0] not in finished]
+        append = self.resume and os.path.exists(self.output)
+        with open(self.output, 'a' if append else 'w', newline='') as f:
+            writer = None
+            if self.format == 'csv':
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                if not append:
+                    writer.writeheader()
+            return self.solve_all(pending, f, writer)
+
+    def write(self, f, writer, result):
+        """Append one result to the output and flush it to disk"""
+        if writer is not None:
+            writer.writerow(result)
+        else:
+            f.write(json.dumps(result) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    def solve_all(self, pending, f, writer):
+        """Run the worker processes, enforcing the per-level timeout
+
+        A worker stopped at its timeout may already have queued its result;
+        that result arrives after the timeout was written and is dropped.
+        """
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        running = {}
+        done = set()  # Ids whose result is written
+        written = 0
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    level_id, title, map = pending.pop(0)
+                    process = context.Process(
+                        target=solve_level,
+                        args=(level_id, title, map, self.config, self.memory_limit,
+                              self.level_cache, results))
+                    process.daemon = True
+                    process.start()
+                    running[level_id] = (process, title, time.time())
+
+                try:
+                    result = results.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    result = None
+                if result is not None:
+                    entry = running.pop(result['id'], None)
+                    if entry is not None:
+                        entry[0].join()
+                    if result['id'] not in done:
+                        done.add(result['id'])
+                        self.write(f, writer, result)
+                        written += 1
+                    continue
+
+                for level_id, (process, title, start_time) in list(running.items()):
+                    status = None
+                    if self.timeout is not None and time.time() - start_time > self.timeout:
+                        process.terminate()
+                        status = 'timeout'
+                    elif not process.is_alive():
+                        # Whatever an exited worker queued is in the pipe by now
+                        process.join()
+                        if results.empty():
+                            status = 'error'
+                    if status is None:
+                        continue
+                    process.join()
+                    del running[level_id]
+                    done.add(level_id)
+                    result = dict.fromkeys(FIELDS)
+                    result.update(id=level_id, title=title, status=status,
+                                  time=round(time.time() - start_time, 3))
+                    self.write(f, writer, result)
+                    written += 1
+        finally:
+            for process, _, _ in running.values():
+                process.terminate()
+                process.join()
+            results.close()
+        return written
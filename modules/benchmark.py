@@ -0,0 +1,200 @@
+# Reproducible solver benchmarks
+# Runs every strategy configuration on a pinned corpus of levels, records
+# wall time, search effort, peak memory and solution length, and compares the
+# results with a stored baseline to flag regressions.
+#
+# Path: modules/benchmark.py
+
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import statistics
+import sys
+import time
+
+# Metrics where a higher value than the baseline is a regression
+COST_METRICS = ('time', 'expanded_states', 'generated_states', 'peak_rss_kb', 'moves')
+# Timing differences below this many seconds are treated as noise
+TIME_NOISE = 0.05
+# Seconds between checks that a case's process is still alive
+POLL_INTERVAL = 0.5
+
+
+def file_digest(path):
+    """Get the SHA-256 of a file's contents"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_corpus(manifest_path):
+    """Load the levels listed in a corpus manifest
+
+    Paths in the manifest are relative to the manifest's directory. Every
+    file must still match its pinned SHA-256, otherwise results would not be
+    comparable with older runs.
+    """
+    from modules.collection import load_levels
+
+    root = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    corpus = []
+    for entry in manifest['levels']:
+        path = os.path.normpath(os.path.join(root, entry['path']))
+        if file_digest(path) != entry['sha256']:
+            raise Exception('Corpus level %s does not match its pinned digest' % entry['id'])
+        _, _, map = load_levels(path)[0]
+        corpus.append({'id': entry['id'], 'tier': entry['tier'], 'map': map})
+    return corpus
+
+
+def run_case(map, config, results):
+    """Solve one level with one configuration in a fresh process and report metrics
+
+    peak_rss_kb is how far the solve raised the process's peak RSS above what
+    it held before, so the interpreter and what a forked child shares with
+    its parent are not counted.
+    """
+    from modules.game_state import GameState
+    from modules.instrumentation import peak_rss_kb
+    from modules.replay import replay
+    from modules.solver import Solver
+
+    sys.stdout = open(os.devnull, 'w')
+    baseline = peak_rss_kb()
+    state = GameState(map)
+    solver = Solver(state, **config)
+    start_time = time.perf_counter()
+    solver.solve()
+    elapsed = time.perf_counter() - start_time
+    peak = peak_rss_kb()
+    solution = solver.get_solution()
+    result = {
+        'status': 'solved' if solution is not None else 'unsolved',
+        'time': elapsed,
+        'expanded_states': solver.expanded_states,
+        'generated_states': solver.generated_states,
+        'peak_rss_kb': peak - baseline if peak is not None else None,
+        'moves': None,
+        'pushes': None,
+    }
+    if solution is not None:
+        result['moves'] = len(solution)
+        result['pushes'] = replay(state, solution)[1]
+    results.put(result)
+
+
+def case_name(level_id, config):
+    """Get the key of a strategy x level case in the results"""
+    return '%s|%s' % (level_id, ':'.join(config[key] for key in ('strategy', 'mode', 'heuristic')
+                                         if key in config))
+
+
+class Benchmark(object):
+    """Run every configuration on every corpus level
+
+    Each case runs in its own process, so peak RSS is measured per case and
+    a timeout can stop it. With repeat > 1 the median wall time is kept.
+    """
+
+    def __init__(self, corpus, configs, timeout=None, repeat=1):
+        self.corpus = corpus
+        self.configs = configs
+        self.timeout = timeout
+        self.repeat = repeat
+
+    def run(self, report=None):
+        """Run all cases and return the results document"""
+        cases = {}
+        for level in self.corpus:
+            for config in self.configs:
+                name = case_name(level['id'], config)
+                runs = [self.run_once(level['map'], config) for _ in range(self.repeat)]
+                result = dict(runs[0])
+                result['time'] = round(statistics.median(run['time'] for run in runs), 4)
+                result['tier'] = level['tier']
+                cases[name] = result
+                if report is not None:
+                    report(name, result)
+        return {
+            'meta': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'timeout': self.timeout,
+                'repeat': self.repeat,
+            },
+            'cases': cases,
+        }
+
+    def run_once(self, map, config):
+        """Run a single case, returning a 'timeout' or 'error' result on failure
+
+        The process is checked every POLL_INTERVAL seconds, so one that dies
+        without a result is reported at once, even with no timeout.
+        """
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        process = context.Process(target=run_case, args=(map, config, results))
+        process.start()
+        start_time = time.perf_counter()
+        try:
+            while True:
+                elapsed = time.perf_counter() - start_time
+                if self.timeout is not None and elapsed >= self.timeout:
+                    status = 'timeout'
+                    break
+                wait = POLL_INTERVAL
+                if self.timeout is not None:
+                    wait = min(wait, self.timeout - elapsed)
+                alive = process.is_alive()
+                try:
+                    return results.get(timeout=wait)
+                except queue.Empty:
+                    # A result put just before exiting has been read by now
+                    if not alive:
+                        status = 'error'
+                        break
+            return {'status': status, 'time': time.perf_counter() - start_time,
+                    'expanded_states': None, 'generated_states': None,
+                    'peak_rss_kb': None, 'moves': None, 'pushes': None}
+        finally:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            results.close()
+
+
+def compare(results, baseline, threshold=0.1):
+    """List the cases that got worse than the baseline by more than the threshold"""
+    regressions = []
+    for name, base in sorted(baseline['cases'].items()):
+        current = results['cases'].get(name)
+        if current is None:
+            continue
+        if base['status'] == 'solved' and current['status'] != 'solved':
+            regressions.append('%s: %s -> %s' % (name, base['status'], current['status']))
+            continue
+        for metric in COST_METRICS:
+            old, new = base.get(metric), current.get(metric)
+            if old is None or new is None or new <= old * (1 + threshold):
+                continue
+            if metric == 'time' and new - old < TIME_NOISE:
+                continue
+            regressions.append('%s: %s %s -> %s' % (name, metric, old, new))
+    return regressions
+
+
+def save_results(results, path):
+    """Write a results document as JSON"""
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_results(path):
+    """Read a results document written by save_results"""
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,262 @@
+# Checkpoints of long-running searches
+# The open list, the closed-set keys, the move trail of expanded nodes and
+# the search counters are saved periodically to one file, so a solve that is
+# killed can continue from its last snapshot. The file holds a full snapshot
+# followed by deltas that only carry what changed since the previous save:
+# the closed keys and trail entries added, and the open nodes pushed and
+# removed. Every few saves it is rewritten as one full snapshot again.
+#
+# Path: modules/checkpoint.py
+
+import hashlib
+import os
+import pickle
+import struct
+import time
+import zlib
+from array import array
+
+VERSION = 2
+# Every record is an 8-byte length followed by that many bytes of zlib'ed pickle
+HEADER = struct.Struct('<Q')
+KEY_MASK = 0xFFFFFFFFFFFFFFFF
+# Strategies whose open list and closed set a checkpoint can capture
+STRATEGIES = ('astar', 'ucs')
+
+
+def level_hash(state):
+    """Get the content hash of the exact map a state lives on"""
+    text = '\n'.join(''.join(row) for row in state.map)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def read_snapshot(path):
+    """Merge the records of a checkpoint file into one snapshot dict, or None
+
+    A record cut short by a crash during a save is ignored, together with
+    anything after it. The snapshot's 'size' is the length of the file up to
+    the end of its last whole record.
+    """
+    if not os.path.exists(path):
+        return None
+    snapshot = None
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                break
+            size = HEADER.unpack(header)[0]
+            data = f.read(size)
+            if len(data) < size:
+                break
+            try:
+                record = pickle.loads(zlib.decompress(data))
+            except (zlib.error, pickle.UnpicklingError, EOFError):
+                break
+            if record['kind'] == 'full':
+                snapshot = record
+                snapshot['size'] = f.tell()
+                continue
+            if snapshot is None:
+                break
+            snapshot['size'] = f.tell()
+            snapshot['trail_parents'] += record['trail_parents']
+            snapshot['trail_moves'] += record['trail_moves']
+            snapshot['closed'] += record['closed']
+            frontier = snapshot['frontier']
+            removed = array('Q')
+            removed.frombytes(record['removed'])
+            for key in removed:
+                frontier.pop(key, None)
+            frontier.update(record['added'])
+            snapshot['counters'] = record['counters']
+    if snapshot is not None and snapshot['version'] != VERSION:
+        raise Exception('Unsupported checkpoint version')
+    return snapshot
+
+
+class Checkpoint(object):
+    """Periodic on-disk snapshots of one solver's search
+
+    A save is made at most once per interval seconds, between two node
+    expansions. Only every full_every-th save rewrites the whole closed set,
+    move trail and open list; the others append a delta, so their cost only
+    grows with the nodes expanded, pushed and popped since the last save.
+    """
+
+    def __init__(self, path, interval=60.0, full_every=10):
+        self.path = path
+        self.interval = interval
+        self.full_every = full_every
+        self.solver = None
+        self.open_list = None
+        self.closed_set = None
+        self.current = None  # The node being expanded, still owed to the open list
+        self.closed_log = array('Q')  # Closed keys added since the last save
+        self.trail_saved = 0  # Move trail entries already on disk
+        self.owed = None  # Key of the node being expanded at the last save, saved as open
+        self.deltas = None  # Deltas since the last full snapshot; None before the first
+        self.size = 0  # Bytes of whole records in the file; a delta is written from here
+        self.next_save = None
+        self.saves = 0
+        self.bytes_written = 0
+
+    def config(self, solver):
+        """Get the settings a snapshot must match to be resumed"""
+        return {
+            'level': level_hash(solver.initial_state),
+            'strategy': solver.strategy,
+            'mode': solver.mode,
+            'heuristic': solver.heuristic.method,
+            'deadlocks': solver.deadlocks is not None,
+            'macros': solver.macros is not None,
+            'tie_break': solver.tie_break,
+        }
+
+    def attach(self, solver, open_list, closed_set):
+        """Start tracking a search; the first save comes one interval later"""
+        self.solver = solver
+        self.open_list = open_list
+        self.closed_set = closed_set
+        open_list.journal = ({}, set())
+        self.next_save = time.time() + self.interval
+
+    def expanding(self, state):
+        """Mark a node popped from the open list as being expanded"""
+        self.current = state
+
+    def expanded(self, key):
+        """Record a fully expanded node and save a snapshot when one is due"""
+        self.current = None
+        self.closed_log.append(key & KEY_MASK)
+        if time.time() >= self.next_save:
+            self.save()
+
+    def save(self):
+        """Write a full snapshot or a delta of the attached search"""
+        solver = self.solver
+        trail = solver.trail
+        full = self.deltas is None or self.deltas + 1 >= self.full_every
+        record = {
+            'kind': 'full' if full else 'delta',
+            'counters': self.counters(),
+        }
+        pushed, removed = self.open_list.journal
+        if full:
+            states = self.open_list.states()
+        else:
+            states = [self.open_list.get(key) for key in pushed if key in self.open_list]
+            if self.owed is not None:
+                removed.add(self.owed)
+            record['removed'] = array('Q', [key & KEY_MASK for key in removed]).tobytes()
+        if self.current is not None:
+            states.append(self.current)
+            self.owed = solver.key(self.current)
+        else:
+            self.owed = None
+        record['frontier' if full else 'added'] = self.frontier(states)
+        if full:
+            closed = array('Q', [key & KEY_MASK for key in self.closed_set])
+            if self.current is not None:
+                closed.remove(solver.key(self.current) & KEY_MASK)
+            record.update(version=VERSION, config=self.config(solver),
+                          trail_typecode=trail.moves.typecode,
+                          trail_parents=trail.parents.tobytes(),
+                          trail_moves=trail.moves.tobytes(), closed=closed.tobytes())
+        else:
+            record.update(trail_parents=trail.parents[self.trail_saved:].tobytes(),
+                          trail_moves=trail.moves[self.trail_saved:].tobytes(),
+                          closed=self.closed_log.tobytes())
+        data = zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+
+        if full:
+            # Replace the file in one step, so a crash leaves the old snapshot intact
+            temporary = self.path + '.tmp'
+            with open(temporary, 'wb') as f:
+                f.write(HEADER.pack(len(data)) + data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            self.deltas = 0
+            self.size = HEADER.size + len(data)
+        else:
+            # Start at the end of the last whole record, dropping what a save
+            # killed halfway left behind, so readers never stop short of this one
+            with open(self.path, 'r+b') as f:
+                f.seek(self.size)
+                f.truncate()
+                f.write(HEADER.pack(len(data)) + data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.deltas += 1
+            self.size += HEADER.size + len(data)
+        self.closed_log = array('Q')
+        self.open_list.journal = ({}, set())
+        self.trail_saved = len(trail)
+        self.saves += 1
+        self.bytes_written += HEADER.size + len(data)
+        self.next_save = time.time() + self.interval
+
+    def frontier(self, states):
+        """Pack open nodes by key as (player, boxes, g, h, trail index, action codes)
+
+        The action codes lead from the trail node to the open node; there is
+        more than one only for the intermediate states of a macro push.
+        """
+        solver = self.solver
+        records = {}
+        for state in states:
+            codes = []
+            node = state
+            while node.parent is not None and not isinstance(node.parent, int):
+                codes.append(solver.encode(node.action))
+                node = node.parent
+            if node.parent is None:
+                index = -1
+                if node.action is not None:
+                    codes.append(solver.encode(node.action))
+            else:
+                index = node.parent
+                codes.append(solver.encode(node.action))
+            codes.reverse()
+            records[solver.key(state) & KEY_MASK] = (state.player_cell, state.box_mask,
+                                                     state.current_cost, state.h, index,
+                                                     tuple(codes))
+        return records
+
+    def counters(self):
+        """Get the solver counters to carry over, with the search time of every run so far"""
+        solver = self.solver
+        counters = {
+            'expanded_states': solver.expanded_states,
+            'generated_states': solver.generated_states,
+            'elapsed': time.time() - solver.start_time + (solver.stats.resumed_elapsed or 0.0),
+        }
+        if solver.deadlocks is not None:
+            counters['pruned'] = dict(solver.deadlocks.pruned)
+        if solver.macros is not None:
+            counters['macro_pushes'] = dict(solver.macros.applied)
+        return counters
+
+    def load(self, solver):
+        """Read the snapshot of this file for a solver
+
+        Returns (trail, closed keys, frontier records, counters), or None when
+        there is no snapshot yet.
+        """
+        snapshot = read_snapshot(self.path)
+        if snapshot is None:
+            return None
+        if snapshot['config'] != self.config(solver):
+            raise Exception('Checkpoint does not match this level and configuration')
+        parents = array('l')
+        parents.frombytes(snapshot['trail_parents'])
+        moves = array(snapshot['trail_typecode'])
+        moves.frombytes(snapshot['trail_moves'])
+        closed = array('Q')
+        closed.frombytes(snapshot['closed'])
+        # The next save appends to what is on disk now
+        self.trail_saved = len(parents)
+        self.deltas = 0
+        self.size = snapshot['size']
+        return (parents, moves), closed, list(snapshot['frontier'].values()), snapshot['counters']
@@ -0,0 +1,73 @@
+# Level collections
+# Reads single maps, standard multi-level collection files (.xsb/.sok, levels
+# separated by titles, comments or blank lines) and whole directories of them.
+#
+# Path: modules/collection.py
+
+import os
+
+EXTENSIONS = ('.txt', '.xsb', '.sok')
+# Characters that can appear on a map row; '-' and '_' are floor in some collections
+MAP_CHARS = set('#@+$*. -_')
+
+
+def is_map_line(line):
+    """Check if a line is a row of a map rather than a title or comment"""
+    return '#' in line and set(line) <= MAP_CHARS
+
+
+def parse_levels(text):
+    """Split the text of a collection into (title, map) pairs
+
+    A level is a run of consecutive map rows. Its title is taken from a
+    'Title:' line following it or, failing that, the last plain text line
+    before it. Comments (';') and other 'Key: value' lines are skipped.
+    """
+    levels = []
+    rows = []
+    title = None
+    previous = None  # Index of the level a following 'Title:' line belongs to
+    for line in text.splitlines() + ['']:
+        line = line.rstrip()
+        if is_map_line(line):
+            rows.append([' ' if char in '-_' else char for char in line])
+            continue
+        if rows:
+            levels.append([title, rows])
+            rows = []
+            title = None
+            previous = len(levels) - 1
+        stripped = line.strip()
+        if not stripped or stripped.startswith(';'):
+            continue
+        key, separator, value = stripped.partition(':')
+        if not separator:
+            title = stripped
+        elif key.strip().lower() == 'title':
+            if previous is not None:
+                levels[previous][0] = value.strip()
+                previous = None
+            else:
+                title = value.strip()
+    return [(title, rows) for title, rows in levels]
+
+
+def load_levels(path):
+    """Load every level of a file or directory as (level_id, title, map) tuples
+
+    Level ids are the file name, followed by '#<n>' for files holding more
+    than one level.
+    """
+    if os.path.isdir(path):
+        levels = []
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(EXTENSIONS):
+                levels.extend(load_levels(os.path.join(path, name)))
+        return levels
+    with open(path, 'r') as f:
+        parsed = parse_levels(f.read())
+    name = os.path.basename(path)
+    if len(parsed) == 1:
+        return [(name, parsed[0][0] or name, parsed[0][1])]
+    return [('%s#%d' % (name, number), title or '%s #%d' % (name, number), rows)
+            for number, (title, rows) in enumerate(parsed, 1)]
@@ -0,0 +1,122 @@
+# Deadlock detection for the solver
+# Positions from which the level can no longer be solved are pruned when
+# successors are generated, instead of being searched to exhaustion.
+#
+# Path: modules/deadlock.py
+
+RULES = ('dead_square', 'block', 'freeze')
+
+
+def find_dead_squares(level):
+    """Find the floor cells from which no box can ever reach a target
+
+    Boxes are pulled backwards from every target: a cell is live when a box
+    standing on it could have been pushed towards a target, which needs the
+    cell itself and the cell behind it (where the player stands) to be floor.
+    Every other floor cell is dead.
+    """
+    walls = level.walls
+    live = bytearray(level.size)
+    stack = list(level.target_cells)
+    for cell in stack:
+        live[cell] = 1
+    while stack:
+        cell = stack.pop()
+        for delta in level.deltas:
+            previous = cell - delta
+            if live[previous] or walls[previous] or walls[previous - delta]:
+                continue
+            live[previous] = 1
+            stack.append(previous)
+    return bytearray(0 if walls[cell] or live[cell] else 1 for cell in range(level.size))
+
+
+class DeadlockDetector(object):
+    """Check pushes against the dead-square table, 2x2 blocks and freeze deadlocks
+
+    The number of nodes each rule pruned is kept in ``pruned``.
+    """
+
+    def __init__(self, level):
+        self.level = level
+        if level.dead_squares is None:
+            level.dead_squares = find_dead_squares(level)
+        self.dead_squares = level.dead_squares
+        self.pruned = dict.fromkeys(RULES, 0)
+
+    def is_deadlocked(self, boxes, box_cell):
+        """Check if the box just pushed to box_cell leaves the layout unsolvable"""
+        if self.dead_squares[box_cell]:
+            self.pruned['dead_square'] += 1
+            return True
+        return self.is_stuck(boxes, box_cell)
+
+    def is_stuck(self, boxes, box_cell):
+        """Check the block and freeze rules only, for callers that ruled out dead squares"""
+        if self.is_blocked(boxes, box_cell):
+            self.pruned['block'] += 1
+            return True
+        if self.is_frozen(boxes, box_cell):
+            self.pruned['freeze'] += 1
+            return True
+        return False
+
+    def is_blocked(self, boxes, box_cell):
+        """Check if the box closes a 2x2 square of walls and boxes with a box off target"""
+        level = self.level
+        walls = level.walls
+        targets = level.targets
+        stride = level.stride
+        for corner in (box_cell, box_cell - 1, box_cell - stride, box_cell - stride - 1):
+            square = (corner, corner + 1, corner + stride, corner + stride + 1)
+            off_target = False
+            for cell in square:
+                if walls[cell]:
+                    continue
+                if not (boxes >> cell) & 1:
+                    break
+                if not targets[cell]:
+                    off_target = True
+            else:
+                if off_target:
+                    return True
+        return False
+
+    def is_frozen(self, boxes, box_cell):
+        """Check if the box can no longer move and it, or a box freezing it, is off target"""
+        frozen = []
+        if not self._frozen(boxes, box_cell, set(), frozen):
+            return False
+        targets = self.level.targets
+        return any(not targets[cell] for cell in frozen)
+
+    def _frozen(self, boxes, cell, stack, frozen):
+        """Check if the box on cell is stuck on both axes
+
+        Boxes on the recursion stack count as walls, which breaks cycles
+        between boxes that block each other. Boxes found frozen are appended to
+        ``frozen``; entries added by a check that fails are dropped again.
+        """
+        mark = len(frozen)
+        stack.add(cell)
+        result = (self._axis_blocked(boxes, cell, 1, stack, frozen)
+                  and self._axis_blocked(boxes, cell, self.level.stride, stack, frozen))
+        stack.discard(cell)
+        if result:
+            frozen.append(cell)
+        else:
+            del frozen[mark:]
+        return result
+
+    def _axis_blocked(self, boxes, cell, delta, stack, frozen):
+        """Check if the box on cell can no longer move along one axis"""
+        walls = self.level.walls
+        before, after = cell - delta, cell + delta
+        if walls[before] or walls[after] or before in stack or after in stack:
+            return True
+        if self.dead_squares[before] and self.dead_squares[after]:
+            return True
+        for neighbor in (before, after):
+            if (boxes >> neighbor) & 1 and self._frozen(boxes, neighbor, stack, frozen):
+                return True
+        return False
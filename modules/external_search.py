@@ -0,0 +1,222 @@
+# External-memory breadth-first search
+# Frontier layers and the closed set live in files of packed fixed-width
+# records instead of Python sets and heaps. Children of a layer are buffered
+# up to the RAM budget, sorted and spilled as runs; duplicates are removed
+# afterwards (delayed duplicate detection) by merging the runs and
+# subtracting the sorted closed file. Files are read through mmap.
+#
+# Path: modules/external_search.py
+
+import heapq
+import mmap
+import os
+import shutil
+import tempfile
+
+from modules.game_state import GameState
+from modules.level import DIRECTIONS
+
+# Approximate bytes a buffered record costs in RAM on top of its packed size
+RECORD_OVERHEAD = 64
+PLAYER_BYTES = 4
+
+
+def read_records(path, size):
+    """Yield the records of a file in order"""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            for offset in range(0, len(view), size):
+                yield view[offset:offset + size]
+
+
+def write_records(path, records):
+    """Write records to a file and return how many were written"""
+    count = 0
+    with open(path, 'wb', buffering=1 << 20) as f:
+        for record in records:
+            f.write(record)
+            count += 1
+    return count
+
+
+def unique(records):
+    """Drop repeats from sorted records"""
+    previous = None
+    for record in records:
+        if record != previous:
+            yield record
+            previous = record
+
+
+def subtract(records, excluded):
+    """Yield the sorted records that do not appear in the sorted excluded records"""
+    excluded = iter(excluded)
+    current = next(excluded, None)
+    for record in records:
+        while current is not None and current < record:
+            current = next(excluded, None)
+        if record != current:
+            yield record
+
+
+class SortedFile(object):
+    """Binary search over a sorted record file"""
+
+    def __init__(self, path, size):
+        self.size = size
+        self.file = open(path, 'rb')
+        self.view = None
+        self.count = 0
+        if os.path.getsize(path):
+            self.view = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.count = len(self.view) // size
+
+    def __contains__(self, record):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            offset = middle * self.size
+            if self.view[offset:offset + self.size] < record:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self.count and self.view[low * self.size:(low + 1) * self.size] == record
+
+    def close(self):
+        if self.view is not None:
+            self.view.close()
+        self.file.close()
+
+
+class ExternalSearch(object):
+    """Layered breadth-first search with its state sets on disk
+
+    A record is the box mask followed by the player cell, both big-endian,
+    so byte order sorts like the (box_mask, player_cell) pair. Layer files
+    are kept until the search ends: the path is rebuilt backwards by looking
+    up each candidate predecessor of the goal's ancestors in the previous
+    layer.
+    """
+
+    def __init__(self, solver, memory_budget=256, directory=None):
+        self.solver = solver
+        self.level = solver.initial_state.level
+        self.box_bytes = (self.level.size + 7) // 8
+        self.record_size = self.box_bytes + PLAYER_BYTES
+        # Children buffered in RAM before they are sorted and spilled
+        self.run_limit = max(1, memory_budget * 1024 * 1024 // (self.record_size + RECORD_OVERHEAD))
+        self.directory = directory
+        self.spilled_bytes = 0
+
+    def pack(self, state):
+        return (state.box_mask.to_bytes(self.box_bytes, 'big') +
+                state.player_cell.to_bytes(PLAYER_BYTES, 'big'))
+
+    def unpack(self, record, cost):
+        boxes = int.from_bytes(record[:self.box_bytes], 'big')
+        player = int.from_bytes(record[self.box_bytes:], 'big')
+        return GameState.create(self.level, player, boxes, self.level.zobrist(player, boxes), cost)
+
+    def run(self):
+        """Search layer by layer and return the actions from the root to a goal"""
+        workspace = tempfile.mkdtemp(prefix='sokoban-', dir=self.directory)
+        try:
+            return self.search(workspace)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    def search(self, workspace):
+        solver = self.solver
+        size = self.record_size
+        root = solver.start_state()
+        if root.check_solved():
+            return []
+        layers = [os.path.join(workspace, 'layer-0')]
+        write_records(layers[0], [self.pack(root)])
+        closed = os.path.join(workspace, 'closed-0')
+        write_records(closed, [self.pack(root)])
+        closed_count = 1
+
+        depth = 0
+        layer_count = 1
+        while layer_count:
+            runs = []
+            buffer = []
+            for record in read_records(layers[depth], size):
+                state = self.unpack(record, depth)
+                solver.report(state, layer_count, closed_count)
+                for next_state in solver.successors(state):
+                    if next_state.check_solved():
+                        return self.trace(layers, next_state)
+                    buffer.append(self.pack(next_state))
+                if len(buffer) >= self.run_limit:
+                    runs.append(self.spill(workspace, depth, len(runs), buffer))
+                    buffer = []
+            if buffer:
+                runs.append(self.spill(workspace, depth, len(runs), buffer))
+
+            depth += 1
+            layer = os.path.join(workspace, 'layer-%d' % depth)
+            children = unique(heapq.merge(*[read_records(run, size) for run in runs]))
+            layer_count = write_records(layer, subtract(children, read_records(closed, size)))
+            for run in runs:
+                os.remove(run)
+            layers.append(layer)
+
+            merged = os.path.join(workspace, 'closed-%d' % depth)
+            closed_count = write_records(merged, heapq.merge(read_records(closed, size),
+                                                             read_records(layer, size)))
+            os.remove(closed)
+            closed = merged
+            self.spilled_bytes += (layer_count + closed_count) * size
+
+        return None
+
+    def spill(self, workspace, depth, index, buffer):
+        """Sort a buffer of child records and write it as a run"""
+        path = os.path.join(workspace, 'run-%d-%d' % (depth, index))
+        buffer.sort()
+        write_records(path, unique(buffer))
+        self.spilled_bytes += len(buffer) * self.record_size
+        return path
+
+    def trace(self, layers, goal):
+        """Rebuild the path to a goal whose parent lies in the last expanded layer"""
+        path = [goal.action]
+        state = goal.parent
+        for depth in range(state.current_cost - 1, -1, -1):
+            layer = SortedFile(layers[depth], self.record_size)
+            try:
+                for action, previous in self.predecessors(state):
+                    if self.pack(previous) in layer:
+                        break
+                else:
+                    raise Exception('Broken layer %d' % depth)
+            finally:
+                layer.close()
+            path.append(action)
+            state = previous
+        path.reverse()
+        return path
+
+    def predecessors(self, state):
+        """Yield (action, state) for every state one search step before the given one"""
+        if self.solver.mode == 'push':
+            for box_cell, direction in state.get_possible_pulls():
+                yield (box_cell, direction), state.pull(box_cell, direction).normalized()
+            return
+
+        level = self.level
+        player = state.player_cell
+        boxes = state.box_mask
+        for direction in DIRECTIONS:
+            delta = level.delta[direction]
+            previous = player - delta
+            if level.walls[previous] or (boxes >> previous) & 1:
+                continue
+            yield direction, GameState.create(level, previous, boxes, 0)
+            if (boxes >> (player + delta)) & 1:
+                pulled = boxes ^ (1 << (player + delta)) ^ (1 << player)
+                yield direction, GameState.create(level, previous, pulled, 0)
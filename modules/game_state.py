@@ -1,263 +1,392 @@
+from modules.heuristic import get_heuristic
+from modules.level import Level, DIRECTIONS, iter_cells
+
+
 class GameState:
+    """A search node: the player cell and the box layout on a shared Level
+
+    Boxes are stored as a bitmask over the level cells and the Zobrist hash is
+    updated incrementally on every move, so creating, hashing and comparing
+    states never touches the whole grid. A state remembers only its parent
+    and the action that led to it; the path is rebuilt with get_path().
+    """
+    __slots__ = ('level', 'player_cell', 'box_mask', 'zobrist',
+                 'current_cost', 'parent', 'action', 'h', 'heuristic_data')
+
     def __init__(self, map, current_cost=0, parent=None):  # Add parent parameter with default value None
-        self.map = map
+        self.level = map if isinstance(map, Level) else Level(map)
+        self.player_cell = self.level.start_player
+        self.box_mask = self.level.start_boxes
+        self.zobrist = self.level.zobrist(self.player_cell, self.box_mask)
         self.current_cost = current_cost
-        self.parent = parent 
-        self.height = len(self.map)
-        self.width = len(self.map[0])
-        self.player = self.find_player()
-        self.boxes = self.find_boxes()
-        self.targets = self.find_targets()
-        self.is_solved = self.check_solved()
-        self.solution_path = [] 
+        self.parent = parent
+        self.action = None
+        self.h = None
+        self.heuristic_data = None
+
+    @classmethod
+    def create(cls, level, player_cell, box_mask, zobrist, current_cost=0, parent=None,
+               action=None):
+        """Build a state directly from its compact fields, skipping the map scan"""
+        state = object.__new__(cls)
+        state.level = level
+        state.player_cell = player_cell
+        state.box_mask = box_mask
+        state.zobrist = zobrist
+        state.current_cost = current_cost
+        state.parent = parent
+        state.action = action
+        state.h = None
+        state.heuristic_data = None
+        return state
+
     def __lt__(self, other):
         """Define the comparison between two GameState instances."""
         return self.get_total_cost() < other.get_total_cost()
+
+    @property
+    def height(self):
+        return self.level.height
+
+    @property
+    def width(self):
+        return self.level.width
+
+    @property
+    def player(self):
+        return self.find_player()
+
+    @property
+    def boxes(self):
+        return self.find_boxes()
+
+    @property
+    def targets(self):
+        return self.find_targets()
+
+    @property
+    def map(self):
+        return self.level.render(self.player_cell, self.box_mask)
+
+    @property
+    def is_solved(self):
+        return self.check_solved()
+
     def find_player(self):
         """Find the player in the map and return its position"""
-        for row in range(self.height):
-            for col in range(self.width):
-                if self.map[row][col] in ['@', '+']:
-                    return row, col
-        # If player is not found, return a default position or handle the error as appropriate
-        return None
-
+        if self.player_cell is None:
+            return None
+        return self.level.position(self.player_cell)
 
     def find_boxes(self):
         """Find all the boxes in the map and return their positions"""
-        boxes = []
-        for row in range(self.height):
-            for col in range(self.width):
-                if self.map[row][col] in ['$', '*']:
-                    boxes.append((row, col))
-        return boxes
+        return [self.level.position(cell) for cell in iter_cells(self.box_mask)]
 
     def find_targets(self):
         """Find all the targets in the map and return their positions"""
-        targets = []
-        for row in range(self.height):
-            for col in range(self.width):
-                if self.map[row][col] in ['.', '*']:
-                    targets.append((row, col))
-        return targets
+        return [self.level.position(cell) for cell in self.level.target_cells]
 
     def is_wall(self, position):
         """Check if the given position is a wall"""
-        row, col = position
-        return self.map[row][col] == '#'
+        return self.level.walls[self.level.cell(*position)] == 1
 
     def is_box(self, position):
         """Check if the given position is a box"""
-        row, col = position
-        return self.map[row][col] in ['$', '*']
+        return (self.box_mask >> self.level.cell(*position)) & 1 == 1
 
     def is_target(self, position):
         """Check if the given position is a target"""
-        row, col = position
-        return self.map[row][col] in ['.', '*']
+        return self.level.targets[self.level.cell(*position)] == 1
 
     def is_empty(self, position):
         """Check if a position is empty or a target."""
-        row, col = position
-        return self.map[row][col] in [' ', '.']
-    
-    def is_box_on_target(self, position):
-        row, col = position
-        return self.map[row][col] in [ '*']
-    def is_box_in_corner(self, box_position):
-        """Check if the box is being pushed into a corner"""
-        row, col = box_position
-        # Implement logic to check if the box is in a corner
-        return False  # Placeholder implementation, replace with actual logic
-
+        cell = self.level.cell(*position)
+        return not (self.level.walls[cell] or (self.box_mask >> cell) & 1
+                    or cell == self.player_cell)
 
+    def is_box_on_target(self, position):
+        return self.is_box(position) and self.is_target(position)
 
     def get_heuristic(self):
-        """Get the heuristic for the game state"""
-        heuristic = 0
-        for box in self.boxes:
-            min_distance = float('inf')
-            for target in self.targets:
-                distance = abs(box[0] - target[0]) + abs(box[1] - target[1])
-                min_distance = min(min_distance, distance)
-            heuristic += min_distance
-        return heuristic
-
+        """Get the heuristic for the game state, computing it only once"""
+        if self.h is None:
+            get_heuristic(self.level).evaluate(self)
+        return self.h
 
     def get_total_cost(self):
         """Get the cost for the game state"""
         return self.current_cost + self.get_heuristic()
+
     def is_valid_move(self, new_player_position, new_box_position=None):
         """Check if the move is valid (not hitting a wall or pushing a box into a corner)"""
-        new_row, new_col = new_player_position
-
         # Check if the new position is within the boundaries of the map
-        if not (0 <= new_row < self.height and 0 <= new_col < self.width):
+        if not self.level.contains(new_player_position):
             return False
-        
+
         # Check if the new position is a wall
-        if self.is_wall((new_row, new_col)):
+        if self.is_wall(new_player_position):
             return False
-        
+
         # Check if the new position is a box
-        if self.is_box((new_row, new_col)):
+        if self.is_box(new_player_position):
             # Calculate the position after pushing the box
             if new_box_position is None:
                 return False  # No box position provided
-            new_box_row, new_box_col = new_box_position
-            if not (0 <= new_box_row < self.height and 0 <= new_box_col < self.width):
+            if not self.level.contains(new_box_position):
                 return False  # Box pushed out of bounds
-            if self.is_wall((new_box_row, new_box_col)):
-                return False  # Box pushed into a wall
-            if self.is_box_in_corner((new_row, new_col), (new_box_row, new_box_col)):
+            if self.is_wall(new_box_position) or self.is_box(new_box_position):
+                return False  # Box pushed into a wall or another box
+            if self.is_box_in_corner(new_player_position, new_box_position):
                 return False  # Box pushed into a corner
         return True
 
     def is_box_in_corner(self, old_box_position, new_box_position):
-        """Check if the box is being pushed into a corner"""
-        # Implementation to check if the box is being pushed into a corner
-        return False  # Placeholder implementation, replace with actual logic
+        """Check if the box is being pushed into a corner that is not a target"""
+        level = self.level
+        cell = level.cell(*new_box_position)
+        if level.targets[cell]:
+            return False
+        walls = level.walls
+        blocked_vertically = walls[cell - level.stride] or walls[cell + level.stride]
+        blocked_horizontally = walls[cell - 1] or walls[cell + 1]
+        return bool(blocked_vertically and blocked_horizontally)
+
     def get_current_cost(self):
         """Get the current cost for the game state"""
         return self.current_cost
+
     def get_possible_moves(self):
         possible_moves = []
+        level = self.level
+        position = level.position
 
-        for direction in ['U', 'D', 'L', 'R']:
-            row, col = self.player
-            new_row, new_col = row, col
-
-            if direction == 'U':
-                new_row -= 1
-            elif direction == 'D':
-                new_row += 1
-            elif direction == 'L':
-                new_col -= 1
-            elif direction == 'R':
-                new_col += 1
-
-            new_player_position = (new_row, new_col)
+        for direction in DIRECTIONS:
+            delta = level.delta[direction]
+            new_cell = self.player_cell + delta
 
-            # Check if the new position is within the boundaries of the map
-            if not (0 <= new_row < self.height and 0 <= new_col < self.width):
+            # The padded border means a wall check is also a bounds check
+            if level.walls[new_cell]:
                 continue
 
-            # Check if the new position is a wall
-            if self.is_wall((new_row, new_col)):
-                continue
-
-            if self.is_box((new_row, new_col)):
+            if (self.box_mask >> new_cell) & 1:
                 # Calculate the position after pushing the box
-                new_box_row, new_box_col = new_row, new_col
-
-                if direction == 'U':
-                    new_box_row -= 1
-                elif direction == 'D':
-                    new_box_row += 1
-                elif direction == 'L':
-                    new_box_col -= 1
-                elif direction == 'R':
-                    new_box_col += 1
-
-                new_box_position = (new_box_row, new_box_col)
-
-                # Check if the new position for the box is within the boundaries of the map
-                if not (0 <= new_box_row < self.height and 0 <= new_box_col < self.width):
-                    continue
-
-                # Check if the new position for the box is a wall
-                if self.is_wall((new_box_row, new_box_col)):
+                new_box_cell = new_cell + delta
+                if level.walls[new_box_cell] or (self.box_mask >> new_box_cell) & 1:
                     continue
 
-                if self.is_box_in_corner((new_row, new_col), (new_box_row, new_box_col)):
+                if self.is_box_in_corner(position(new_cell), position(new_box_cell)):
                     continue
 
                 # Add the move to possible_moves
-                possible_moves.append((direction, new_player_position, new_box_position))
+                possible_moves.append((direction, position(new_cell), position(new_box_cell)))
             else:
                 # If the new position is empty, only update the player position
-                possible_moves.append((direction, new_player_position, None))
+                possible_moves.append((direction, position(new_cell), None))
 
         return possible_moves
 
-    
     def move(self, direction):
         """Generate the next game state by moving the player in the given direction."""
-        row, col = self.player
-        new_row, new_col = row, col
-
-        if direction == 'U':
-            new_row -= 1
-        elif direction == 'D':
-            new_row += 1
-        elif direction == 'L':
-            new_col -= 1
-        elif direction == 'R':
-            new_col += 1
-
-        new_game_state = self.clone()  # Create a clone of the current GameState object
-        if new_game_state.is_empty((new_row, new_col)):
-            # If the new position is empty, move the player
-            new_game_state.map[row][col] = '.' if (row, col) in new_game_state.targets else ' '
-            new_game_state.map[new_row][new_col] = '@' if new_game_state.map[new_row][new_col] == ' ' else '+'
-            new_game_state.player = (new_row, new_col)
-            new_game_state.current_cost += 1
-
-        elif new_game_state.is_box((new_row, new_col)):
-            new_box_row, new_box_col = new_row, new_col
-
-            if direction == 'U':
-                new_box_row -= 1
-            elif direction == 'D':
-                new_box_row += 1
-            elif direction == 'L':
-                new_box_col -= 1
-            elif direction == 'R':
-                new_box_col += 1
-
-            if new_game_state.is_empty((new_box_row, new_box_col)):
-                # If the new position for the box is empty, push the box
-                new_game_state.map[row][col] = '.' if (row, col) in new_game_state.targets else ' '
-                new_game_state.map[new_row][new_col] = '@' if new_game_state.map[new_row][new_col] == ' ' else '+'
-                new_game_state.map[new_box_row][new_box_col] = '$' if new_game_state.map[new_box_row][new_box_col] == ' ' else '*'
-                new_game_state.player = (new_row, new_col)
-                new_game_state.boxes.remove((new_row, new_col))
-                new_game_state.boxes.append((new_box_row, new_box_col))
-                new_game_state.current_cost += 1
-
-        return new_game_state
+        level = self.level
+        delta = level.delta.get(direction)
+        if delta is None:
+            return self.clone()
+
+        player = self.player_cell
+        new_cell = player + delta
+        if level.walls[new_cell]:
+            return self.clone()
+
+        boxes = self.box_mask
+        zobrist = self.zobrist ^ level.zobrist_player[player] ^ level.zobrist_player[new_cell]
+        if (boxes >> new_cell) & 1:
+            new_box_cell = new_cell + delta
+            if level.walls[new_box_cell] or (boxes >> new_box_cell) & 1:
+                return self.clone()
+            # Push the box and update the hash for the two cells that changed
+            boxes ^= (1 << new_cell) | (1 << new_box_cell)
+            zobrist ^= level.zobrist_box[new_cell] ^ level.zobrist_box[new_box_cell]
+
+        return GameState.create(level, new_cell, boxes, zobrist,
+                                self.current_cost + 1, self, direction)
+
+    def get_successors(self):
+        """Get the (direction, state) pairs for every legal single-step move
+
+        Unlike get_possible_moves, no push is filtered out here; the solver
+        runs its own deadlock checks on the resulting states.
+        """
+        successors = []
+        for direction in DIRECTIONS:
+            next_state = self.move(direction)
+            if next_state.player_cell != self.player_cell:
+                successors.append((direction, next_state))
+        return successors
+
+    def reachable(self):
+        """Flood fill the cells the player can walk to without pushing a box
+
+        Returns the visited cells as a bytearray and the lowest visited cell,
+        which is used as the canonical player position of the region.
+        """
+        level = self.level
+        blocked = bytearray(level.walls)
+        for cell in iter_cells(self.box_mask):
+            blocked[cell] = 1
+        deltas = level.deltas
+        start = self.player_cell
+        blocked[start] = 1
+        seen = bytearray(level.size)
+        seen[start] = 1
+        stack = [start]
+        lowest = start
+        while stack:
+            cell = stack.pop()
+            if cell < lowest:
+                lowest = cell
+            for delta in deltas:
+                neighbor = cell + delta
+                if not blocked[neighbor]:
+                    blocked[neighbor] = 1
+                    seen[neighbor] = 1
+                    stack.append(neighbor)
+        return seen, lowest
+
+    def normalized(self):
+        """Get the equivalent state with the player on its canonical cell"""
+        _, lowest = self.reachable()
+        if lowest == self.player_cell:
+            return self
+        level = self.level
+        zobrist = self.zobrist ^ level.zobrist_player[self.player_cell] ^ level.zobrist_player[lowest]
+        state = GameState.create(level, lowest, self.box_mask, zobrist,
+                                 self.current_cost, self.parent, self.action)
+        state.h = self.h
+        state.heuristic_data = self.heuristic_data
+        return state
+
+    def get_possible_pushes(self):
+        """Get the (box_cell, direction) pairs of every push the player can reach"""
+        level = self.level
+        walls = level.walls
+        boxes = self.box_mask
+        seen, _ = self.reachable()
+        pushes = []
+        for box_cell in iter_cells(boxes):
+            for direction in DIRECTIONS:
+                delta = level.delta[direction]
+                new_box_cell = box_cell + delta
+                if not seen[box_cell - delta] or walls[new_box_cell] or (boxes >> new_box_cell) & 1:
+                    continue
+                pushes.append((box_cell, direction))
+        return pushes
+
+    def push(self, box_cell, direction):
+        """Generate the state after walking to the box and pushing it once"""
+        level = self.level
+        new_box_cell = box_cell + level.delta[direction]
+        boxes = self.box_mask ^ (1 << box_cell) ^ (1 << new_box_cell)
+        zobrist = (self.zobrist ^ level.zobrist_player[self.player_cell] ^ level.zobrist_player[box_cell]
+                   ^ level.zobrist_box[box_cell] ^ level.zobrist_box[new_box_cell])
+        return GameState.create(level, box_cell, boxes, zobrist,
+                                self.current_cost + 1, self, (box_cell, direction))
+
+    def get_possible_pulls(self):
+        """Get the pushes that could have led to this state, for searching backwards
+
+        Each entry is the (box_cell, direction) push as it would be made going
+        forward: the box now lies at box_cell + delta and the player, who ends
+        up on box_cell after the push, must be able to reach it here.
+        """
+        level = self.level
+        walls = level.walls
+        boxes = self.box_mask
+        seen, _ = self.reachable()
+        pulls = []
+        for moved_cell in iter_cells(boxes):
+            for direction in DIRECTIONS:
+                delta = level.delta[direction]
+                box_cell = moved_cell - delta
+                player_cell = box_cell - delta
+                if not seen[box_cell] or walls[player_cell] or (boxes >> player_cell) & 1:
+                    continue
+                pulls.append((box_cell, direction))
+        return pulls
+
+    def pull(self, box_cell, direction):
+        """Generate the state before the given push by pulling its box back
+
+        The new state's parent is this one and its action is the forward
+        push, so following parents from a pulled state replays the pushes
+        towards the state the backward search started from.
+        """
+        level = self.level
+        delta = level.delta[direction]
+        moved_cell = box_cell + delta
+        player_cell = box_cell - delta
+        boxes = self.box_mask ^ (1 << moved_cell) ^ (1 << box_cell)
+        zobrist = (self.zobrist ^ level.zobrist_player[self.player_cell] ^ level.zobrist_player[player_cell]
+                   ^ level.zobrist_box[moved_cell] ^ level.zobrist_box[box_cell])
+        return GameState.create(level, player_cell, boxes, zobrist,
+                                self.current_cost + 1, self, (box_cell, direction))
+
+    def path_to(self, cell):
+        """Get the shortest list of directions walking the player to the given cell without pushing"""
+        level = self.level
+        if cell == self.player_cell:
+            return []
+        blocked = bytearray(level.walls)
+        for box_cell in iter_cells(self.box_mask):
+            blocked[box_cell] = 1
+        came_from = {self.player_cell: None}
+        frontier = [self.player_cell]
+        while frontier and cell not in came_from:
+            next_frontier = []
+            for current in frontier:
+                for direction in DIRECTIONS:
+                    neighbor = current + level.delta[direction]
+                    if not blocked[neighbor] and neighbor not in came_from:
+                        came_from[neighbor] = (current, direction)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        if cell not in came_from:
+            return None
+        path = []
+        while came_from[cell] is not None:
+            cell, direction = came_from[cell]
+            path.append(direction)
+        path.reverse()
+        return path
 
     def clone(self):
-        """Create a deep copy of the current game state."""
-        cloned_map = [row[:] for row in self.map]  # Deep copy of the map
-        cloned_state = GameState(cloned_map, self.current_cost, self.parent)  # Create a new GameState object
-        cloned_state.height = self.height
-        cloned_state.width = self.width
-        cloned_state.player = self.player
-        cloned_state.boxes = self.boxes[:]
-        cloned_state.targets = self.targets[:]
-        cloned_state.is_solved = self.is_solved
-        cloned_state.solution_path = self.solution_path[:]
-        return cloned_state
-
-
-
-
-
-
-
-
-
-
-
-
+        """Create a copy of the current game state."""
+        state = GameState.create(self.level, self.player_cell, self.box_mask,
+                                 self.zobrist, self.current_cost, self.parent, self.action)
+        state.h = self.h
+        state.heuristic_data = self.heuristic_data
+        return state
+
+    def get_path(self):
+        """Rebuild the actions leading to this state by following parent links
+
+        The walk stops at the root or at a parent that is not a GameState
+        (for example an index into a solver's compacted move trail).
+        """
+        path = []
+        state = self
+        while isinstance(state, GameState) and state.action is not None:
+            path.append(state.action)
+            state = state.parent
+        path.reverse()
+        return path
 
     def check_solved(self):
         """Check if the game is solved"""
-        return all(box in self.targets for box in self.boxes)
+        return self.box_mask & ~self.level.target_mask == 0
 
     def __eq__(self, other):
-        return isinstance(other, GameState) and self.map == other.map
+        return (isinstance(other, GameState) and self.player_cell == other.player_cell
+                and self.box_mask == other.box_mask)
 
     def __hash__(self):
-        return hash(tuple(map(tuple, self.map)))
\ No newline at end of file
+        return self.zobrist
@@ -1,22 +1,61 @@
 # Visualize the game using pygame
 # The game visualization based on game state and solution
 #
+# Images are scaled once and cached, the static tiles are drawn once to a
+# background surface and each replay step only redraws the tiles that
+# changed. Replay runs from the event loop, so the window stays responsive,
+# and a solver can run in a background thread while progress is shown. The
+# replay position, speed and pause state live in replay.Playback.
+#
 # Path: modules/game_visualization.py
 
 from typing import List
 import pygame
 import sys
 import os
-import time
+import threading
 from pygame.locals import *
 from modules.game_state import GameState
+from modules.instrumentation import Instrumentation
+from modules.level import iter_cells
+from modules.replay import Playback
 from pygame.locals import QUIT
 
+IMAGES = {
+    'player_U': 'player_up.png',
+    'player_D': 'player_down.png',
+    'player_L': 'player_left.png',
+    'player_R': 'player_right.png',
+    'wall': 'wall.png',
+    'box': 'box.png',
+    'box_on_target': 'crate_10.png',
+    'target': 'target.png',
+    'floor': 'floor.png',
+}
+
+STATUS_HEIGHT = 30
+BACKGROUND = (0, 0, 0)
+STATUS_COLOR = (220, 220, 220)
+KEYS_HELP = 'space: pause  right: step  up/down: speed  r: restart'
+
 
 class GameVisualization(object):
-    def __init__(self, initial_state: GameState, solution: List[str]):
+    def __init__(self, initial_state: GameState, solution: List[str] = None, solver=None,
+                 on_solved=None):
+        """Show a level and replay its solution
+
+        With a solver that has not run yet, it is solved in a background
+        thread and its progress is shown until the solution is ready;
+        on_solved(solver) is then called from the window's thread.
+        """
+        self.initial_state = initial_state
         self.game_state = initial_state
         self.solution = solution
+        self.playback = Playback(initial_state, solution) if solution is not None else None
+        self.solver = solver
+        self.on_solved = on_solved
+        self.solver_thread = None
+        self.progress = None
         self.screen = None
         self.clock = None
         self.font = None
@@ -31,91 +70,217 @@ class GameVisualization(object):
         self.y_offset = (self.height - self.game_state.height *
                          self.block_size - self.margin) / 2
 
-        # Load assets
-        self.load_assets()
+        self.images = {}
+        self.background = None
+        self.status = None
+        self.direction = 'D'
 
     def load_assets(self):
-        # Load player image with 4 directions
-        self.player_up_image = pygame.image.load(
-            os.path.join('assets', 'player_up.png'))
-        self.player_down_image = pygame.image.load(
-            os.path.join('assets', 'player_down.png'))
-        self.player_left_image = pygame.image.load(
-            os.path.join('assets', 'player_left.png'))
-        self.player_right_image = pygame.image.load(
-            os.path.join('assets', 'player_right.png'))
-
-        self.wall_image = pygame.image.load(os.path.join('assets', 'wall.png'))
-        self.box_image = pygame.image.load(os.path.join('assets', 'box.png'))
-        self.box_on_target_image = pygame.image.load(os.path.join('assets', 'crate_10.png'))
-        self.target_image = pygame.image.load(
-            os.path.join('assets', 'target.png'))
-        self.floor_image = pygame.image.load(
-            os.path.join('assets', 'floor.png'))
+        """Load every image once, converted and scaled to the tile size"""
+        size = (self.block_size, self.block_size)
+        for name, file_name in IMAGES.items():
+            image = pygame.image.load(os.path.join('assets', file_name)).convert_alpha()
+            self.images[name] = pygame.transform.smoothscale(image, size)
+        image = pygame.image.load(os.path.join('assets', 'no_solution.png')).convert_alpha()
+        side = min(self.width, self.height)
+        self.images['no_solution'] = pygame.transform.smoothscale(image, (side, side))
 
     def init_pygame(self):
         pygame.init()
-        self.screen = pygame.display.set_mode((self.width, self.height))
+        self.screen = pygame.display.set_mode((self.width, self.height + STATUS_HEIGHT))
         pygame.display.set_caption('Sokuban')
         self.clock = pygame.time.Clock()
         self.font = pygame.font.SysFont('Arial', 20)
+        self.load_assets()
+        self.background = self.render_background()
 
-    def draw(self, direction='U'):
-        self.screen.fill((0, 0, 0))
-        for i in range(self.game_state.height):
-            for j in range(self.game_state.width):
-                x = self.x_offset + j * (self.block_size + self.margin)
-                y = self.y_offset + i * (self.block_size + self.margin)
-                rect = pygame.Rect(x, y, self.block_size, self.block_size)
-                if self.game_state.is_wall((i, j)):
-                    self.screen.blit(self.wall_image, rect)
-                elif self.game_state.is_box((i, j)):
-                    if self.game_state.is_target((i, j)):
-                        self.screen.blit(self.box_on_target_image, rect)
-                    else:
-                        self.screen.blit(self.box_image, rect)
-                elif self.game_state.is_target((i, j)):
-                    self.screen.blit(self.target_image, rect)
+    def tile_rect(self, cell):
+        """Get the screen rectangle of a level cell"""
+        row, col = self.game_state.level.position(cell)
+        x = self.x_offset + col * (self.block_size + self.margin)
+        y = self.y_offset + row * (self.block_size + self.margin)
+        return pygame.Rect(x, y, self.block_size, self.block_size)
+
+    def render_background(self):
+        """Draw the tiles that never change: walls, floor and targets"""
+        level = self.game_state.level
+        background = pygame.Surface((self.width, self.height))
+        background.fill(BACKGROUND)
+        for row in range(level.height):
+            for col in range(level.width):
+                cell = level.cell(row, col)
+                if level.walls[cell]:
+                    image = self.images['wall']
+                elif level.targets[cell]:
+                    image = self.images['target']
                 else:
-                    self.screen.blit(self.floor_image, rect)
-        player_row, player_col = self.game_state.find_player()
-        x = self.x_offset + player_col * (self.block_size + self.margin)
-        y = self.y_offset + player_row * (self.block_size + self.margin)
-        rect = pygame.Rect(x, y, self.block_size, self.block_size)
-        if direction == 'U':
-            self.screen.blit(self.player_up_image, rect)
-        elif direction == 'D':
-            self.screen.blit(self.player_down_image, rect)
-        elif direction == 'L':
-            self.screen.blit(self.player_left_image, rect)
-        elif direction == 'R':
-            self.screen.blit(self.player_right_image, rect)
-        else:
-            raise Exception('Invalid direction')
+                    image = self.images['floor']
+                background.blit(image, self.tile_rect(cell))
+        return background
+
+    def draw_tile(self, cell):
+        """Redraw one tile from the background plus its box or player; returns its rect"""
+        state = self.game_state
+        rect = self.tile_rect(cell)
+        self.screen.blit(self.background, rect, rect)
+        if (state.box_mask >> cell) & 1:
+            name = 'box_on_target' if state.level.targets[cell] else 'box'
+            self.screen.blit(self.images[name], rect)
+        if cell == state.player_cell:
+            self.screen.blit(self.images['player_' + self.direction], rect)
+        return rect
+
+    def draw(self, direction=None):
+        """Redraw the whole window"""
+        if direction is not None:
+            if 'player_' + direction not in self.images:
+                raise Exception('Invalid direction')
+            self.direction = direction
+        self.screen.blit(self.background, (0, 0))
+        for cell in iter_cells(self.game_state.box_mask):
+            self.draw_tile(cell)
+        if self.game_state.player_cell is not None:
+            self.draw_tile(self.game_state.player_cell)
+        self.status = None
+        self.draw_status()
+        pygame.display.flip()
+
+    def draw_status(self):
+        """Redraw the status bar if its text changed; returns the dirty rects"""
+        text = self.status_text()
+        if text == self.status:
+            return []
+        self.status = text
+        rect = pygame.Rect(0, self.height, self.width, STATUS_HEIGHT)
+        self.screen.fill(BACKGROUND, rect)
+        self.screen.blit(self.font.render(text, True, STATUS_COLOR), (self.margin, self.height + 4))
+        return [rect]
+
+    def status_text(self):
+        if self.solver_thread is not None:
+            stats = self.progress
+            if stats is None:
+                return 'Solving...'
+            return 'Solving... %.1fs  %d expanded  f=%s' % (stats.elapsed, stats.expanded_states,
+                                                            stats.current_f)
+        if self.solution is None:
+            return 'No solution'
+        playback = self.playback
+        state = 'paused' if playback.paused else '%sx' % playback.moves_per_second
+        return '%d/%d  %s  %s' % (playback.step, len(self.solution), state, KEYS_HELP)
+
+    def draw_no_solution_image(self):
+        # Display the "No Solution" image over the level
+        self.screen.blit(self.images['no_solution'], (0, 0))
         pygame.display.flip()
 
+    def draw_move(self, played):
+        """Redraw only the tiles a played (previous state, move) changed"""
+        if played is None:
+            return []
+        previous, direction = played
+        self.game_state = self.playback.state
+        self.direction = direction
+        changed = {previous.player_cell, self.game_state.player_cell}
+        changed.update(iter_cells(previous.box_mask ^ self.game_state.box_mask))
+        return [self.draw_tile(cell) for cell in changed]
+
+    def restart(self):
+        self.playback.restart()
+        self.game_state = self.initial_state
+        self.draw()
 
     def draw_solution(self):
+        """Replay the whole solution from the start and return once it has played
+
+        The moves are played by the event loop, so the window keeps handling
+        events and the replay controls while it runs.
+        """
         if self.solution is None:
             print("No solution available.")
             self.draw_no_solution_image()
             return
-        for i in range(len(self.solution)):
-            self.game_state = self.game_state.move(self.solution[i])
-            self.draw(self.solution[i])
-            time.sleep(0.5)
-    def draw_no_solution_image(self):
-        # Load and display a "No Solution" image
-        no_solution_image = pygame.image.load(os.path.join('assets', 'no_solution.png'))
-        self.screen.blit(no_solution_image, (0, 0))
-        pygame.display.flip()
+        self.restart()
+        self.playback.paused = False
+        while not self.playback.done:
+            self.run_frame()
+
+    def handle_key(self, key):
+        """Apply a replay control; returns the dirty rects"""
+        if key in (K_ESCAPE, K_q):
+            self.quit()
+        if self.solver_thread is not None or self.solution is None:
+            return []
+        playback = self.playback
+        if key == K_SPACE:
+            playback.toggle_pause()
+        elif key in (K_RIGHT, K_n):
+            return self.draw_move(playback.step_once())
+        elif key in (K_UP, K_PLUS, K_EQUALS, K_KP_PLUS):
+            playback.faster()
+        elif key in (K_DOWN, K_MINUS, K_KP_MINUS):
+            playback.slower()
+        elif key == K_r:
+            self.restart()
+        return []
+
+    def solve_in_background(self):
+        """Start the solver in a thread, publishing its progress to the window"""
+        solver = self.solver
+        if solver.instrumentation is None:
+            solver.instrumentation = Instrumentation(0.25)
+        solver.instrumentation.add_hook(self.on_progress)
+        self.solver_thread = threading.Thread(target=solver.solve, daemon=True)
+        self.solver_thread.start()
+
+    def on_progress(self, event, stats):
+        # Runs in the solver thread; the window only reads this reference
+        self.progress = stats
+
+    def check_solver(self):
+        """Pick up the solution once the background solver is done"""
+        if self.solver_thread is None or self.solver_thread.is_alive():
+            return
+        self.solver_thread = None
+        self.solution = self.solver.get_solution()
+        if self.solution is not None:
+            self.playback = Playback(self.initial_state, self.solution)
+        if self.on_solved is not None:
+            self.on_solved(self.solver)
+        if self.solver.stats.stopped:
+            self.quit()  # Stopped by a signal, with its checkpoint saved
+        if self.solution is None:
+            self.draw_no_solution_image()
+
+    def quit(self):
+        pygame.quit()
+        sys.exit()
+
     def start(self):
         self.init_pygame()
+        if self.solver is not None and self.solution is None:
+            self.solve_in_background()
         self.draw()
-        self.draw_solution()
+        if self.solver is None and self.solution is None:
+            print("No solution available.")
+            self.draw_no_solution_image()
         while True:
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    pygame.quit()
-                    sys.exit()
-            self.clock.tick(60)
+            self.run_frame()
+
+    def run_frame(self):
+        """Handle pending events, play the moves that are due and update the screen"""
+        dirty = []
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                self.quit()
+            elif event.type == KEYDOWN:
+                dirty.extend(self.handle_key(event.key))
+        self.check_solver()
+        elapsed = self.clock.tick(60)
+        if self.playback is not None and self.solver_thread is None:
+            # Play as many moves as the speed allows for the time that passed
+            for played in self.playback.tick(elapsed):
+                dirty.extend(self.draw_move(played))
+        dirty.extend(self.draw_status())
+        if dirty:
+            pygame.display.update(dirty)
@@ -0,0 +1,208 @@
+# Heuristic engine for the informed strategies
+# True push distances are precomputed once per level; a state's estimate is
+# the cost of the cheapest box-to-target assignment over those distances.
+#
+# Path: modules/heuristic.py
+
+from modules.level import iter_cells
+
+METHODS = ('hungarian', 'greedy', 'manhattan')
+INFINITY = float('inf')
+
+# Stand-in cost for a box that cannot reach a target at all; any assignment
+# that has to use it means the state is unsolvable
+UNREACHABLE = 1 << 30
+
+
+def push_distances(level, target):
+    """Get the minimum number of pushes moving a box from every cell to the target
+
+    Boxes are pulled backwards from the target while ignoring the other
+    boxes, so the table is a lower bound for the real push count.
+    """
+    walls = level.walls
+    distances = [UNREACHABLE] * level.size
+    distances[target] = 0
+    frontier = [target]
+    while frontier:
+        next_frontier = []
+        for cell in frontier:
+            for delta in level.deltas:
+                previous = cell - delta
+                if distances[previous] != UNREACHABLE or walls[previous] or walls[previous - delta]:
+                    continue
+                distances[previous] = distances[cell] + 1
+                next_frontier.append(previous)
+        frontier = next_frontier
+    return distances
+
+
+class Heuristic(object):
+    """Estimate the remaining cost of a state
+
+    hungarian
+        Optimal box-to-target assignment over push distances. The assignment
+        and its dual potentials are kept on the node, so after a push only the
+        moved box's row is re-inserted (O(n^2) instead of O(n^3)).
+    greedy
+        Every box takes its nearest target by push distance. Cheaper and
+        still admissible, but several boxes may claim the same target.
+    manhattan
+        The original Manhattan distance to the nearest target.
+    """
+
+    def __init__(self, level, method='hungarian'):
+        if method not in METHODS:
+            raise Exception('Invalid heuristic')
+        self.level = level
+        self.method = method
+        self.targets = level.target_cells
+        self.distances = get_push_tables(level)
+        self.nearest = [min(distances) for distances in zip(*self.distances)] \
+            if self.targets else [UNREACHABLE] * level.size
+
+    def evaluate(self, state, parent=None):
+        """Compute, cache and return the heuristic of a state
+
+        When the parent is given and already evaluated, only the box that
+        moved between the two states is taken into account.
+        """
+        if state.h is not None:
+            return state.h
+        if parent is not None and parent.h is not None:
+            changed = parent.box_mask ^ state.box_mask
+            if not changed:
+                state.h = parent.h
+                state.heuristic_data = parent.heuristic_data
+                return state.h
+            if self.method == 'hungarian' and parent.heuristic_data is not None:
+                old_cell = (parent.box_mask & changed).bit_length() - 1
+                new_cell = (state.box_mask & changed).bit_length() - 1
+                state.h, state.heuristic_data = self.reassign(parent.heuristic_data, old_cell, new_cell)
+                return state.h
+        if self.method == 'hungarian':
+            state.h, state.heuristic_data = self.assign(state.box_mask)
+        elif self.method == 'greedy':
+            state.h = self.nearest_cost(state.box_mask)
+        else:
+            state.h = self.manhattan_cost(state)
+        return state.h
+
+    def nearest_cost(self, boxes):
+        """Sum the push distance from every box to its nearest target"""
+        total = 0
+        for cell in iter_cells(boxes):
+            total += self.nearest[cell]
+        return INFINITY if total >= UNREACHABLE else total
+
+    def manhattan_cost(self, state):
+        """Sum the Manhattan distance from every box to its nearest target"""
+        position = self.level.position
+        targets = [position(cell) for cell in self.targets]
+        heuristic = 0
+        for cell in iter_cells(state.box_mask):
+            row, col = position(cell)
+            heuristic += min([abs(row - target[0]) + abs(col - target[1]) for target in targets] or [0])
+        return heuristic
+
+    def assign(self, boxes):
+        """Solve the box-to-target assignment from scratch
+
+        Returns the cost and the assignment data (rows, u, v, p) used for
+        incremental updates: rows lists the box cell of each row (1-based),
+        u and v are the dual potentials and p maps each target column to the
+        row assigned to it.
+        """
+        rows = [None] + list(iter_cells(boxes))
+        n = len(rows) - 1
+        m = len(self.targets)
+        if n > m:
+            return INFINITY, None
+        u = [0] * (n + 1)
+        v = [0] * (m + 1)
+        p = [0] * (m + 1)
+        for row in range(1, n + 1):
+            self._insert(row, rows, u, v, p)
+        return self._cost(rows, p), (rows, u, v, p)
+
+    def reassign(self, data, old_cell, new_cell):
+        """Update a parent's assignment after one box moved from old_cell to new_cell"""
+        rows, u, v, p = data
+        if len(rows) - 1 != len(self.targets):
+            # Potentials of unassigned targets must stay zero, which removing a
+            # row does not guarantee, so rectangular problems start over
+            boxes = 0
+            for cell in rows[1:]:
+                boxes |= 1 << (new_cell if cell == old_cell else cell)
+            return self.assign(boxes)
+        rows = rows[:]
+        u = u[:]
+        v = v[:]
+        p = p[:]
+        row = rows.index(old_cell)
+        rows[row] = new_cell
+        p[p.index(row, 1)] = 0
+        # With v <= 0 a zero potential keeps every reduced cost of the row non-negative
+        u[row] = 0
+        self._insert(row, rows, u, v, p)
+        return self._cost(rows, p), (rows, u, v, p)
+
+    def _insert(self, row, rows, u, v, p):
+        """Assign one more row with a shortest augmenting path (Hungarian algorithm)"""
+        distances = self.distances
+        m = len(p) - 1
+        minv = [INFINITY] * (m + 1)
+        used = [False] * (m + 1)
+        way = [0] * (m + 1)
+        p[0] = row
+        j0 = 0
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            cell = rows[i0]
+            delta = INFINITY
+            j1 = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    current = distances[j - 1][cell] - u[i0] - v[j]
+                    if current < minv[j]:
+                        minv[j] = current
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    def _cost(self, rows, p):
+        """Sum the push distances of an assignment"""
+        total = 0
+        for j in range(1, len(p)):
+            if p[j]:
+                total += self.distances[j - 1][rows[p[j]]]
+        return INFINITY if total >= UNREACHABLE else total
+
+
+def get_push_tables(level):
+    """Get the push distances to every target of a level, computing them on first use"""
+    if level.push_tables is None:
+        level.push_tables = [push_distances(level, target) for target in level.target_cells]
+    return level.push_tables
+
+
+def get_heuristic(level):
+    """Get the default heuristic of a level, building it on first use"""
+    if level.heuristic is None:
+        level.heuristic = Heuristic(level)
+    return level.heuristic
@@ -0,0 +1,142 @@
+# Search instrumentation
+# A structured statistics object for every solve, plus optional event hooks
+# that receive periodic progress reports while the search is running.
+#
+# Path: modules/instrumentation.py
+
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Not available on Windows
+
+PHASES = ('move_generation', 'heuristic', 'hashing')
+EVENTS = ('start', 'progress', 'solution', 'finish')
+
+# Rough CPython sizes used for the memory estimate: a set/dict slot with its
+# integer hash key, and a box mask integer of a typical level
+CLOSED_ENTRY_SIZE = 16 + 32
+BOX_MASK_SIZE = 48
+
+
+class SearchStats(object):
+    """Statistics of one solve, updated while the search runs
+
+    best_f/best_g/best_h describe the expanded node with the lowest h so far;
+    current_f is the f of the node expanded last.
+    """
+
+    def __init__(self, strategy, mode):
+        self.strategy = strategy
+        self.mode = mode
+        self.solved = False
+        self.moves = None
+        self.expanded_states = 0
+        self.generated_states = 0
+        self.frontier_size = 0
+        self.closed_size = 0
+        self.current_f = None
+        self.best_f = None
+        self.best_g = None
+        self.best_h = None
+        self.elapsed = 0.0
+        self.nodes_per_second = 0.0
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.memory_estimate = 0
+        self.peak_rss_kb = 0
+        self.traced_memory_peak = None
+        self.pruned = {}
+        self.cache_hit = False
+        self.spilled_bytes = 0
+        self.macro_pushes = {}  # Pushes folded into macro steps, by macro kind
+        self.suboptimality = None  # Proven bound on moves / optimal of an anytime solution
+        self.deadline_reached = False  # Whether anytime stopped at its deadline
+        self.stopped = False  # Whether a stop request ended the search early
+        self.optimization = None  # Move and push counts before and after post-optimization
+        self.open_list = None  # Size and duplicate figures of the bucket open list
+        self.resumed_elapsed = None  # Seconds spent before the checkpoint this solve resumed
+        self.checkpoint_saves = 0
+        self.checkpoint_bytes = 0
+
+    def as_dict(self):
+        """Get the statistics as a plain dict"""
+        stats = dict(self.__dict__)
+        stats['phase_times'] = dict(self.phase_times)
+        stats['pruned'] = dict(self.pruned)
+        return stats
+
+    def __repr__(self):
+        return 'SearchStats(%r)' % self.as_dict()
+
+
+def estimate_memory(frontier_size, closed_size, node_size):
+    """Estimate the bytes held by the open and closed lists"""
+    return frontier_size * (node_size + BOX_MASK_SIZE) + closed_size * CLOSED_ENTRY_SIZE
+
+
+def print_progress(event, stats):
+    """A hook printing one line per event to stderr"""
+    phases = ' '.join('%s=%.2fs' % (phase, seconds) for phase, seconds in stats.phase_times.items()
+                      if seconds)
+    if event == 'solution':
+        phases = 'moves=%s bound=%s %s' % (stats.moves, stats.suboptimality, phases)
+    print('[%s] %.1fs expanded=%d (%.0f/s) frontier=%d closed=%d f=%s best g/h=%s/%s mem~%.1fMB %s'
+          % (event, stats.elapsed, stats.expanded_states, stats.nodes_per_second,
+             stats.frontier_size, stats.closed_size, stats.current_f, stats.best_g,
+             stats.best_h, stats.memory_estimate / 1048576.0, phases), file=sys.stderr)
+
+
+class Instrumentation(object):
+    """Event hooks and phase timing for a solver
+
+    Hooks are called as hook(event, stats) with event in EVENTS. Progress
+    events are published at most once per interval seconds; anytime
+    strategies publish a solution event for every improved solution. With
+    phase_timing=True the solver wraps move generation, heuristic evaluation
+    and hashing so the time spent in each is accumulated in the stats.
+    """
+
+    def __init__(self, interval=1.0, hooks=(), phase_timing=False):
+        self.interval = interval
+        self.hooks = list(hooks)
+        self.phase_timing = phase_timing
+        self.next_report = None
+
+    def add_hook(self, hook):
+        """Register a callback receiving (event, stats)"""
+        self.hooks.append(hook)
+
+    def emit(self, event, stats):
+        """Call every hook with an event"""
+        for hook in self.hooks:
+            hook(event, stats)
+
+    def due(self):
+        """Check if the next progress report should be published now"""
+        now = time.time()
+        if self.next_report is None or now >= self.next_report:
+            self.next_report = now + self.interval
+            return True
+        return False
+
+    def wrap(self, phase, function, stats):
+        """Wrap a function so its running time is added to a phase of the stats"""
+        phase_times = stats.phase_times
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                phase_times[phase] += clock() - start
+        return timed
+
+
+def peak_rss_kb():
+    """Get the peak resident set size of this process in KB, or None where it is unknown"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
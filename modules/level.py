@@ -0,0 +1,164 @@
+# Static level data shared by every game state of a search
+# Walls, targets and the Zobrist tables live here once, so a search node
+# only needs to carry the player cell and the box layout.
+#
+# Path: modules/level.py
+
+import random
+
+DIRECTIONS = ('U', 'D', 'L', 'R')
+OFFSETS = {'U': (-1, 0), 'D': (1, 0), 'L': (0, -1), 'R': (0, 1)}
+
+WALL = '#'
+PLAYER = ('@', '+')
+BOXES = ('$', '*')
+TARGETS = ('.', '*', '+')
+
+# Fixed seed so that the same level always hashes the same way, even when it
+# is rebuilt in another process
+ZOBRIST_SEED = 0x50C0BA
+
+
+def iter_cells(mask):
+    """Yield the cell indexes of the bits set in the given mask"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def player_region(level):
+    """Flood fill the floor the player could walk on if every box were out of the way
+
+    Returns the visited cells as a bytearray; it is empty for a level
+    without a player.
+    """
+    region = bytearray(level.size)
+    if level.start_player is None:
+        return region
+    region[level.start_player] = 1
+    stack = [level.start_player]
+    while stack:
+        cell = stack.pop()
+        for delta in level.deltas:
+            next_cell = cell + delta
+            if not region[next_cell] and not level.walls[next_cell]:
+                region[next_cell] = 1
+                stack.append(next_cell)
+    return region
+
+
+def trim(map):
+    """Get the map with every floor cell the player can never reach turned into wall
+
+    The grid keeps its size, so positions and moves are unchanged. A box
+    can only be pushed onto cells the player could walk to with the boxes
+    out of the way, so nothing the search can reach is lost. Boxes and
+    targets outside that region are kept, since they still decide whether
+    the level can be solved.
+    """
+    level = Level(map)
+    region = player_region(level)
+    rows = []
+    for row in range(level.height):
+        chars = []
+        for col in range(level.width):
+            char = map[row][col] if col < len(map[row]) else ' '
+            cell = level.cell(row, col)
+            if not region[cell] and not level.targets[cell] and not (level.start_boxes >> cell) & 1:
+                char = WALL
+            chars.append(char)
+        rows.append(chars)
+    return rows
+
+
+class Level(object):
+    """Walls, targets and cell geometry of a map
+
+    Cells are indexed row by row on a grid padded with a ring of walls, so a
+    move is a single addition and never needs a bounds check.
+    """
+
+    def __init__(self, map):
+        self.height = len(map)
+        self.width = max([len(row) for row in map] or [0])
+        self.stride = self.width + 2
+        self.size = self.stride * (self.height + 2)
+        self.delta = {'U': -self.stride, 'D': self.stride, 'L': -1, 'R': 1}
+        self.deltas = tuple(self.delta[direction] for direction in DIRECTIONS)
+
+        self.walls = bytearray(b'\x01' * self.size)
+        self.targets = bytearray(self.size)
+        self.target_mask = 0
+        self.start_player = None
+        self.start_boxes = 0
+        for row in range(self.height):
+            for col in range(self.width):
+                char = map[row][col] if col < len(map[row]) else ' '
+                cell = self.cell(row, col)
+                if char == WALL:
+                    continue
+                self.walls[cell] = 0
+                if char in TARGETS:
+                    self.targets[cell] = 1
+                    self.target_mask |= 1 << cell
+                if char in BOXES:
+                    self.start_boxes |= 1 << cell
+                if char in PLAYER:
+                    self.start_player = cell
+        self.target_cells = tuple(iter_cells(self.target_mask))
+
+        # Default heuristic engine, built on first use by modules.heuristic
+        self.heuristic = None
+        # Push distance tables and dead squares, computed on first use and then
+        # shared by every solver of this level
+        self.push_tables = None
+        self.dead_squares = None
+        # Tunnel tables and the goal room of the macro pushes, also built on first use
+        self.tunnels = None
+        self.goal_room = None
+        # Problems found when the level was compiled, None if it never was
+        self.problems = None
+
+        rng = random.Random(ZOBRIST_SEED)
+        self.zobrist_box = [rng.getrandbits(64) for _ in range(self.size)]
+        self.zobrist_player = [rng.getrandbits(64) for _ in range(self.size)]
+
+    def cell(self, row, col):
+        """Convert a (row, col) position to a cell index"""
+        return (row + 1) * self.stride + col + 1
+
+    def position(self, cell):
+        """Convert a cell index to a (row, col) position"""
+        row, col = divmod(cell, self.stride)
+        return row - 1, col - 1
+
+    def contains(self, position):
+        """Check if the given position lies on the map"""
+        row, col = position
+        return 0 <= row < self.height and 0 <= col < self.width
+
+    def zobrist(self, player, boxes):
+        """Compute the Zobrist hash of a player cell and a box mask"""
+        value = self.zobrist_player[player] if player is not None else 0
+        for cell in iter_cells(boxes):
+            value ^= self.zobrist_box[cell]
+        return value
+
+    def render(self, player, boxes):
+        """Render a player cell and a box mask back to a list-of-lists map"""
+        map = []
+        for row in range(self.height):
+            line = []
+            for col in range(self.width):
+                cell = self.cell(row, col)
+                if self.walls[cell]:
+                    line.append(WALL)
+                elif cell == player:
+                    line.append('+' if self.targets[cell] else '@')
+                elif boxes >> cell & 1:
+                    line.append('*' if self.targets[cell] else '$')
+                else:
+                    line.append('.' if self.targets[cell] else ' ')
+            map.append(line)
+        return map
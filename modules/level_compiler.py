@@ -0,0 +1,172 @@
+# Level compilation
+# A map is validated and trimmed once, and the tables every search derives
+# from its walls and targets (push distances and dead squares) are built up
+# front. The macro tables (tunnels and the goal room) cost O(size^2) and only
+# macro searches read them, so they are left to be built on first use.
+# The result can be saved as a small artifact keyed by the map's content
+# hash, so later runs on the same level load the tables instead of
+# recomputing them.
+#
+# Path: modules/level_compiler.py
+
+import hashlib
+import os
+import pickle
+import tempfile
+import zlib
+from array import array
+
+from modules.deadlock import find_dead_squares
+from modules.heuristic import get_push_tables
+from modules.level import Level, BOXES, PLAYER, TARGETS, iter_cells, player_region, trim
+
+# Bumped whenever the artifact layout or one of its tables changes meaning
+VERSION = 1
+
+
+def map_hash(map):
+    """Get the content hash of a map, which keys its compiled artifact"""
+    text = '\n'.join(''.join(row) for row in map)
+    return hashlib.sha256(('%d\n%s' % (VERSION, text)).encode('utf-8')).hexdigest()
+
+
+def count_cells(map, chars):
+    """Count the cells of a map holding one of the given characters"""
+    return sum(1 for row in map for char in row if char in chars)
+
+
+def validate(map):
+    """Get the problems of a map as a list of messages; empty when it is sound
+
+    Besides the counts, the player's region is checked: it must be closed
+    off by walls, and every box and target outside it can never be used.
+    """
+    players = count_cells(map, PLAYER)
+    boxes = count_cells(map, BOXES)
+    targets = count_cells(map, TARGETS)
+    problems = []
+    if players != 1:
+        problems.append('expected one player, found %d' % players)
+    if boxes != targets:
+        problems.append('%d boxes for %d targets' % (boxes, targets))
+    if players != 1:
+        return problems
+    level = Level(map)
+    region = player_region(level)
+    edge = [level.cell(row, col) for row in range(level.height) for col in range(level.width)
+            if row in (0, level.height - 1) or col in (0, level.width - 1)]
+    if any(region[cell] for cell in edge):
+        problems.append('the player can walk off the map')
+    stuck = [cell for cell in iter_cells(level.start_boxes & ~level.target_mask) if not region[cell]]
+    if stuck:
+        problems.append('%d boxes the player can never reach' % len(stuck))
+    empty = [cell for cell in iter_cells(level.target_mask & ~level.start_boxes) if not region[cell]]
+    if empty:
+        problems.append('%d targets the player can never reach' % len(empty))
+    return problems
+
+
+def compile_level(map):
+    """Build a Level with the derived tables of every search computed
+
+    Raises an exception when the map does not have exactly one player.
+    Other problems, such as boxes and targets that do not pair up, make the
+    level unsolvable but not unusable; they are kept in level.problems.
+    """
+    problems = validate(map)
+    if count_cells(map, PLAYER) != 1:
+        raise Exception('Invalid level: %s' % '; '.join(problems))
+    level = Level(trim(map))
+    level.problems = problems
+    get_push_tables(level)
+    level.dead_squares = find_dead_squares(level)
+    return level
+
+
+def dump(level):
+    """Serialize the map and the derived tables of a compiled level
+
+    The macro tables are included when they have been built.
+    """
+    record = {
+        'version': VERSION,
+        'rows': [''.join(row) for row in level.render(level.start_player, level.start_boxes)],
+        'problems': level.problems,
+        'push_tables': [array('i', table).tobytes() for table in level.push_tables],
+        'dead_squares': bytes(level.dead_squares),
+        'tunnels': None,
+        'goal_room': None,
+    }
+    if level.tunnels is not None:
+        record['tunnels'] = tuple(bytes(table) for table in level.tunnels)
+    if level.goal_room is not None:
+        room, entrance, fill_order = level.goal_room
+        record['goal_room'] = (bytes(room) if room is not None else None, entrance, fill_order)
+    return zlib.compress(pickle.dumps(record, pickle.HIGHEST_PROTOCOL))
+
+
+def load(data):
+    """Rebuild a compiled level from dump() output"""
+    record = pickle.loads(zlib.decompress(data))
+    if record['version'] != VERSION:
+        raise Exception('Unsupported level artifact version')
+    level = Level([list(row) for row in record['rows']])
+    level.problems = record['problems']
+    tables = []
+    for data in record['push_tables']:
+        table = array('i')
+        table.frombytes(data)
+        tables.append(table.tolist())
+    level.push_tables = tables
+    level.dead_squares = bytearray(record['dead_squares'])
+    if record['tunnels'] is not None:
+        level.tunnels = tuple(bytearray(table) for table in record['tunnels'])
+    if record['goal_room'] is not None:
+        room, entrance, fill_order = record['goal_room']
+        level.goal_room = (bytearray(room) if room is not None else None, entrance, fill_order)
+    return level
+
+
+class LevelCache(object):
+    """Compiled levels stored as one file per map content hash in a directory
+
+    A map is compiled on a miss and its artifact written through a
+    temporary file, so concurrent runs never read a half-written one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, map):
+        return os.path.join(self.directory, map_hash(map) + '.level')
+
+    def get(self, map):
+        """Get the compiled Level of a map, compiling and saving it on a miss"""
+        path = self.path(map)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                level = load(data)
+            except (zlib.error, pickle.UnpicklingError, EOFError, KeyError):
+                pass  # A damaged artifact is rebuilt below
+            else:
+                self.hits += 1
+                return level
+        self.misses += 1
+        level = compile_level(map)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dump(level))
+        os.replace(temporary, path)
+        return level
+
+
+def load_level(map, cache=None):
+    """Get the compiled Level of a map, through a LevelCache when one is given"""
+    if cache is not None:
+        return cache.get(map)
+    return compile_level(map)
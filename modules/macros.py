@@ -0,0 +1,221 @@
+# Macro pushes for push-mode search
+# Some push sequences are forced: a box pushed into a one-wide tunnel is
+# always pushed on to the end, and a box entering a goal room goes straight
+# to the next target of a precomputed fill order. Those sequences become a
+# single successor, so the states in between are never hashed or queued.
+# The intermediate states stay on the successor's parent chain, which is how
+# the pushes are expanded back into moves.
+#
+# Path: modules/macros.py
+
+from collections import deque
+
+from modules.game_state import GameState
+from modules.level import iter_cells
+
+KINDS = ('tunnel', 'goal_room')
+
+# A goal room may hold at most this many cells per target; bigger areas are
+# not rooms and searching box paths through them would cost too much
+ROOM_SLACK = 3
+
+
+def find_goal_room(level):
+    """Find the smallest area holding every target that is entered through one cell
+
+    Returns (room cells as a bytearray, entrance cell), or None. The room
+    must not hold the player or any box at the start.
+    """
+    walls = level.walls
+    targets = level.target_cells
+    if not targets or level.start_player is None:
+        return None
+    best = None
+    for entrance in range(level.size):
+        if walls[entrance] or level.targets[entrance]:
+            continue
+        room = bytearray(level.size)
+        room[targets[0]] = 1
+        stack = [targets[0]]
+        count = 1
+        while stack:
+            cell = stack.pop()
+            for delta in level.deltas:
+                neighbor = cell + delta
+                if neighbor != entrance and not walls[neighbor] and not room[neighbor]:
+                    room[neighbor] = 1
+                    count += 1
+                    stack.append(neighbor)
+        if not all(room[target] for target in targets):
+            continue
+        if room[level.start_player] or any(room[cell] for cell in iter_cells(level.start_boxes)):
+            continue
+        if count > ROOM_SLACK * len(targets):
+            continue
+        if best is None or count < best[2]:
+            best = (room, entrance, count)
+    return None if best is None else best[:2]
+
+
+def push_box(state, box_cell, allowed, target=None):
+    """Breadth-first search moving one box by pushes over the allowed cells
+
+    Returns the reached states keyed by box cell, or with a target, the
+    state that first puts the box on it (None if it cannot). Each state
+    keeps its predecessors through parent links.
+    """
+    start = state.normalized()
+    seen = {(box_cell, start.player_cell)}
+    reached = {box_cell: start}
+    queue = deque([(box_cell, start)])
+    delta = state.level.delta
+    while queue:
+        cell, current = queue.popleft()
+        for pushed_cell, direction in current.get_possible_pushes():
+            new_cell = pushed_cell + delta[direction]
+            if pushed_cell != cell or not allowed[new_cell]:
+                continue
+            next_state = current.push(pushed_cell, direction).normalized()
+            key = (new_cell, next_state.player_cell)
+            if key in seen:
+                continue
+            seen.add(key)
+            if new_cell == target:
+                return next_state
+            reached.setdefault(new_cell, next_state)
+            queue.append((new_cell, next_state))
+    return None if target is not None else reached
+
+
+def plan_fill_order(level, room, entrance):
+    """Order the room's targets so each can still be reached after the previous ones
+
+    Boxes come in through the entrance from the first outside cell next
+    to it. Returns None if no such order exists.
+    """
+    outside = [entrance - delta for delta in level.deltas
+               if not level.walls[entrance - delta] and not room[entrance - delta]]
+    if not outside:
+        return None
+    allowed = bytearray(room)
+    allowed[entrance] = 1
+    order = []
+    placed = 0
+    remaining = list(level.target_cells)
+    while remaining:
+        boxes = placed | (1 << entrance)
+        state = GameState.create(level, outside[0], boxes, level.zobrist(outside[0], boxes))
+        reached = push_box(state, entrance, allowed)
+        candidates = [target for target in remaining if target in reached]
+        if not candidates:
+            return None
+        # Deepest target first, so it does not block the way to the others
+        candidates.sort(key=lambda target: reached[target].current_cost, reverse=True)
+        for target in candidates:
+            rest = [cell for cell in remaining if cell != target]
+            boxes = placed | (1 << target) | (1 << entrance)
+            check = GameState.create(level, outside[0], boxes, level.zobrist(outside[0], boxes))
+            check_reached = push_box(check, entrance, allowed)
+            if all(cell in check_reached for cell in rest):
+                break
+        else:
+            return None
+        order.append(target)
+        placed |= 1 << target
+        remaining.remove(target)
+    return order
+
+
+def get_tunnels(level):
+    """Get the cells walled on both sides across vertical and across horizontal pushes
+
+    The tables are computed on first use and then shared by every solver
+    of the level.
+    """
+    if level.tunnels is None:
+        stride = level.stride
+        walls = level.walls
+        vertical = bytearray(level.size)
+        horizontal = bytearray(level.size)
+        for cell in range(stride, level.size - stride):
+            vertical[cell] = walls[cell - 1] and walls[cell + 1]
+            horizontal[cell] = walls[cell - stride] and walls[cell + stride]
+        level.tunnels = (vertical, horizontal)
+    return level.tunnels
+
+
+def get_goal_room(level):
+    """Get the (room, entrance, fill order) of a level, computing them on first use
+
+    Room and entrance are None when the level has no goal room, and the fill
+    order is None when the room cannot be filled through its entrance.
+    """
+    if level.goal_room is None:
+        found = find_goal_room(level)
+        if found is None:
+            level.goal_room = (None, None, None)
+        else:
+            room, entrance = found
+            level.goal_room = (room, entrance, plan_fill_order(level, room, entrance))
+    return level.goal_room
+
+
+class Macros(object):
+    """Tunnel and goal-room macros of one level
+
+    A push ends in a tunnel when the player behind the box and the box
+    both have walls on the two sides across the push direction; the box is
+    then pushed on while that holds and it is not on a target. The goal room
+    fill order is chosen once so that each target, filled in turn, leaves
+    the remaining ones reachable from the entrance.
+    """
+
+    def __init__(self, level, deadlocks=None):
+        self.level = level
+        self.dead_squares = deadlocks.dead_squares if deadlocks is not None else bytearray(level.size)
+        self.vertical_tunnels, self.horizontal_tunnels = get_tunnels(level)
+        self.applied = dict.fromkeys(KINDS, 0)
+        self.room, self.entrance, self.fill_order = get_goal_room(level)
+
+    def in_tunnel(self, cell, delta):
+        """Check if a cell is walled on both sides across a push along delta"""
+        if abs(delta) == self.level.stride:
+            return self.vertical_tunnels[cell]
+        return self.horizontal_tunnels[cell]
+
+    def extend(self, state, box_cell, direction):
+        """Continue a push that just moved the box from box_cell while a macro applies
+
+        Returns the state after the last forced push; it is the given state
+        when no macro applies.
+        """
+        level = self.level
+        delta = level.delta[direction]
+        walls = level.walls
+        cell = box_cell + delta
+        while (not level.targets[cell] and self.in_tunnel(cell - delta, delta)
+               and self.in_tunnel(cell, delta)):
+            next_cell = cell + delta
+            if walls[next_cell] or (state.box_mask >> next_cell) & 1 or self.dead_squares[next_cell]:
+                break
+            state = state.push(cell, direction)
+            cell = next_cell
+            self.applied['tunnel'] += 1
+        if cell == self.entrance and self.fill_order is not None:
+            state = self.enter_room(state)
+        return state
+
+    def enter_room(self, state):
+        """Move a box that stands on the entrance to the room's next free target"""
+        room = self.room
+        inside = [cell for cell in iter_cells(state.box_mask) if room[cell]]
+        filled = len(inside)
+        if filled >= len(self.fill_order) or sorted(inside) != sorted(self.fill_order[:filled]):
+            return state
+        allowed = bytearray(room)
+        allowed[self.entrance] = 1
+        goal = push_box(state, self.entrance, allowed, self.fill_order[filled])
+        if goal is None:
+            return state
+        self.applied['goal_room'] += 1
+        return goal
@@ -0,0 +1,149 @@
+# Open list of the best-first strategies
+# Nodes are kept in buckets indexed by their integer f value, so pushing and
+# popping the best node never compares two GameStates. An index from state
+# key to entry lets a cheaper copy of a queued state replace it in place
+# instead of sitting next to it as a stale duplicate.
+#
+# Path: modules/open_list.py
+
+TIE_BREAKS = ('h', 'lifo')
+
+
+class BucketQueue(object):
+    """Priority queue over integer f values with a secondary order inside a bucket
+
+    With tie_break='h', nodes of the same f are popped lowest h first, which
+    favours nodes closest to the goal; with 'lifo' the node queued last is
+    popped first. Within one (f, h) slot the order is always LIFO. Every key
+    is queued at most once: offering a queued key again either replaces its
+    entry, when the new node is cheaper, or is dropped.
+    """
+
+    def __init__(self, tie_break='h'):
+        if tie_break not in TIE_BREAKS:
+            raise Exception('Invalid tie break')
+        self.by_h = tie_break == 'h'
+        self.buckets = []  # buckets[f][slot] is a dict key -> state, in insertion order
+        self.counts = []  # Number of nodes queued in each f bucket
+        self.lowest = []  # Lowest slot of each f bucket that may be non-empty
+        self.index = {}  # key -> (f, slot) of the queued node
+        self.min_f = 0
+        self.offered = 0
+        self.duplicates = 0
+        self.decreases = 0
+        self.peak = 0
+        # (pushed keys, removed keys) since the journal was last reset; only
+        # kept while a checkpoint needs to know what changed between saves.
+        # Pushed keys are a dict in push order, which a restore must repeat
+        # for the nodes of one slot to pop in the same order.
+        self.journal = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __bool__(self):
+        return bool(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def push(self, key, state, f, h=0):
+        """Queue a node; return False when an equal or cheaper copy is already queued"""
+        f = int(f)
+        slot = int(h) if self.by_h else 0
+        self.offered += 1
+        entry = self.index.get(key)
+        if entry is not None:
+            self.duplicates += 1
+            if entry[0] <= f:
+                return False
+            # Decrease-key: unlink the old entry, the new one goes in below
+            self.remove(key, entry)
+            self.decreases += 1
+        while len(self.buckets) <= f:
+            self.buckets.append([])
+            self.counts.append(0)
+            self.lowest.append(0)
+        slots = self.buckets[f]
+        while len(slots) <= slot:
+            slots.append({})
+        slots[slot][key] = state
+        self.counts[f] += 1
+        if slot < self.lowest[f]:
+            self.lowest[f] = slot
+        if f < self.min_f:
+            self.min_f = f
+        self.index[key] = (f, slot)
+        if self.journal is not None:
+            self.journal[0].pop(key, None)
+            self.journal[0][key] = None
+        if len(self.index) > self.peak:
+            self.peak = len(self.index)
+        return True
+
+    def pop(self):
+        """Remove and return (f, state) of the best queued node"""
+        if not self.index:
+            raise IndexError('pop from an empty queue')
+        counts = self.counts
+        while not counts[self.min_f]:
+            self.min_f += 1
+        f = self.min_f
+        slots = self.buckets[f]
+        slot = self.lowest[f]
+        while not slots[slot]:
+            slot += 1
+        self.lowest[f] = slot
+        key, state = slots[slot].popitem()
+        counts[f] -= 1
+        del self.index[key]
+        if self.journal is not None:
+            self.journal[1].add(key)
+        return f, state
+
+    def peek_f(self):
+        """Get the f value of the best queued node"""
+        if not self.index:
+            raise IndexError('peek into an empty queue')
+        while not self.counts[self.min_f]:
+            self.min_f += 1
+        return self.min_f
+
+    def peek(self):
+        """Get the (f, slot) of the best queued node; the slot is its h under tie_break='h'"""
+        f = self.peek_f()
+        slots = self.buckets[f]
+        slot = self.lowest[f]
+        while not slots[slot]:
+            slot += 1
+        self.lowest[f] = slot
+        return f, slot
+
+    def remove(self, key, entry=None):
+        """Unlink a queued node by its key"""
+        f, slot = entry or self.index[key]
+        del self.buckets[f][slot][key]
+        self.counts[f] -= 1
+        del self.index[key]
+        if self.journal is not None:
+            self.journal[1].add(key)
+
+    def get(self, key):
+        """Get the queued state of a key"""
+        f, slot = self.index[key]
+        return self.buckets[f][slot][key]
+
+    def states(self):
+        """Get every queued state, each slot's nodes in the order they were pushed"""
+        return [state for slots in self.buckets for bucket in slots for state in bucket.values()]
+
+    def report(self):
+        """Get the size and duplicate figures of the queue as a dict"""
+        return {
+            'size': len(self.index),
+            'peak': self.peak,
+            'offered': self.offered,
+            'duplicates': self.duplicates,
+            'decreases': self.decreases,
+            'duplicate_rate': self.duplicates / self.offered if self.offered else 0.0,
+        }
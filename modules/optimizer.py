@@ -0,0 +1,313 @@
+# Solution post-optimizer
+# Shortens a finished solution without searching the whole level again. The
+# pushes are replayed with shortest walks between them and positions the
+# solution comes back to are cut out. Then short windows of the trajectory
+# are re-solved: a bounded breadth-first search from one position looks for
+# a later position of the same solution that it reaches in fewer steps, and
+# the steps in between are replaced. This is done over whole pushes and over
+# single moves. A candidate is scored by the moves and pushes of the window
+# it replaces, so the solution is only replayed again when one is accepted.
+# The result is replayed before it is returned.
+#
+# Path: modules/optimizer.py
+
+import time
+
+from modules.deadlock import DeadlockDetector
+from modules.game_state import GameState
+from modules.level import DIRECTIONS
+from modules.replay import replay, to_pushes, walk_pushes
+
+METRICS = ('moves', 'pushes')
+
+
+class PostOptimizer(object):
+    """Shorten solutions of one level
+
+    metric is what must get shorter: 'moves' compares (moves, pushes) and
+    'pushes' compares (pushes, moves), so a solution is never made worse in
+    its metric. push_window and move_window bound the depth of the window
+    searches and node_limit the states each of them may visit. After
+    optimize(), ``report`` holds the move and push counts before and after.
+    """
+
+    def __init__(self, initial_state, metric='moves', push_window=6, move_window=12,
+                 node_limit=1000, time_limit=None):
+        if metric not in METRICS:
+            raise Exception('Invalid metric')
+        self.initial_state = initial_state
+        self.level = initial_state.level
+        self.metric = metric
+        self.push_window = push_window
+        self.move_window = move_window
+        self.node_limit = node_limit
+        self.time_limit = time_limit  # Seconds after which no new window is searched
+        self.deadlocks = DeadlockDetector(self.level)
+        self.report = None
+        self.stop_time = None
+
+    def score(self, moves):
+        """Get the comparable cost of a solution in the optimizer's metric"""
+        _, pushes = replay(self.initial_state, moves)
+        return (len(moves), pushes) if self.metric == 'moves' else (pushes, len(moves))
+
+    def expired(self):
+        return self.stop_time is not None and time.time() >= self.stop_time
+
+    def optimize(self, moves):
+        """Get a solution no longer than the given one in the metric
+
+        Raises an exception if the given moves do not solve the level.
+        """
+        start_time = time.time()
+        if self.time_limit is not None:
+            self.stop_time = start_time + self.time_limit
+        final, pushes = replay(self.initial_state, moves)
+        if not final.check_solved():
+            raise Exception('Not a solution')
+        self.report = {'moves_before': len(moves), 'pushes_before': pushes}
+        best = list(moves)
+        best_score = self.score(best)
+        while not self.expired():
+            candidate = self.rewalk(best)
+            candidate = self.shorten_pushes(candidate)
+            candidate = self.shorten_moves(candidate)
+            score = self.score(candidate)
+            if score >= best_score:
+                break
+            best, best_score = candidate, score
+
+        final, pushes = replay(self.initial_state, best)
+        if not final.check_solved():
+            raise Exception('Optimized moves do not solve the level')
+        self.report.update(moves_after=len(best), pushes_after=pushes,
+                           time=time.time() - start_time)
+        return best
+
+    def rewalk(self, moves):
+        """Drop push cycles and the walk after the last push, walking shortest paths in between"""
+        pushes = self.drop_cycles(to_pushes(self.initial_state, moves))
+        walked = walk_pushes(self.initial_state, pushes)
+        if walked is None or self.score(walked) > self.score(moves):
+            return moves
+        return walked
+
+    def drop_cycles(self, pushes):
+        """Cut out the pushes between two visits of the same position"""
+        state = self.initial_state.normalized()
+        kept = []
+        keys = [(state.box_mask, state.player_cell)]
+        index = {keys[0]: 0}
+        for box_cell, direction in pushes:
+            state = state.push(box_cell, direction).normalized()
+            key = (state.box_mask, state.player_cell)
+            if key in index:
+                position = index[key]
+                for dropped in keys[position + 1:]:
+                    del index[dropped]
+                del kept[position:]
+                del keys[position + 1:]
+                continue
+            kept.append((box_cell, direction))
+            keys.append(key)
+            index[key] = len(keys) - 1
+        return kept
+
+    def better(self, moves_saved, pushes_saved):
+        """Check if saving these moves and pushes improves a solution in the metric"""
+        if self.metric == 'moves':
+            return (moves_saved, pushes_saved) > (0, 0)
+        return (pushes_saved, moves_saved) > (0, 0)
+
+    def move_trajectory(self, moves):
+        """Get the (player cell, box mask) before each move and after the last one,
+        and whether each move pushes a box"""
+        state = self.initial_state
+        positions = [(state.player_cell, state.box_mask)]
+        pushed = []
+        for move in moves:
+            next_state = state.move(move)
+            pushed.append(next_state.box_mask != state.box_mask)
+            state = next_state
+            positions.append((state.player_cell, state.box_mask))
+        return positions, pushed
+
+    def push_trajectory(self, moves):
+        """Get the pushes of a solution with the trajectory the push search works on
+
+        Returns the move trajectory of move_trajectory(), the index in moves
+        of each push, the pushes as (box_cell, direction), the normalized state
+        before each push and after the last one, and a map from each of those
+        states to the index of its last visit.
+        """
+        positions, pushed = self.move_trajectory(moves)
+        indices = [index for index, push in enumerate(pushed) if push]
+        pushes = [(positions[index + 1][0], moves[index]) for index in indices]
+        state = GameState.create(self.level, self.initial_state.player_cell,
+                                 self.initial_state.box_mask, self.initial_state.zobrist)
+        states = [state.normalized()]
+        for box_cell, direction in pushes:
+            state = state.push(box_cell, direction)
+            states.append(state.normalized())
+        last = {(state.box_mask, state.player_cell): index for index, state in enumerate(states)}
+        return positions, indices, pushes, states, last
+
+    def shorten_pushes(self, moves):
+        """Replace windows of pushes by fewer pushes reaching the same later position
+
+        A candidate is scored by the moves of the re-walked window alone: the
+        walk up to the first replaced push and everything after the push that
+        follows the window stay as they are.
+        """
+        level = self.level
+        positions, indices, pushes, states, last = self.push_trajectory(moves)
+        start = 0
+        while start < len(pushes) and not self.expired():
+            found = self.search_pushes(states, last, start)
+            if found is not None:
+                end, segment = found
+                # The window runs from the walk to push start up to push end, if any
+                first = indices[start - 1] + 1 if start else 0
+                stop = indices[end] + 1 if end < len(pushes) else len(moves)
+                player, boxes = positions[first]
+                root = GameState.create(level, player, boxes, level.zobrist(player, boxes))
+                walk = walk_pushes(root, segment + pushes[end:end + 1])
+                if walk is not None and self.better(stop - first - len(walk),
+                                                    end - start - len(segment)):
+                    moves = moves[:first] + walk + moves[stop:]
+                    positions, indices, pushes, states, last = self.push_trajectory(moves)
+                    continue
+            start += 1
+        return moves
+
+    def search_pushes(self, states, last, start):
+        """Search pushes from states[start] for a later trajectory state reached in fewer pushes
+
+        last maps every trajectory state to the index of its last visit.
+        Every box may be pushed, including the ones the solution leaves in
+        place within the window. Returns (index of that state, pushes leading
+        to it), or None.
+        """
+        root = states[start]
+        root = GameState.create(self.level, root.player_cell, root.box_mask, root.zobrist)
+        index = last[(root.box_mask, root.player_cell)]
+        if index > start:
+            return index, []  # The solution comes back here
+        delta = self.level.delta
+        seen = {(root.box_mask, root.player_cell)}
+        layer = [root]
+        best = None
+        best_gain = 0
+        visited = 0
+        for depth in range(1, self.push_window + 1):
+            if not layer or len(states) - 1 - start - depth <= best_gain:
+                break
+            next_layer = []
+            for state in layer:
+                for box_cell, direction in state.get_possible_pushes():
+                    new_cell = box_cell + delta[direction]
+                    child = state.push(box_cell, direction)
+                    if self.deadlocks.is_deadlocked(child.box_mask, new_cell):
+                        continue
+                    child = child.normalized()
+                    key = (child.box_mask, child.player_cell)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    index = last.get(key, -1)
+                    if index - start - depth > best_gain:
+                        best_gain = index - start - depth
+                        best = (index, child.get_path())
+                    next_layer.append(child)
+                    visited += 1
+                if visited >= self.node_limit:
+                    return best
+            layer = next_layer
+        return best
+
+    def shorten_moves(self, moves):
+        """Replace windows of moves by fewer moves reaching the same later position
+
+        A candidate is scored by the moves and pushes of the replaced window
+        alone; the trajectory is only rebuilt when one is accepted.
+        """
+        positions, pushed = self.move_trajectory(moves)
+        last = {position: index for index, position in enumerate(positions)}
+        start = 0
+        while start < len(moves) and not self.expired():
+            found = self.search_moves(positions, last, start)
+            if found is not None:
+                end, segment, segment_pushes = found
+                if self.better(end - start - len(segment), sum(pushed[start:end]) - segment_pushes):
+                    moves = moves[:start] + segment + moves[end:]
+                    positions, pushed = self.move_trajectory(moves)
+                    last = {position: index for index, position in enumerate(positions)}
+                    continue
+            start += 1
+        return moves
+
+    def search_moves(self, positions, last, start):
+        """Search moves from positions[start] for a later position reached in fewer moves
+
+        Positions are plain (player cell, box mask) pairs here, since this
+        search visits far more of them than the push search; last maps each
+        one on the trajectory to the index of its last visit.
+        """
+        level = self.level
+        walls = level.walls
+        dead = self.deadlocks.dead_squares
+        root = positions[start]
+        if last[root] > start:
+            return last[root], [], 0  # The solution comes back here
+
+        parents = {root: None}
+        layer = [root]
+        best = None
+        best_gain = 0
+        for depth in range(1, self.move_window + 1):
+            if not layer or len(positions) - 1 - start - depth <= best_gain:
+                break
+            next_layer = []
+            for position in layer:
+                player, boxes = position
+                for direction in DIRECTIONS:
+                    delta = level.delta[direction]
+                    new_cell = player + delta
+                    if walls[new_cell]:
+                        continue
+                    new_boxes = boxes
+                    if (boxes >> new_cell) & 1:
+                        box_cell = new_cell + delta
+                        if walls[box_cell] or (boxes >> box_cell) & 1 or dead[box_cell]:
+                            continue
+                        new_boxes = boxes ^ (1 << new_cell) ^ (1 << box_cell)
+                        if self.deadlocks.is_stuck(new_boxes, box_cell):
+                            continue
+                    child = (new_cell, new_boxes)
+                    if child in parents:
+                        continue
+                    parents[child] = (position, direction)
+                    index = last.get(child, -1)
+                    if index - start - depth > best_gain:
+                        best_gain = index - start - depth
+                        best = (index, child)
+                    next_layer.append(child)
+                if len(parents) >= self.node_limit:
+                    return self.trace(parents, best)
+            layer = next_layer
+        return self.trace(parents, best)
+
+    def trace(self, parents, best):
+        """Get (index, moves, pushes) of the best position found by search_moves, or None"""
+        if best is None:
+            return None
+        index, position = best
+        segment = []
+        pushes = 0
+        while parents[position] is not None:
+            child = position
+            position, direction = parents[position]
+            segment.append(direction)
+            pushes += position[1] != child[1]
+        segment.reverse()
+        return index, segment, pushes
@@ -0,0 +1,309 @@
+# Hash-distributed parallel A* (HDA*)
+# Every state is owned by one worker process, chosen by its Zobrist hash.
+# Workers keep their own open and closed lists and send generated states to
+# their owners in batches, with the heuristic and assignment the sender
+# already computed from the parent. Every worker publishes the (f, slot) of
+# its best node in shared memory and only expands while no other worker holds
+# a better one, so the partitions together pop nodes close to the serial
+# order. The coordinating process tracks the best solution, detects
+# termination and rebuilds the path from the workers' parent records.
+#
+# Path: modules/parallel_astar.py
+
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from modules.heuristic import INFINITY
+from modules.open_list import BucketQueue
+
+# Nodes a worker expands before it flushes its outgoing batches and reads its inbox
+EXPAND_BATCH = 64
+# Seconds an idle worker blocks on its inbox, and between termination probes
+IDLE_WAIT = 0.01
+PROBE_INTERVAL = 0.02
+# Published best of a worker with nothing left to expand
+IDLE = 2 ** 62
+# Slots per f value in a published (f, slot) rank
+SLOTS = 2 ** 20
+
+
+def owner(zobrist, workers):
+    """Get the index of the worker that owns a state"""
+    return zobrist % workers
+
+
+class Worker(object):
+    """One HDA* partition: open list, best g and parent record of the states it owns
+
+    The open list orders equal-f nodes like the serial astar, lowest h first
+    and the newest first within one h, so a worker dives along a plateau
+    instead of sweeping it breadth-first. bests[i] is the rank of worker i's
+    best node; a sender lowers it before a better node reaches worker i.
+    """
+
+    def __init__(self, index, workers, map, config, inboxes, replies, bests):
+        # Imported here because the solver itself dispatches to this module
+        from modules.game_state import GameState
+        from modules.solver import Solver
+
+        self.index = index
+        self.workers = workers
+        self.inboxes = inboxes
+        self.replies = replies
+        self.bests = bests
+        self.solver = Solver(GameState(map), 'astar', **config)
+        self.by_h = self.solver.tie_break == 'h'
+        self.level = self.solver.initial_state.level
+        self.create = GameState.create
+        # key -> (key, g, zobrist, h, heuristic data)
+        self.open_list = BucketQueue(self.solver.tie_break)
+        # (player_cell, box_mask) -> (g, parent key, parent zobrist, action code)
+        self.records = {}
+        self.incumbent = INFINITY
+        self.outboxes = [[] for _ in range(workers)]
+        self.outbox_bests = [IDLE] * workers
+        self.sent = 0
+        self.received = 0
+
+    def run(self):
+        """Process messages and expand nodes until told to stop"""
+        while True:
+            if not self.read_inbox(block=not self.may_expand()):
+                return
+            self.publish()
+            for _ in range(EXPAND_BATCH):
+                if not self.may_expand():
+                    break
+                self.expand()
+                self.publish()
+                if min(self.outbox_bests) < self.bests[self.index]:
+                    break  # A child for another worker beats every node left here
+            self.flush()
+
+    def has_work(self):
+        """Check if the open list still holds a node that can beat the incumbent"""
+        return bool(self.open_list) and self.open_list.peek_f() < self.incumbent
+
+    def rank(self, f, h):
+        """Order (f, tie-break slot) pairs as one integer"""
+        return f * SLOTS + (h if self.by_h else 0)
+
+    def publish(self):
+        """Share the rank of this worker's best node"""
+        self.bests[self.index] = self.rank(*self.open_list.peek()) if self.has_work() else IDLE
+
+    def may_expand(self):
+        """Check if this worker has work and no other worker holds a better node"""
+        if not self.has_work():
+            return False
+        best = self.rank(*self.open_list.peek())
+        bests = self.bests
+        return all(best <= bests[index] for index in range(self.workers) if index != self.index)
+
+    def read_inbox(self, block):
+        """Handle every waiting message; returns False once the worker must stop"""
+        inbox = self.inboxes[self.index]
+        probes = []
+        while True:
+            try:
+                message = inbox.get(timeout=IDLE_WAIT) if block else inbox.get_nowait()
+            except queue.Empty:
+                break
+            block = False
+            kind = message[0]
+            if kind == 'nodes':
+                self.received += 1
+                for node in message[1]:
+                    self.insert(*node)
+            elif kind == 'incumbent':
+                self.incumbent = min(self.incumbent, message[1])
+            elif kind == 'probe':
+                probes.append(message[1])
+            elif kind == 'trace':
+                self.replies.put(('trace', self.records.get(message[1])))
+            elif kind == 'stop':
+                return False
+        # Answer probes only after every message that arrived with them is handled
+        for probe in probes:
+            self.replies.put(('status', probe, self.index, not self.has_work(), self.sent,
+                              self.received, self.solver.expanded_states,
+                              self.solver.generated_states))
+        return True
+
+    def insert(self, player_cell, box_mask, zobrist, g, h, data, parent_key, parent_zobrist,
+               action):
+        """Add a state this worker owns unless it is already known at a lower cost
+
+        h and data are the heuristic and assignment the sender computed; only
+        the root arrives without them.
+        """
+        key = (player_cell, box_mask)
+        record = self.records.get(key)
+        if record is not None and record[0] <= g:
+            return
+        self.records[key] = (g, parent_key, parent_zobrist, action)
+        if h is None:
+            state = self.create(self.level, player_cell, box_mask, zobrist, g)
+            h = self.solver.heuristic.evaluate(state)
+            data = state.heuristic_data
+        if h == INFINITY or g + h >= self.incumbent:
+            return
+        # A cheaper copy of a queued state replaces it, so no entry goes stale
+        self.open_list.push(key, (key, g, zobrist, h, data), g + h, h)
+
+    def expand(self):
+        """Pop the best node; report it if solved, otherwise send out its children"""
+        _, (key, g, zobrist, h, data) = self.open_list.pop()
+        state = self.create(self.level, key[0], key[1], zobrist, g)
+        if state.check_solved():
+            self.replies.put(('solution', g, key, zobrist))
+            self.incumbent = min(self.incumbent, g)
+            return
+        state.h = h
+        state.heuristic_data = data
+        encode = self.solver.encode
+        evaluate = self.solver.heuristic.evaluate
+        for next_state in self.solver.successors(state):
+            # Evaluated here from the parent's assignment, not from scratch by the owner
+            next_h = evaluate(next_state, state)
+            if next_h == INFINITY or g + 1 + next_h >= self.incumbent:
+                continue
+            node = (next_state.player_cell, next_state.box_mask, next_state.zobrist,
+                    g + 1, next_h, next_state.heuristic_data, key, zobrist,
+                    encode(next_state.action))
+            index = owner(next_state.zobrist, self.workers)
+            if index == self.index:
+                # Own children are queued at once, so the next pop can already take one
+                self.insert(*node)
+            else:
+                self.outboxes[index].append(node)
+                self.outbox_bests[index] = min(self.outbox_bests[index],
+                                               self.rank(g + 1 + next_h, next_h))
+
+    def flush(self):
+        """Send every batch of children to its owner"""
+        for index, batch in enumerate(self.outboxes):
+            if not batch:
+                continue
+            # Lowered before the batch is sent, so its owner's own update comes later
+            self.bests[index] = min(self.bests[index], self.outbox_bests[index])
+            self.inboxes[index].put(('nodes', batch))
+            self.sent += 1
+            self.outboxes[index] = []
+            self.outbox_bests[index] = IDLE
+
+
+def run_worker(index, workers, map, config, inboxes, replies, bests):
+    """Process entry point of an HDA* worker"""
+    sys.stdout = open(os.devnull, 'w')
+    Worker(index, workers, map, config, inboxes, replies, bests).run()
+
+
+class ParallelAStar(object):
+    """Coordinate HDA* workers for one level
+
+    Termination uses probe rounds: every worker reports whether it has a
+    node left that can beat the incumbent and how many batches it sent and
+    received. The search is over when two consecutive rounds report all
+    workers idle with identical counters and as many batches received as
+    sent, since no batch can still be in flight. Nodes are only dropped when
+    their f reaches the incumbent cost, so with an admissible heuristic the
+    final incumbent is optimal.
+    """
+
+    def __init__(self, solver, workers=None):
+        self.solver = solver
+        self.workers = workers or os.cpu_count() or 1
+        self.expanded_states = 0
+        self.generated_states = 0
+
+    def run(self):
+        """Search in parallel and return the actions from the root to the best goal"""
+        solver = self.solver
+        config = {'mode': solver.mode, 'deadlocks': solver.deadlocks is not None,
+                  'heuristic': solver.heuristic.method, 'tie_break': solver.tie_break}
+        context = multiprocessing.get_context()
+        inboxes = [context.Queue() for _ in range(self.workers)]
+        replies = context.Queue()
+        # Ranks only steer the expansion order, so they are read and written without a lock
+        bests = context.Array('q', [IDLE] * self.workers, lock=False)
+        map = solver.initial_state.map
+        processes = [context.Process(target=run_worker, args=(index, self.workers, map, config,
+                                                              inboxes, replies, bests))
+                     for index in range(self.workers)]
+        for process in processes:
+            process.daemon = True
+            process.start()
+
+        try:
+            root = solver.start_state()
+            inboxes[owner(root.zobrist, self.workers)].put(
+                ('nodes', [(root.player_cell, root.box_mask, root.zobrist, 0, None, None, None,
+                            None, 0)]))
+            goal = self.wait(inboxes, replies, sent=1)
+            return None if goal is None else self.trace(goal, inboxes, replies)
+        finally:
+            for inbox in inboxes:
+                inbox.put(('stop',))
+            for process in processes:
+                process.join(timeout=1)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+
+    def wait(self, inboxes, replies, sent):
+        """Collect solutions until termination; return the best goal's (key, zobrist)"""
+        incumbent = INFINITY
+        goal = None
+        probe = 0
+        statuses = {}
+        previous = None
+        last_probe = 0
+        while True:
+            if not statuses and time.time() - last_probe >= PROBE_INTERVAL:
+                probe += 1
+                last_probe = time.time()
+                for inbox in inboxes:
+                    inbox.put(('probe', probe))
+            try:
+                message = replies.get(timeout=PROBE_INTERVAL)
+            except queue.Empty:
+                continue
+            if message[0] == 'solution':
+                _, cost, key, zobrist = message
+                if cost < incumbent:
+                    incumbent = cost
+                    goal = (key, zobrist)
+                    for inbox in inboxes:
+                        inbox.put(('incumbent', cost))
+            elif message[0] == 'status' and message[1] == probe:
+                statuses[message[2]] = message[3:]
+                if len(statuses) < self.workers:
+                    continue
+                idle = all(status[0] for status in statuses.values())
+                total_sent = sent + sum(status[1] for status in statuses.values())
+                total_received = sum(status[2] for status in statuses.values())
+                counters = (total_sent, total_received)
+                self.expanded_states = sum(status[3] for status in statuses.values())
+                self.generated_states = sum(status[4] for status in statuses.values())
+                statuses = {}
+                if idle and total_sent == total_received and counters == previous:
+                    return goal
+                previous = counters if idle else None
+
+    def trace(self, goal, inboxes, replies):
+        """Follow the parent records across the owning workers back to the root"""
+        codes = []
+        key, zobrist = goal
+        while key is not None:
+            inboxes[owner(zobrist, self.workers)].put(('trace', key))
+            _, record = replies.get()
+            _, parent_key, parent_zobrist, action = record
+            if parent_key is not None:
+                codes.append(action)
+            key, zobrist = parent_key, parent_zobrist
+        codes.reverse()
+        return [self.solver.decode(code) for code in codes]
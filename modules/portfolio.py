@@ -0,0 +1,138 @@
+# Portfolio of solver configurations run side by side
+# Which strategy wins varies a lot between levels, so several configurations
+# race in separate processes and the first solution (or the best one before
+# a deadline) is kept while the remaining workers are stopped.
+#
+# Path: modules/portfolio.py
+
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+DEFAULT_MEMBERS = (
+    {'strategy': 'astar', 'mode': 'push', 'heuristic': 'hungarian'},
+    {'strategy': 'astar', 'mode': 'push', 'heuristic': 'greedy'},
+    {'strategy': 'idastar', 'mode': 'push', 'heuristic': 'hungarian'},
+    {'strategy': 'astar', 'mode': 'move', 'heuristic': 'hungarian'},
+    {'strategy': 'bfs', 'mode': 'push'},
+)
+
+# How often the runner wakes up to notice workers that died without a result
+POLL_INTERVAL = 0.1
+
+
+def parse_members(text):
+    """Parse members written as strategy[:mode[:heuristic]], separated by commas"""
+    members = []
+    for item in text.split(','):
+        fields = item.strip().split(':')
+        member = {'strategy': fields[0]}
+        if len(fields) > 1 and fields[1]:
+            member['mode'] = fields[1]
+        if len(fields) > 2 and fields[2]:
+            member['heuristic'] = fields[2]
+        members.append(member)
+    return members
+
+
+def describe(member):
+    """Get the strategy[:mode[:heuristic]] name of a member"""
+    return ':'.join(member[key] for key in ('strategy', 'mode', 'heuristic') if key in member)
+
+
+def run_member(index, map, member, results):
+    """Solve the map with one member configuration and report to the queue"""
+    # Imported here because the solver itself dispatches to the portfolio
+    from modules.game_state import GameState
+    from modules.solver import Solver
+
+    sys.stdout = open(os.devnull, 'w')
+    solver = Solver(GameState(map), **member)
+    solver.solve()
+    results.put({
+        'member': index,
+        'solution': solver.get_solution(),
+        'time': solver.time,
+        'expanded_states': solver.expanded_states,
+        'generated_states': solver.generated_states,
+    })
+
+
+class Portfolio(object):
+    """Race several solver configurations on one level
+
+    With best=False the first solution wins and the other workers are
+    terminated at once. With best=True the runner keeps collecting until
+    every member has finished or the deadline expires and returns the
+    shortest solution.
+    """
+
+    def __init__(self, members=DEFAULT_MEMBERS, workers=None, deadline=None, best=False):
+        self.members = list(members)
+        self.workers = workers or os.cpu_count() or 1
+        self.deadline = deadline
+        self.best = best
+
+    def run(self, initial_state):
+        """Run the members and return (solution, winning member index, reports)"""
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        map = initial_state.map
+        reports = [{'member': describe(member), 'status': 'pending'} for member in self.members]
+        pending = list(range(len(self.members)))
+        running = {}
+        solution = None
+        winner = None
+        start_time = time.time()
+
+        try:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    index = pending.pop(0)
+                    process = context.Process(target=run_member,
+                                              args=(index, map, self.members[index], results))
+                    process.daemon = True
+                    process.start()
+                    running[index] = process
+                    reports[index]['status'] = 'running'
+
+                timeout = POLL_INTERVAL
+                if self.deadline is not None:
+                    remaining = self.deadline - (time.time() - start_time)
+                    if remaining <= 0:
+                        break
+                    timeout = min(timeout, remaining)
+                try:
+                    result = results.get(timeout=timeout)
+                except queue.Empty:
+                    for index, process in list(running.items()):
+                        if not process.is_alive() and results.empty():
+                            process.join()
+                            del running[index]
+                            reports[index]['status'] = 'failed'
+                            reports[index]['exitcode'] = process.exitcode
+                    continue
+
+                index = result.pop('member')
+                running.pop(index).join()
+                found = result['solution'] is not None
+                reports[index].update(result, status='solved' if found else 'unsolved')
+                reports[index]['moves'] = len(result['solution']) if found else None
+                del reports[index]['solution']
+                if found and (solution is None or len(result['solution']) < len(solution)):
+                    solution = result['solution']
+                    winner = index
+                    if not self.best:
+                        break
+        finally:
+            for index, process in running.items():
+                process.terminate()
+                process.join()
+                reports[index]['status'] = 'cancelled'
+            for index in pending:
+                reports[index]['status'] = 'skipped'
+            results.close()
+
+        return solution, winner, reports
@@ -0,0 +1,137 @@
+# Replaying solutions
+# Plays a list of U/D/L/R moves through GameState.move, counting pushes and
+# writing the solution in LURD notation, and converts between moves and the
+# pushes they make. Playback steps through a solution at a variable speed
+# for the window, without depending on pygame.
+#
+# Path: modules/replay.py
+
+# Replay speeds in moves per second
+SPEEDS = (0.5, 1, 2, 4, 8, 16, 32, 64)
+DEFAULT_SPEED = 2
+
+
+def replay(state, moves):
+    """Play moves from a state and return the final state and the number of pushes
+
+    Raises an exception on a move into a wall or a blocked box, which
+    GameState.move would otherwise silently ignore.
+    """
+    pushes = 0
+    for move in moves:
+        next_state = state.move(move)
+        if next_state.player_cell == state.player_cell:
+            raise Exception('Illegal move')
+        if next_state.box_mask != state.box_mask:
+            pushes += 1
+        state = next_state
+    return state, pushes
+
+
+def to_lurd(state, moves):
+    """Write moves in LURD notation: lowercase for walks, uppercase for pushes"""
+    letters = []
+    for move in moves:
+        next_state = state.move(move)
+        letter = move.lower() if next_state.box_mask == state.box_mask else move.upper()
+        letters.append(letter)
+        state = next_state
+    return ''.join(letters)
+
+
+def to_pushes(state, moves):
+    """Get the (box_cell, direction) pushes made by a list of moves"""
+    pushes = []
+    for move in moves:
+        next_state = state.move(move)
+        if next_state.box_mask != state.box_mask:
+            pushes.append((next_state.player_cell, move))
+        state = next_state
+    return pushes
+
+
+def walk_pushes(state, pushes):
+    """Expand pushes into moves, walking the player to each box by a shortest path
+
+    Returns None if the player cannot reach a push.
+    """
+    moves = []
+    for box_cell, direction in pushes:
+        walk = state.path_to(box_cell - state.level.delta[direction])
+        if walk is None:
+            return None
+        for step in walk:
+            state = state.move(step)
+        state = state.move(direction)
+        moves.extend(walk)
+        moves.append(direction)
+    return moves
+
+
+class Playback(object):
+    """Replay position, speed and pause state of a solution
+
+    The caller passes the milliseconds that went by to tick() once a frame
+    and draws the moves it plays; pause, single steps and speed changes
+    only change what the next tick plays.
+    """
+
+    def __init__(self, initial_state, moves):
+        self.initial_state = initial_state
+        self.moves = moves
+        self.state = initial_state
+        self.step = 0
+        self.paused = False
+        self.speed = SPEEDS.index(DEFAULT_SPEED)
+        self.elapsed = 0  # Milliseconds played toward the next move
+
+    @property
+    def done(self):
+        return self.step >= len(self.moves)
+
+    @property
+    def moves_per_second(self):
+        return SPEEDS[self.speed]
+
+    def advance(self):
+        """Play the next move; returns (previous state, move), or None at the end"""
+        if self.done:
+            return None
+        move = self.moves[self.step]
+        previous = self.state
+        self.state = previous.move(move)
+        self.step += 1
+        return previous, move
+
+    def tick(self, elapsed):
+        """Play the moves due after elapsed milliseconds; returns their advance() results"""
+        if self.paused or self.done:
+            return []
+        played = []
+        self.elapsed += elapsed
+        interval = 1000.0 / SPEEDS[self.speed]
+        while self.elapsed >= interval and not self.done:
+            self.elapsed -= interval
+            played.append(self.advance())
+        if self.done:
+            self.elapsed = 0
+        return played
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    def step_once(self):
+        """Pause and play a single move; returns its advance() result"""
+        self.paused = True
+        return self.advance()
+
+    def faster(self):
+        self.speed = min(self.speed + 1, len(SPEEDS) - 1)
+
+    def slower(self):
+        self.speed = max(self.speed - 1, 0)
+
+    def restart(self):
+        self.state = self.initial_state
+        self.step = 0
+        self.elapsed = 0
@@ -0,0 +1,428 @@
+# Headless solve server
+# A long-running service answering JSON Lines solve requests read from stdin
+# or a local Unix socket. Worker processes are started once and stay warm:
+# they fork from a forkserver that imported the solver once, and each keeps
+# its recently used levels with their push tables and dead squares, so a
+# small solve costs no interpreter start-up. The forkserver runs no threads
+# of its own, so a worker replaced while the server's threads run cannot
+# inherit a lock held by one of them. Requests have deadlines and can be
+# cancelled, and a worker that dies is replaced.
+#
+# Request:  {"id": "a", "level": "#####\n#@$.#\n#####", "strategy": "astar", "deadline": 5}
+# Cancel:   {"cancel": "a"}
+# Response: {"id": "a", "status": "solved", "solution": "R", "moves": 1, "pushes": 1, ...}
+#
+# Path: modules/server.py
+
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+
+from modules.collection import parse_levels
+from modules.game_state import GameState
+from modules.instrumentation import Instrumentation
+from modules.level_compiler import compile_level
+from modules.replay import replay, to_lurd
+from modules.solution_cache import SolutionCache
+from modules.solver import Solver
+
+# Solver options a request may set, with the server's defaults
+DEFAULTS = {'strategy': 'astar', 'mode': 'push', 'heuristic': 'hungarian'}
+OPTIONS = ('strategy', 'mode', 'heuristic', 'deadlocks', 'compact_paths', 'table_memory',
+           'memory_budget', 'batch_size', 'weight', 'weight_step', 'macros', 'optimize',
+           'optimize_time', 'tie_break')
+# These start processes of their own; the pool already runs one solve per worker
+REJECTED = ('portfolio', 'hdastar')
+
+# How often a running solve checks for its deadline or a cancellation
+CHECK_INTERVAL = 0.05
+# How often the server checks deadlines and collects results
+POLL_INTERVAL = 0.05
+# Seconds a solve gets to stop by itself before its worker is replaced
+GRACE = 1.0
+# Levels each worker keeps ready
+LEVEL_CACHE = 64
+
+
+def pool_context():
+    """Get the multiprocessing context workers are started with
+
+    A forkserver with the solver preloaded where the platform has one,
+    otherwise spawn, which starts every worker from a fresh interpreter.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['modules.server'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class Stopped(Exception):
+    """Raised inside a solve that ran past its deadline or was cancelled"""
+
+
+def load_level(levels, text, limit):
+    """Get the Level of a level text from a worker's cache, compiling it on a miss"""
+    level = levels.pop(text, None)
+    if level is None:
+        parsed = parse_levels(text)
+        if not parsed:
+            raise Exception('No level in the request')
+        level = compile_level(parsed[0][1])
+    levels[text] = level
+    while len(levels) > limit:
+        levels.popitem(last=False)
+    return level
+
+
+def solve_request(level, config, deadline_at, cancelled, cache):
+    """Solve one level and build the response fields
+
+    cancelled() is polled with the progress events of the solve; strategies
+    that never report progress are stopped by the server instead.
+    """
+    def check(event, stats):
+        if event != 'progress':
+            return
+        if cancelled():
+            raise Stopped('cancelled')
+        if deadline_at is not None and time.time() > deadline_at:
+            raise Stopped('timeout')
+
+    state = GameState(level)
+    remaining = None if deadline_at is None else max(deadline_at - time.time(), 0)
+    solver = Solver(state, instrumentation=Instrumentation(CHECK_INTERVAL, [check]),
+                    cache=cache, deadline=remaining, **config)
+    result = {}
+    try:
+        solver.solve()
+        if solver.stats.deadline_reached:
+            status = 'timeout'
+        else:
+            status = 'solved' if solver.get_solution() is not None else 'unsolved'
+    except Stopped as reason:
+        status = str(reason)
+        solver.update_stats()
+    except MemoryError:
+        status = 'memory'
+    # An anytime solve stopped at its deadline still has its best solution,
+    # which is returned along with the timeout
+    solution = solver.get_solution()
+    if solution is not None:
+        _, pushes = replay(state, solution)
+        result.update(solution=to_lurd(state, solution), moves=len(solution), pushes=pushes)
+    result.update(status=status, stats=solver.stats.as_dict())
+    return result
+
+
+def run_worker(index, jobs, results, cancel_flags, cache_path, level_cache):
+    """Serve jobs from a worker's queue until it receives None"""
+    sys.stdout = open(os.devnull, 'w')
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)  # The server may have its own handler
+    cache = SolutionCache(cache_path) if cache_path else None
+    levels = OrderedDict()
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        ticket, text, config, deadline_at = job
+        try:
+            level = load_level(levels, text, level_cache)
+            result = solve_request(level, config, deadline_at,
+                                   lambda: cancel_flags[index], cache)
+        except Exception as error:
+            result = {'status': 'error', 'error': str(error)}
+        results.put((index, ticket, result))
+    if cache is not None:
+        cache.close()
+
+
+class Channel(object):
+    """The output one stream of requests is answered on
+
+    Every request line gets exactly one response; wait() blocks until all
+    the requests read so far have been answered.
+    """
+
+    def __init__(self, stream, binary=False):
+        self.stream = stream
+        self.binary = binary
+        self.pending = 0
+        self.condition = threading.Condition()
+
+    def expect(self):
+        with self.condition:
+            self.pending += 1
+
+    def reply(self, response):
+        line = json.dumps(response) + '\n'
+        with self.condition:
+            try:
+                self.stream.write(line.encode('utf-8') if self.binary else line)
+                self.stream.flush()
+            except (OSError, ValueError):
+                pass  # The client went away; its other requests still finish
+            self.pending -= 1
+            self.condition.notify_all()
+
+    def wait(self):
+        with self.condition:
+            while self.pending:
+                self.condition.wait()
+
+
+class Job(object):
+    """A request waiting for, or running on, a worker"""
+
+    def __init__(self, request_id, channel, text, config, deadline_at):
+        self.request_id = request_id
+        self.channel = channel
+        self.text = text
+        self.config = config
+        self.deadline_at = deadline_at
+        self.ticket = None
+        self.worker = None
+        self.started = None
+        self.cancelled = None
+
+
+class SolveServer(object):
+    """A pool of warm solver processes shared by every client
+
+    Requests are queued and run on the first idle worker. A request past its
+    deadline (seconds, counted from its arrival) or cancelled stops at its
+    next progress check; if it has not stopped GRACE seconds later, its
+    worker is terminated and replaced by a fresh one. A worker that exits
+    while running a request is replaced too, and the request answered with
+    an error.
+    """
+
+    def __init__(self, workers=None, deadline=None, defaults=None, cache=None,
+                 level_cache=LEVEL_CACHE):
+        self.workers = workers or os.cpu_count() or 1
+        self.deadline = deadline  # Default deadline of requests without one
+        self.defaults = dict(DEFAULTS, **(defaults or {}))
+        self.cache = cache  # SolutionCache file opened by every worker
+        self.level_cache = level_cache
+        self.lock = threading.Lock()
+        self.jobs = {}  # Request id -> queued or running Job
+        self.queue = deque()
+        self.idle = []
+        self.slots = []  # (process, job queue) of each worker
+        self.tickets = 0
+        self.next_id = 0
+        self.context = None
+        self.results = None
+        self.cancel_flags = None
+        self.collector = None
+        self.closed = False
+
+    def start(self):
+        """Start the workers and the thread collecting their results"""
+        self.context = pool_context()
+        self.results = self.context.Queue()
+        self.cancel_flags = self.context.RawArray('b', self.workers)
+        self.slots = [None] * self.workers
+        for index in range(self.workers):
+            self.spawn(index)
+        self.idle = list(range(self.workers))
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def spawn(self, index):
+        jobs = self.context.Queue()
+        process = self.context.Process(
+            target=run_worker,
+            args=(index, jobs, self.results, self.cancel_flags, self.cache, self.level_cache))
+        process.daemon = True
+        process.start()
+        self.slots[index] = (process, jobs)
+
+    def parse(self, request):
+        """Get (text, config, deadline_at) of a solve request"""
+        text = request.get('level')
+        if not isinstance(text, str):
+            raise Exception('Missing level')
+        config = dict(self.defaults)
+        for option in OPTIONS:
+            if option in request:
+                config[option] = request[option]
+        if config['strategy'] in REJECTED:
+            raise Exception('Strategy not served: %s' % config['strategy'])
+        deadline = request.get('deadline', self.deadline)
+        deadline_at = None if deadline is None else time.time() + float(deadline)
+        return text, config, deadline_at
+
+    def submit(self, request, channel):
+        """Handle one decoded request line; its response goes to the channel"""
+        channel.expect()
+        if not isinstance(request, dict):
+            channel.reply({'status': 'error', 'error': 'Invalid request'})
+            return
+        if 'cancel' in request:
+            found = self.cancel(request['cancel'])
+            channel.reply({'cancel': request['cancel'], 'found': found})
+            return
+        with self.lock:
+            request_id = request.get('id')
+            if request_id is None:
+                request_id = self.next_id
+                self.next_id += 1
+            if request_id in self.jobs:
+                error = 'Duplicate id'
+            else:
+                try:
+                    job = Job(request_id, channel, *self.parse(request))
+                    error = None
+                except Exception as exception:
+                    error = str(exception)
+            if error is None:
+                self.jobs[request_id] = job
+                self.queue.append(job)
+                self.dispatch()
+        if error is not None:
+            channel.reply({'id': request_id, 'status': 'error', 'error': error})
+
+    def dispatch(self):
+        """Hand queued jobs to idle workers; the lock must be held"""
+        while self.queue and self.idle:
+            job = self.queue.popleft()
+            index = self.idle.pop()
+            self.tickets += 1
+            job.ticket = self.tickets
+            job.worker = index
+            job.started = time.time()
+            self.cancel_flags[index] = 0
+            self.slots[index][1].put((job.ticket, job.text, job.config, job.deadline_at))
+
+    def cancel(self, request_id):
+        """Cancel a queued or running request; returns False if it is unknown"""
+        with self.lock:
+            job = self.jobs.get(request_id)
+            if job is None:
+                return False
+            if job.worker is not None:
+                job.cancelled = time.time()
+                self.cancel_flags[job.worker] = 1
+                return True
+            self.queue.remove(job)
+            del self.jobs[request_id]
+        job.channel.reply({'id': request_id, 'status': 'cancelled'})
+        return True
+
+    def collect(self):
+        """Pass worker results on to their channels and enforce deadlines"""
+        while not self.closed:
+            try:
+                index, ticket, result = self.results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                result = None
+            except (OSError, ValueError):
+                return  # The result queue was closed
+            replies = []
+            with self.lock:
+                if result is not None:
+                    for job in self.jobs.values():
+                        if job.ticket == ticket:
+                            del self.jobs[job.request_id]
+                            self.idle.append(index)
+                            result.update(id=job.request_id, time=round(time.time() - job.started, 3))
+                            replies.append((job, result))
+                            break
+                replies.extend(self.expire())
+                self.dispatch()
+            for job, response in replies:
+                job.channel.reply(response)
+
+    def expire(self):
+        """Drop the jobs past their deadline or cancellation grace; the lock must be held"""
+        now = time.time()
+        replies = []
+        for job in list(self.jobs.values()):
+            if job.worker is None:
+                if job.deadline_at is not None and now > job.deadline_at:
+                    self.queue.remove(job)
+                    del self.jobs[job.request_id]
+                    replies.append((job, {'id': job.request_id, 'status': 'timeout'}))
+                continue
+            process = self.slots[job.worker][0]
+            if not process.is_alive():
+                response = {'status': 'error', 'error': 'Worker exited with code %s' % process.exitcode}
+            else:
+                if job.cancelled is not None:
+                    limit, status = job.cancelled + GRACE, 'cancelled'
+                elif job.deadline_at is not None:
+                    limit, status = job.deadline_at + GRACE, 'timeout'
+                else:
+                    continue
+                if now <= limit:
+                    continue
+                response = {'status': status}
+            process.terminate()
+            process.join()
+            self.spawn(job.worker)
+            self.idle.append(job.worker)
+            del self.jobs[job.request_id]
+            response.update(id=job.request_id, time=round(now - job.started, 3))
+            replies.append((job, response))
+        return replies
+
+    def close(self):
+        """Stop the workers once they finish their current job"""
+        self.closed = True
+        if self.collector is not None:
+            self.collector.join()
+        for process, jobs in self.slots:
+            jobs.put(None)
+        for process, jobs in self.slots:
+            process.join(GRACE)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+    def serve(self, input=None, output=None):
+        """Answer the requests of a text stream, stdin by default, until it ends"""
+        channel = Channel(output or sys.stdout)
+        for line in input or sys.stdin:
+            self.submit_line(line, channel)
+        channel.wait()
+
+    def submit_line(self, line, channel):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            channel.expect()
+            channel.reply({'status': 'error', 'error': 'Invalid JSON'})
+            return
+        self.submit(request, channel)
+
+    def serve_socket(self, path):
+        """Answer requests on a Unix socket, one channel per connection, until interrupted"""
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                channel = Channel(self.wfile, binary=True)
+                for line in self.rfile:
+                    server.submit_line(line.decode('utf-8'), channel)
+                channel.wait()
+
+        if os.path.exists(path):
+            os.remove(path)
+        listener = socketserver.ThreadingUnixStreamServer(path, Handler)
+        listener.daemon_threads = True
+        try:
+            listener.serve_forever()
+        finally:
+            listener.server_close()
+            os.remove(path)
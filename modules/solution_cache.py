@@ -0,0 +1,200 @@
+# Persistent solution cache
+# Solutions are stored in SQLite under a canonical fingerprint of the level:
+# cells the player can never reach are trimmed and the smallest of the 8
+# rotations/reflections is kept, so mirrored and rotated copies of a level
+# share one entry. Moves are stored in the canonical orientation and mapped
+# back to the caller's orientation on a hit.
+#
+# Path: modules/solution_cache.py
+
+import hashlib
+import sqlite3
+import time
+
+from modules.level import DIRECTIONS, trim as trim_level
+
+# Optimality guarantee of each strategy's solution, by search mode. 'moves'
+# and 'pushes' solutions are shortest in that metric, 'none' carries no
+# guarantee. Strategies missing here are never cached.
+GUARANTEES = {
+    'bfs': {'move': 'moves', 'push': 'pushes'},
+    'dfs': {'move': 'moves', 'push': 'pushes'},
+    'astar': {'move': 'moves', 'push': 'pushes'},
+    'idastar': {'move': 'moves', 'push': 'pushes'},
+    'hdastar': {'move': 'moves', 'push': 'pushes'},
+    'ucs': {'move': 'moves', 'push': 'pushes'},
+    'bidirectional': {'push': 'pushes'},
+    'external': {'move': 'moves', 'push': 'pushes'},
+    'portfolio': {'move': 'none', 'push': 'none'},
+    'greedy': {'move': 'none', 'push': 'none'},
+    'wastar': {'move': 'none', 'push': 'none'},
+    'anytime': {'move': 'none', 'push': 'none'},
+}
+
+# Bytes charged per entry on top of its moves, for the size limit
+ENTRY_OVERHEAD = 128
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS solutions (
+    fingerprint TEXT NOT NULL,
+    guarantee TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    moves TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (fingerprint, guarantee)
+)
+'''
+
+
+def guarantee(strategy, mode):
+    """Get the optimality guarantee of a strategy, or None if it is not cacheable"""
+    return GUARANTEES.get(strategy, {}).get(mode)
+
+
+def trim(map):
+    """Get the map as a rectangle of rows with every cell the player cannot reach walled
+
+    Boxes and targets outside the player's region are kept, since they
+    still decide whether the level can be solved.
+    """
+    rows = [''.join('-' if char == ' ' else char for char in row) for row in trim_level(map)]
+    width = len(rows[0]) if rows else 0
+
+    # Crop to the open cells plus a ring of walls
+    open_rows = [row for row in range(len(rows)) if rows[row].strip('#')]
+    if not open_rows:
+        return rows
+    open_cols = [col for col in range(width) if any(row[col] != '#' for row in rows)]
+    top, bottom = max(open_rows[0] - 1, 0), min(open_rows[-1] + 1, len(rows) - 1)
+    left, right = max(open_cols[0] - 1, 0), min(open_cols[-1] + 1, width - 1)
+    return [row[left:right + 1] for row in rows[top:bottom + 1]]
+
+
+def transform(rows, symmetry):
+    """Apply one of the 8 symmetries (transpose, flip rows, flip columns) to rows"""
+    transpose, flip_rows, flip_cols = symmetry
+    if transpose:
+        rows = [''.join(column) for column in zip(*rows)]
+    if flip_rows:
+        rows = rows[::-1]
+    if flip_cols:
+        rows = [row[::-1] for row in rows]
+    return rows
+
+
+def direction_map(symmetry):
+    """Get where each direction points after a symmetry is applied"""
+    transpose, flip_rows, flip_cols = symmetry
+    mapping = {}
+    for direction in DIRECTIONS:
+        moved = direction
+        if transpose:
+            moved = {'U': 'L', 'D': 'R', 'L': 'U', 'R': 'D'}[moved]
+        if flip_rows:
+            moved = {'U': 'D', 'D': 'U'}.get(moved, moved)
+        if flip_cols:
+            moved = {'L': 'R', 'R': 'L'}.get(moved, moved)
+        mapping[direction] = moved
+    return mapping
+
+
+SYMMETRIES = tuple((transpose, flip_rows, flip_cols)
+                   for transpose in (False, True)
+                   for flip_rows in (False, True)
+                   for flip_cols in (False, True))
+
+
+def fingerprint(map):
+    """Get (fingerprint, symmetry) of a map
+
+    The symmetry is the one taking the caller's map to the canonical form.
+    """
+    rows = trim(map)
+    best = None
+    for symmetry in SYMMETRIES:
+        text = '\n'.join(transform(rows, symmetry))
+        if best is None or text < best[0]:
+            best = (text, symmetry)
+    text, symmetry = best
+    return hashlib.sha256(text.encode('utf-8')).hexdigest(), symmetry
+
+
+class SolutionCache(object):
+    """Solutions on disk, keyed by level fingerprint and optimality guarantee
+
+    A lookup requiring 'moves' or 'pushes' only accepts an entry with that
+    same guarantee; a lookup with 'none' takes the shortest entry of any
+    kind. Once the stored entries exceed max_size bytes the least recently
+    used ones are evicted.
+    """
+
+    def __init__(self, path, max_size=64 * 1024 * 1024):
+        self.path = path
+        self.max_size = max_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, map, required):
+        """Get the cached moves of a map in its own orientation, or None"""
+        key, symmetry = fingerprint(map)
+        if required == 'none':
+            row = self.connection.execute(
+                'SELECT guarantee, moves FROM solutions WHERE fingerprint = ? '
+                'ORDER BY size LIMIT 1', (key,)).fetchone()
+        else:
+            row = self.connection.execute(
+                'SELECT guarantee, moves FROM solutions WHERE fingerprint = ? AND guarantee = ?',
+                (key, required)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.connection.execute(
+            'UPDATE solutions SET last_used = ? WHERE fingerprint = ? AND guarantee = ?',
+            (time.time(), key, row[0]))
+        self.connection.commit()
+        self.hits += 1
+        back = {moved: direction for direction, moved in direction_map(symmetry).items()}
+        return [back[move] for move in row[1]]
+
+    def store(self, map, moves, strategy, guarantee):
+        """Save a solution, keeping the existing entry if it is not longer"""
+        key, symmetry = fingerprint(map)
+        forward = direction_map(symmetry)
+        text = ''.join(forward[move] for move in moves)
+        row = self.connection.execute(
+            'SELECT length(moves) FROM solutions WHERE fingerprint = ? AND guarantee = ?',
+            (key, guarantee)).fetchone()
+        if row is not None and row[0] <= len(text):
+            return
+        now = time.time()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, guarantee, strategy, text, len(text) + ENTRY_OVERHEAD, now, now))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_size"""
+        total = self.size()
+        if total <= self.max_size:
+            return
+        rows = self.connection.execute(
+            'SELECT fingerprint, guarantee, size FROM solutions ORDER BY last_used').fetchall()
+        for key, guarantee, size in rows:
+            if total <= self.max_size:
+                break
+            self.connection.execute(
+                'DELETE FROM solutions WHERE fingerprint = ? AND guarantee = ?', (key, guarantee))
+            total -= size
+
+    def size(self):
+        """Get the bytes charged for all stored entries"""
+        return self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM solutions').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -1,168 +1,890 @@
+import cProfile
+import sys
 import time
 import heapq
+import tracemalloc
 from collections import deque
 
+from modules.checkpoint import STRATEGIES as CHECKPOINT_STRATEGIES
+from modules.deadlock import DeadlockDetector
+from modules.external_search import ExternalSearch
+from modules.game_state import GameState
+from modules.heuristic import Heuristic, INFINITY
+from modules.instrumentation import SearchStats, estimate_memory, peak_rss_kb
+from modules.macros import Macros
+from modules.open_list import BucketQueue
+from modules.optimizer import PostOptimizer
+from modules.level import DIRECTIONS
+from modules.parallel_astar import ParallelAStar
+from modules.portfolio import Portfolio, describe
+from modules.replay import walk_pushes
+from modules.solution_cache import guarantee
+from modules.trail import MoveTrail
+from modules.transposition import TranspositionTable
+from modules.vectorized import BatchExpander
+
+MODES = ('move', 'push')
+
+
 class Solver(object):
-    def __init__(self, initial_state, strategy):
+    def __init__(self, initial_state, strategy, mode='move', deadlocks=True,
+                 heuristic='hungarian', compact_paths=False, table_memory=64,
+                 portfolio=None, workers=None, instrumentation=None, profile=None,
+                 trace_memory=False, cache=None, memory_budget=256, spill_dir=None,
+                 batch_size=None, weight=2.0, weight_step=0.5, deadline=None,
+                 macros=False, optimize=False, optimize_time=None, tie_break='h',
+                 checkpoint=None, resume=False):
+        if mode not in MODES:
+            raise Exception('Invalid mode')
         self.initial_state = initial_state
         self.strategy = strategy
+        self.mode = mode
+        self.deadlocks = DeadlockDetector(initial_state.level) if deadlocks else None
+        self.heuristic = Heuristic(initial_state.level, heuristic)
+        # Tunnel and goal-room macros collapse forced push sequences into one step
+        # (external search rebuilds paths from single pulls, so it cannot use them)
+        self.macros = None
+        if batch_size is not None and macros:
+            raise Exception('Batched expansion does not support macros')
+        # Workers of hdastar rebuild states from (player, boxes) and send single
+        # actions to each other, which leaves no room for macros or a trail
+        if strategy == 'hdastar' and (macros or compact_paths):
+            raise Exception('hdastar supports neither macros nor compact paths')
+        if macros and mode == 'push' and strategy != 'external':
+            self.macros = Macros(initial_state.level, self.deadlocks)
+        # With compact paths, expanded nodes are packed into a move trail and
+        # dropped instead of staying reachable through parent links. IDA* keeps
+        # only the current path alive anyway, so it never needs one.
+        self.trail = None
+        if compact_paths and strategy not in ('idastar', 'external'):
+            self.trail = MoveTrail('L' if mode == 'push' else 'B')
+        # A checkpoint saves the open list, the closed keys and the move trail;
+        # the trail is what lets open nodes keep their paths across processes
+        self.checkpoint = checkpoint
+        self.resume = resume  # Continue from the checkpoint's snapshot if it has one
+        self.stop_requested = False  # Set by stop(), checked between expansions
+        if checkpoint is not None:
+            if strategy not in CHECKPOINT_STRATEGIES or batch_size is not None:
+                raise Exception('Checkpoints need the astar or ucs strategy')
+            self.trail = MoveTrail('L' if mode == 'push' else 'B')
+        self.table_memory = table_memory  # Transposition table cap for IDA*, in MB
+        self.portfolio_runner = portfolio
+        self.portfolio_report = None
+        self.portfolio_winner = None
+        self.workers = workers  # Worker processes of hdastar, one per core by default
+        self.memory_budget = memory_budget  # RAM for buffered children of external, in MB
+        self.spill_dir = spill_dir  # Directory for the files of external, the temp dir by default
+        self.batch_size = batch_size  # Nodes astar pops and expands at once with NumPy
+        self.weight = weight  # Heuristic weight of wastar, and the starting weight of anytime
+        self.weight_step = weight_step  # How much anytime lowers the weight per round
+        self.deadline = deadline  # Seconds after which anytime returns its best solution
+        self.tie_break = tie_break  # Order of equal-f nodes in the astar and ucs open list
+        self.open_list = None
         self.solution = None
         self.time = None
         self.expanded_states = 0
         self.generated_states = 0
         self.moves_to_goal = 0  # Initialize moves_to_goal attribute
+        self.stats = SearchStats(strategy, mode)
+        self.instrumentation = instrumentation
+        self.profile = profile  # File receiving cProfile stats of solve()
+        self.trace_memory = trace_memory
+        # Shortens the found solution without making it worse in the mode's metric
+        self.optimizer = None
+        if optimize:
+            self.optimizer = PostOptimizer(initial_state, 'pushes' if mode == 'push' else 'moves',
+                                           time_limit=optimize_time)
+        self.cache = cache  # SolutionCache consulted before searching
+        self.cache_hit = False
+        if instrumentation is not None and instrumentation.phase_timing:
+            self.successors = instrumentation.wrap('move_generation', self.successors, self.stats)
+            self.heuristic.evaluate = instrumentation.wrap('heuristic', self.heuristic.evaluate,
+                                                           self.stats)
+            self.key = instrumentation.wrap('hashing', self.key, self.stats)
 
     def solve(self):
         start_time = time.time()
+        self.start_time = start_time
+        profiler = cProfile.Profile() if self.profile else None
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.instrumentation is not None:
+            self.instrumentation.emit('start', self.stats)
+        if profiler is not None:
+            profiler.enable()
+        required = guarantee(self.strategy, self.mode) if self.cache is not None else None
+        if required is not None and self.macros is not None:
+            required = 'none'  # A fixed goal-room fill order can cost extra pushes
+        try:
+            if required is not None:
+                self.solution = self.cache.lookup(self.initial_state.map, required)
+                self.cache_hit = self.solution is not None
+            if not self.cache_hit:
+                try:
+                    self.run_strategy()
+                except (KeyboardInterrupt, SystemExit):
+                    # Keep the progress of a search that is being stopped
+                    if self.checkpoint is not None and self.checkpoint.solver is self:
+                        self.checkpoint.save()
+                    raise
+                if self.optimizer is not None and self.solution is not None:
+                    self.solution = self.optimizer.optimize(self.solution)
+                    self.stats.optimization = self.optimizer.report
+                if required is not None and self.solution is not None:
+                    self.cache.store(self.initial_state.map, self.solution, self.strategy,
+                                     required)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile)
+            if self.trace_memory:
+                self.stats.traced_memory_peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        self.time = time.time() - start_time
+
+        self.stats.solved = self.solution is not None
+        self.stats.cache_hit = self.cache_hit
+        self.stats.moves = len(self.solution) if self.solution is not None else None
+        self.update_stats()
+        if self.instrumentation is not None:
+            self.instrumentation.emit('finish', self.stats)
+
+    def run_strategy(self):
+        """Run the selected strategy and store its solution"""
         if self.strategy == 'bfs':
             self.solution = self.bfs()
         elif self.strategy == 'dfs':
             self.solution = self.dfs()
         elif self.strategy == 'astar':
-            self.solution = self.astar()
+            self.solution = self.astar() if self.batch_size is None else self.batch_astar()
+        elif self.strategy == 'idastar':
+            self.solution = self.idastar()
+        elif self.strategy == 'hdastar':
+            self.solution = self.hdastar()
         elif self.strategy == 'ucs':
             self.solution = self.ucs()
+        elif self.strategy == 'bidirectional':
+            self.solution = self.bidirectional()
+        elif self.strategy == 'external':
+            self.solution = self.external()
+        elif self.strategy == 'portfolio':
+            self.solution = self.portfolio()
         elif self.strategy == 'greedy':
             self.solution = self.greedy()
-        elif self.strategy == 'custom':
-            self.solution = self.custom()
+        elif self.strategy == 'wastar':
+            self.solution = self.wastar()
+        elif self.strategy == 'anytime':
+            self.solution = self.anytime()
         else:
             raise Exception('Invalid strategy')
-        self.time = time.time() - start_time
 
-        print(self.solution)
+    def start_state(self):
+        """Get the root node of the search for the current mode
+
+        The root is a copy of the initial state without a cached heuristic:
+        the initial state may be shared with solvers using another heuristic.
+        """
+        state = self.initial_state.clone()
+        state.h = None
+        state.heuristic_data = None
+        if self.mode == 'push':
+            return state.normalized()
+        return state
+
+    def successors(self, state):
+        """Get the states reachable from a node in one search step
+
+        In move mode a step is a single direction. In push mode it is a
+        (box_cell, direction) push and every child is normalized to the
+        canonical cell of its player region, so each box layout is stored once
+        per region instead of once per player cell. The step is kept in each
+        child's action.
+        """
+        self.expanded_states += 1
+        delta = state.level.delta
+        children = []
+        if self.mode == 'push':
+            for box_cell, direction in state.get_possible_pushes():
+                next_state = state.push(box_cell, direction)
+                moved_cell = box_cell + delta[direction]
+                if self.macros is not None:
+                    next_state = self.macros.extend(next_state, box_cell, direction)
+                    moved_cell = (next_state.box_mask & ~state.box_mask).bit_length() - 1
+                if self.is_deadlocked(next_state, moved_cell):
+                    continue
+                children.append(next_state.normalized())
+        else:
+            for direction, next_state in state.get_successors():
+                if (next_state.box_mask != state.box_mask and
+                        self.is_deadlocked(next_state, next_state.player_cell + delta[direction])):
+                    continue
+                children.append(next_state)
+        if self.trail is not None:
+            self.compact(state, children)
+        self.generated_states += len(children)
+        return children
+
+    def compact(self, state, children):
+        """Pack an expanded node into the move trail and point its children at it
+
+        The parent object can then be freed once it leaves the frontier. The
+        intermediate states of a macro push are packed along with it.
+        """
+        chain = [state]
+        while isinstance(chain[-1].parent, GameState):
+            chain.append(chain[-1].parent)
+        index = self.trail_index(chain[-1].parent)
+        for node in reversed(chain):
+            index = self.trail.add(index, self.encode(node.action))
+        for next_state in children:
+            while next_state.parent is not state:
+                next_state = next_state.parent
+            next_state.parent = index
+
+    def key(self, state):
+        """Get the closed-set key of a state"""
+        return state.zobrist
+
+    def report(self, state, frontier_size, closed_size):
+        """Track the expanded node and publish a progress report when one is due"""
+        if self.instrumentation is None:
+            return
+        stats = self.stats
+        h = state.h
+        if h is not None:
+            stats.current_f = state.current_cost + h
+            if stats.best_h is None or h < stats.best_h:
+                stats.best_h = h
+                stats.best_g = state.current_cost
+                stats.best_f = stats.current_f
+        stats.frontier_size = frontier_size
+        stats.closed_size = closed_size
+        if self.instrumentation.due():
+            self.update_stats()
+            self.instrumentation.emit('progress', self.stats)
+
+    def update_stats(self):
+        """Refresh the counters, rates and memory figures of the stats"""
+        stats = self.stats
+        stats.expanded_states = self.expanded_states
+        stats.generated_states = self.generated_states
+        stats.elapsed = time.time() - self.start_time
+        if stats.elapsed > 0:
+            stats.nodes_per_second = self.expanded_states / stats.elapsed
+        stats.memory_estimate = estimate_memory(stats.frontier_size, stats.closed_size,
+                                                sys.getsizeof(self.initial_state))
+        stats.peak_rss_kb = peak_rss_kb()
+        if self.deadlocks is not None:
+            stats.pruned = dict(self.deadlocks.pruned)
+        if self.macros is not None:
+            stats.macro_pushes = dict(self.macros.applied)
+        if self.open_list is not None:
+            stats.open_list = self.open_list.report()
+        if self.checkpoint is not None:
+            stats.checkpoint_saves = self.checkpoint.saves
+            stats.checkpoint_bytes = self.checkpoint.bytes_written
+
+    def is_deadlocked(self, state, box_cell):
+        """Check if the box just pushed to box_cell makes the state unsolvable"""
+        if self.deadlocks is None:
+            return False
+        return self.deadlocks.is_deadlocked(state.box_mask, box_cell)
+
+    def trail_index(self, parent):
+        """Get the move trail index of a node's parent; the root has -1"""
+        return -1 if parent is None else parent
+
+    def encode(self, action):
+        """Pack an action into an unsigned integer for the move trail"""
+        if action is None:
+            return 0
+        if self.mode == 'push':
+            box_cell, direction = action
+            return box_cell * 4 + DIRECTIONS.index(direction)
+        return DIRECTIONS.index(action)
+
+    def decode(self, code):
+        """Unpack an action stored in the move trail"""
+        if self.mode == 'push':
+            return code // 4, DIRECTIONS[code % 4]
+        return DIRECTIONS[code]
+
+    def path_of(self, state):
+        """Get the actions from the root to the given node"""
+        path = state.get_path()
+        while isinstance(state.parent, GameState):
+            state = state.parent
+        if isinstance(state.parent, int):
+            return [self.decode(code) for code in self.trail.path(state.parent)] + path
+        return path
+
+    def to_moves(self, path):
+        """Convert a path of search actions to the U/D/L/R moves of the player"""
+        if self.mode != 'push':
+            return path
+        return walk_pushes(self.initial_state, path)
+
+    def finish(self, state):
+        """Convert the path of a goal node to moves"""
+        moves = self.to_moves(self.path_of(state))
+        self.moves_to_goal = len(moves)  # Update moves_to_goal attribute
+        return moves
 
-    
     def bfs(self):
-        open_queue = deque([(self.initial_state, [])])
+        open_queue = deque([self.start_state()])
         closed_set = set()
 
-        start_time = time.time()
-
         while open_queue:
-            current_state, path = open_queue.popleft()
+            current_state = open_queue.popleft()
 
             if current_state.check_solved():
-                end_time = time.time()
-                print("Time taken:", round(end_time - start_time, 3), "seconds")
-                print("Expanded state:", path)
-                print("Solved:", current_state.check_solved())
-                self.moves_to_goal = len(path)  # Update moves_to_goal attribute
-                return path
-
-            current_state_hash = hash(current_state)
+                return self.finish(current_state)
+
+            current_state_hash = self.key(current_state)
             if current_state_hash not in closed_set:
                 closed_set.add(current_state_hash)
+                self.report(current_state, len(open_queue), len(closed_set))
 
-                for direction in ['U', 'D', 'L', 'R']:
-                    next_state = current_state.move(direction)
-
-                    next_state_hash = hash(next_state)
+                for next_state in self.successors(current_state):
+                    next_state_hash = self.key(next_state)
                     if next_state_hash not in closed_set:
-                        open_queue.append((next_state, path + [direction]))
+                        open_queue.append(next_state)
 
         return None
 
     def dfs(self):
         max_depth = 100  # Adjust this value as needed
-        start_time = time.time()
+        start_state = self.start_state()
 
         for depth_limit in range(1, max_depth + 1):
-            closed_set = set()
-            result = self.dfs_recursive(self.initial_state, [], depth_limit, closed_set)
-            if result:
-                end_time = time.time()
-                print("Time taken:", round(end_time - start_time, 3), "seconds")
-                print("Expanded state:", result)
-                print("Solved:", self.initial_state.check_solved())
-                self.moves_to_goal = len(result)  # Update moves_to_goal attribute
-                return result
+            closed_set = {}
+            result = self.dfs_recursive(start_state, depth_limit, closed_set)
+            if result is not None:
+                return self.finish(result)
 
         return None
 
-    def dfs_recursive(self, state, path, depth_limit, closed_set):
+    def dfs_recursive(self, state, depth_limit, closed_set):
         if state.check_solved():
-            return path
+            return state
 
         if depth_limit == 0:
             return None
 
-        for direction in ['U', 'D', 'L', 'R']:
-            next_state = state.move(direction)
-            next_state_hash = hash(next_state)
-            if next_state_hash not in closed_set:
-                closed_set.add(next_state_hash)
-                result = self.dfs_recursive(next_state, path + [direction], depth_limit - 1, closed_set)
-                if result:
+        self.report(state, depth_limit, len(closed_set))
+        for next_state in self.successors(state):
+            next_state_hash = self.key(next_state)
+            # Only skip states already searched with at least as much depth left
+            if closed_set.get(next_state_hash, -1) < depth_limit - 1:
+                closed_set[next_state_hash] = depth_limit - 1
+                result = self.dfs_recursive(next_state, depth_limit - 1, closed_set)
+                if result is not None:
                     return result
 
         return None
-    def astar(self):
-        open_list = [(self.initial_state.get_heuristic(), self.initial_state, [])]
-        heapq.heapify(open_list)
-        closed_set = set()
 
-        start_time = time.time()
+    def astar(self):
+        start_state = self.start_state()
+        if self.heuristic.evaluate(start_state) == INFINITY:
+            return None
+        open_list = BucketQueue(self.tie_break)
+        closed_set = self.restore(open_list)
+        if closed_set is None:
+            open_list.push(self.key(start_state), start_state, start_state.get_total_cost(),
+                           start_state.h)
+            closed_set = set()
+        self.open_list = open_list
+        if self.checkpoint is not None:
+            self.checkpoint.attach(self, open_list, closed_set)
 
         while open_list:
-            current_cost, current_state, path = heapq.heappop(open_list)
+            current_cost, current_state = open_list.pop()
 
             if current_state.check_solved():
-                end_time = time.time()
-                print("Time taken:", round(end_time - start_time, 3), "seconds")
-                print("Expanded state:", path)
-                print("Solved:", current_state.check_solved())
-                self.moves_to_goal = len(path)  # Update moves_to_goal attribute
-                return path
-
-            current_state_hash = hash(current_state)
-            if current_state_hash not in closed_set:
-                closed_set.add(current_state_hash)
+                return self.finish(current_state)
+
+            current_state_hash = self.key(current_state)
+            closed_set.add(current_state_hash)
+            if self.checkpoint is not None:
+                self.checkpoint.expanding(current_state)
+            self.report(current_state, len(open_list), len(closed_set))
+
+            for next_state in self.successors(current_state):
+                next_state_hash = self.key(next_state)
+                if next_state_hash not in closed_set:
+                    heuristic = self.heuristic.evaluate(next_state, current_state)
+                    if heuristic == INFINITY:
+                        continue  # Some box can no longer reach a target
+                    new_cost = next_state.current_cost + heuristic
+                    # A macro child already made the pushes it skipped; ranked by its
+                    # own h it would win every tie against its siblings, so it is
+                    # ranked by the h it had after its first push instead
+                    skipped = next_state.current_cost - current_state.current_cost - 1
+                    open_list.push(next_state_hash, next_state, new_cost, heuristic + skipped)
+            # The children hold their own assignment now
+            current_state.heuristic_data = None
+            if self.checkpoint is not None:
+                self.checkpoint.expanded(current_state_hash)
+            if self.stop_requested:
+                return self.halt()
 
-                for direction in ['U', 'D', 'L', 'R']:
-                    next_state = current_state.move(direction)
+        return None
+
+    def batch_astar(self):
+        """A* expanding up to batch_size of the best open nodes at once
+
+        Children of the whole chunk are generated and evaluated with array
+        operations. The goal test still happens when a node is popped, in f
+        order, and a chunk only takes nodes that tie with the best one on f
+        and on the tie-break slot, so solutions stay optimal.
+
+        The serial search pops a child that ties with or beats its parent's
+        (f, slot) before the parent's siblings, so while children keep doing
+        that it dives down one chain and a wide chunk would expand siblings
+        it never reaches. The chunk therefore starts at one node, doubles
+        while no child lands at or ahead of the chunk's (f, slot), and drops
+        back to one node as soon as one does. Chunks smaller than the
+        expander's min_chunk are expanded one node at a time.
+        """
+        expander = BatchExpander(self)
+        start_state = self.start_state()
+        if self.heuristic.evaluate(start_state) == INFINITY:
+            return None
+        open_list = BucketQueue(self.tie_break)
+        open_list.push(self.key(start_state), start_state, start_state.get_total_cost(),
+                       start_state.h)
+        self.open_list = open_list
+        closed_set = set()
+        width = 1
 
-                    next_state_hash = hash(next_state)
+        while open_list:
+            chunk = []
+            best = open_list.peek()
+            while open_list and len(chunk) < width and open_list.peek() == best:
+                current_cost, current_state = open_list.pop()
+                if current_state.check_solved():
+                    return self.finish(current_state)
+                closed_set.add(self.key(current_state))
+                chunk.append(current_state)
+            self.report(chunk[0], len(open_list), len(closed_set))
+
+            if len(chunk) < expander.min_chunk:
+                expanded = [self.evaluated_successors(state, closed_set) for state in chunk]
+            else:
+                expanded = expander.expand(chunk)
+            dived = False
+            for current_state, children in zip(chunk, expanded):
+                for next_state in children:
+                    next_state_hash = self.key(next_state)
                     if next_state_hash not in closed_set:
-                        new_cost = next_state.get_heuristic()
-                        heapq.heappush(open_list, (new_cost, next_state, path + [direction]))
+                        cost = next_state.current_cost + next_state.h
+                        slot = next_state.h if self.tie_break == 'h' else 0
+                        if open_list.push(next_state_hash, next_state, cost, next_state.h):
+                            dived = dived or (cost, slot) <= best
+                current_state.heuristic_data = None
+            width = 1 if dived else min(width * 2, self.batch_size)
+
+        return None
+
+    def evaluated_successors(self, state, closed_set):
+        """Get the children of a node that are not closed, with a finite heuristic set"""
+        children = []
+        for next_state in self.successors(state):
+            if (self.key(next_state) not in closed_set and
+                    self.heuristic.evaluate(next_state, state) != INFINITY):
+                children.append(next_state)
+        return children
+
+    def idastar(self):
+        """Iterative deepening A*: depth-first searches bounded by f = g + h
+
+        The depth-first search runs on an explicit stack of sibling lists, so
+        it is not limited by the recursion limit, and memory stays at the
+        current path plus a fixed-size transposition table.
+        """
+        start_state = self.start_state()
+        threshold = self.heuristic.evaluate(start_state)
+        table = TranspositionTable(self.table_memory)
+
+        while threshold != INFINITY:
+            table.new_iteration()
+            next_threshold = INFINITY
+            stack = [[start_state]]
+            while stack:
+                siblings = stack[-1]
+                if not siblings:
+                    stack.pop()
+                    continue
+                current_state = siblings.pop()
+
+                cost = current_state.current_cost + current_state.h
+                if cost > threshold:
+                    next_threshold = min(next_threshold, cost)
+                    continue
+
+                if current_state.check_solved():
+                    return self.finish(current_state)
+
+                if not table.visit(self.key(current_state), current_state.current_cost):
+                    continue
+                self.report(current_state, len(stack), 0)
+
+                children = []
+                for next_state in self.successors(current_state):
+                    if self.heuristic.evaluate(next_state, current_state) != INFINITY:
+                        children.append(next_state)
+                current_state.heuristic_data = None
+                # Siblings are popped from the end, so the most promising goes last
+                children.sort(key=lambda state: state.h, reverse=True)
+                stack.append(children)
+            threshold = next_threshold
 
         return None
 
+    def hdastar(self):
+        """A* with states partitioned across worker processes by hash (HDA*)"""
+        search = ParallelAStar(self, self.workers)
+        path = search.run()
+        self.expanded_states = search.expanded_states
+        self.generated_states = search.generated_states
+        if path is None:
+            return None
+        moves = self.to_moves(path)
+        self.moves_to_goal = len(moves)
+        return moves
+
+    def external(self):
+        """Breadth-first search with the frontier and closed set spilled to disk"""
+        search = ExternalSearch(self, self.memory_budget, self.spill_dir)
+        path = search.run()
+        self.stats.spilled_bytes = search.spilled_bytes
+        if path is None:
+            return None
+        moves = self.to_moves(path)
+        self.moves_to_goal = len(moves)
+        return moves
+
+    def portfolio(self):
+        """Race the configured portfolio members and keep the winning solution"""
+        runner = self.portfolio_runner or Portfolio()
+        solution, winner, self.portfolio_report = runner.run(self.initial_state)
+        if winner is not None:
+            self.portfolio_winner = describe(runner.members[winner])
+            self.moves_to_goal = len(solution)
+        return solution
+
     def ucs(self):
-        open_list = [(self.initial_state.get_current_cost(), self.initial_state, [])]
-        heapq.heapify(open_list)
-        closed_set = set()
+        start_state = self.start_state()
+        open_list = BucketQueue(self.tie_break)
+        closed_set = self.restore(open_list)
+        if closed_set is None:
+            open_list.push(self.key(start_state), start_state, start_state.get_current_cost())
+            closed_set = set()
+        self.open_list = open_list
+        if self.checkpoint is not None:
+            self.checkpoint.attach(self, open_list, closed_set)
 
-        start_time = time.time()
+        while open_list:
+            current_cost, current_state = open_list.pop()
+
+            if current_state.check_solved():
+                return self.finish(current_state)
+
+            current_state_hash = self.key(current_state)
+            closed_set.add(current_state_hash)
+            if self.checkpoint is not None:
+                self.checkpoint.expanding(current_state)
+            self.report(current_state, len(open_list), len(closed_set))
+
+            for next_state in self.successors(current_state):
+                next_state_hash = self.key(next_state)
+                if next_state_hash not in closed_set:
+                    open_list.push(next_state_hash, next_state, next_state.get_current_cost())
+            if self.checkpoint is not None:
+                self.checkpoint.expanded(current_state_hash)
+            if self.stop_requested:
+                return self.halt()
+
+        return None
+
+    def stop(self):
+        """Ask a running search to save its checkpoint and return without a solution
+
+        Only sets a flag, so it is safe to call from a signal handler or from
+        another thread than the one solving.
+        """
+        self.stop_requested = True
+
+    def halt(self):
+        """End a search that was asked to stop, saving its checkpoint first"""
+        if self.checkpoint is not None and self.checkpoint.solver is self:
+            self.checkpoint.save()
+        self.stats.stopped = True
+        return None
+
+    def restore(self, open_list):
+        """Refill an open list from the checkpoint when resuming
+
+        Returns the restored closed set, or None when the search starts from
+        scratch. Each open node gets its trail index as parent, so its path is
+        rebuilt from the restored move trail.
+        """
+        if self.checkpoint is None or not self.resume:
+            return None
+        snapshot = self.checkpoint.load(self)
+        if snapshot is None:
+            return None
+        (parents, moves), closed, frontier, counters = snapshot
+        trail = self.trail
+        trail.parents, trail.moves = parents, moves
+        level = self.initial_state.level
+        for player_cell, box_mask, cost, h, index, codes in frontier:
+            parent = index if index >= 0 else None
+            # The intermediate states of a macro push go into the trail
+            for code in codes[:-1]:
+                parent = trail.add(self.trail_index(parent), code)
+            action = self.decode(codes[-1]) if codes else None
+            state = GameState.create(level, player_cell, box_mask,
+                                     level.zobrist(player_cell, box_mask), cost, parent, action)
+            state.h = h
+            if h is None:
+                open_list.push(self.key(state), state, cost)
+            else:
+                skipped = max(len(codes) - 1, 0)
+                open_list.push(self.key(state), state, cost + h, h + skipped)
+        self.expanded_states = counters['expanded_states']
+        self.generated_states = counters['generated_states']
+        if self.deadlocks is not None:
+            self.deadlocks.pruned.update(counters.get('pruned', {}))
+        if self.macros is not None:
+            self.macros.applied.update(counters.get('macro_pushes', {}))
+        self.stats.resumed_elapsed = counters['elapsed']
+        return set(closed)
+
+    def bidirectional(self):
+        """Breadth-first search from both ends, forward by pushes and backward by pulls
+
+        The backward search starts from the solved box layout with the player
+        in every region next to a box, and can never enter a deadlock. The
+        smaller frontier is expanded one whole layer at a time; once a layer
+        meets the other side, the cheapest meeting point gives a solution
+        with the fewest pushes.
+        """
+        if self.mode != 'push':
+            raise Exception('Bidirectional search needs push mode')
+        start_state = self.start_state()
+        if start_state.check_solved():
+            return self.finish(start_state)
+        level = start_state.level
+        if bin(start_state.box_mask).count('1') != len(level.target_cells):
+            return None  # Unsolvable; the backward search could not even start
+
+        forward = [start_state]
+        forward_seen = {self.key(start_state): start_state}
+        backward = self.goal_states()
+        backward_seen = {self.key(state): state for state in backward}
+
+        while forward and backward:
+            if len(forward) <= len(backward):
+                forward, meeting = self.expand_layer(forward, forward_seen, backward_seen,
+                                                     self.successors)
+                if meeting is not None:
+                    return self.join(meeting[0], meeting[1])
+            else:
+                backward, meeting = self.expand_layer(backward, backward_seen, forward_seen,
+                                                      self.predecessors)
+                if meeting is not None:
+                    return self.join(meeting[1], meeting[0])
+
+        return None
+
+    def goal_states(self):
+        """Get the roots of the backward search: solved layouts, one per player region"""
+        level = self.initial_state.level
+        boxes = level.target_mask
+        covered = bytearray(level.size)
+        roots = []
+        for box_cell in level.target_cells:
+            for delta in level.deltas:
+                cell = box_cell + delta
+                if level.walls[cell] or (boxes >> cell) & 1 or covered[cell]:
+                    continue
+                state = GameState.create(level, cell, boxes, level.zobrist(cell, boxes))
+                seen, _ = state.reachable()
+                for index, visited in enumerate(seen):
+                    if visited:
+                        covered[index] = 1
+                roots.append(state.normalized())
+        return roots
+
+    def predecessors(self, state):
+        """Get the normalized states one pull away from a node of the backward search"""
+        self.expanded_states += 1
+        children = [state.pull(box_cell, direction).normalized()
+                    for box_cell, direction in state.get_possible_pulls()]
+        self.generated_states += len(children)
+        return children
+
+    def expand_layer(self, frontier, seen, other_seen, expand):
+        """Expand one layer of a search side; return (next layer, meeting or None)
+
+        A meeting is the (state on this side, state on the other side) pair
+        with the lowest combined cost found in the layer.
+        """
+        next_frontier = []
+        meeting = None
+        for state in frontier:
+            self.report(state, len(frontier) + len(next_frontier), len(seen) + len(other_seen))
+            for next_state in expand(state):
+                key = self.key(next_state)
+                if key in seen:
+                    continue
+                seen[key] = next_state
+                next_frontier.append(next_state)
+                other = other_seen.get(key)
+                if other is not None and (meeting is None or
+                                          next_state.current_cost + other.current_cost <
+                                          meeting[0].current_cost + meeting[1].current_cost):
+                    meeting = (next_state, other)
+        return next_frontier, meeting
+
+    def join(self, forward_state, backward_state):
+        """Convert the paths of two meeting states into the moves of one solution"""
+        path = self.path_of(forward_state) if forward_state.parent is not None else []
+        state = backward_state
+        while state.parent is not None:
+            path.append(state.action)
+            state = state.parent
+        moves = self.to_moves(path)
+        self.moves_to_goal = len(moves)
+        return moves
+
+    def greedy(self):
+        """Greedy best-first search: always expand the node closest to the goal by h"""
+        return self.best_first(lambda state: state.h)
+
+    def wastar(self):
+        """Weighted A*: f = g + weight * h, at most weight times longer than optimal"""
+        weight = self.weight
+        return self.best_first(lambda state: state.current_cost + weight * state.h)
+
+    def best_first(self, priority):
+        """Best-first search ordered by priority(state), returning the first goal popped"""
+        start_state = self.start_state()
+        if self.heuristic.evaluate(start_state) == INFINITY:
+            return None
+        open_list = [(priority(start_state), start_state)]
+        closed_set = set()
 
         while open_list:
-            current_cost, current_state, path = heapq.heappop(open_list)
+            current_priority, current_state = heapq.heappop(open_list)
 
             if current_state.check_solved():
-                end_time = time.time()
-                print("Time taken:", round(end_time - start_time, 3), "seconds")
-                print("Expanded state:", path)
-                print("Solved:", current_state.check_solved())
-                return path
+                return self.finish(current_state)
 
-            current_state_hash = hash(current_state)
+            current_state_hash = self.key(current_state)
             if current_state_hash not in closed_set:
                 closed_set.add(current_state_hash)
+                self.report(current_state, len(open_list), len(closed_set))
 
-                for direction in ['U', 'D', 'L', 'R']:
-                    temp_state = current_state.move('')  # Use a neutral move to get a copy of the current state
-                    next_state = temp_state.move(direction)
-
-                    next_state_hash = hash(next_state)
-                    if next_state_hash not in closed_set:
-                        new_cost = next_state.get_current_cost()
-                        heapq.heappush(open_list, (new_cost, next_state, path + [direction]))
+                for next_state in self.successors(current_state):
+                    if self.key(next_state) not in closed_set:
+                        if self.heuristic.evaluate(next_state, current_state) == INFINITY:
+                            continue
+                        heapq.heappush(open_list, (priority(next_state), next_state))
+                current_state.heuristic_data = None
 
         return None
 
-    def custom (self):
-        return["L","L"]
+    def anytime(self):
+        """Anytime repairing A* (ARA*)
+
+        Weighted A* runs first with self.weight, then repeatedly with the
+        weight lowered by weight_step, reusing the search effort: nodes whose
+        cost improves after they were expanded wait in an inconsistent list
+        and re-enter the open list at the start of the next round. Every
+        improved solution is published as a 'solution' event as soon as it is
+        found, with the suboptimality bound proven so far; the end of a round
+        publishes the tighter bound of that round. The search stops when the
+        bound reaches 1, the open list runs out, or the deadline passes, and
+        returns the best solution found.
+        """
+        weight = max(self.weight, 1.0)
+        start_state = self.start_state()
+        if self.heuristic.evaluate(start_state) == INFINITY:
+            return None
+        if start_state.check_solved():
+            return self.finish(start_state)
+        best = {self.key(start_state): start_state}  # Cheapest state found per key
+        open_states = [start_state]
+        incumbent = None
+
+        while True:
+            open_list = [(state.current_cost + weight * state.h, state) for state in open_states]
+            heapq.heapify(open_list)
+            closed_set = set()
+            inconsistent = []
+            while open_list:
+                priority, current_state = open_list[0]
+                if incumbent is not None and incumbent.current_cost <= priority:
+                    break
+                heapq.heappop(open_list)
+                current_state_hash = self.key(current_state)
+                if best[current_state_hash] is not current_state or current_state_hash in closed_set:
+                    continue  # Superseded by a cheaper copy
+                if self.deadline is not None and time.time() - self.start_time >= self.deadline:
+                    self.stats.deadline_reached = True
+                    return self.finish(incumbent) if incumbent is not None else None
+                closed_set.add(current_state_hash)
+                self.report(current_state, len(open_list), len(closed_set))
+
+                improved = False
+                for next_state in self.successors(current_state):
+                    next_state_hash = self.key(next_state)
+                    known = best.get(next_state_hash)
+                    if known is not None and known.current_cost <= next_state.current_cost:
+                        continue
+                    if self.heuristic.evaluate(next_state, current_state) == INFINITY:
+                        continue
+                    best[next_state_hash] = next_state
+                    if next_state.check_solved():
+                        if incumbent is None or next_state.current_cost < incumbent.current_cost:
+                            incumbent = next_state
+                            improved = True
+                    elif next_state_hash in closed_set:
+                        inconsistent.append(next_state)
+                    else:
+                        heapq.heappush(open_list, (next_state.current_cost + weight * next_state.h,
+                                                   next_state))
+                current_state.heuristic_data = None
+                if improved:
+                    # Every cheaper solution passes through an open or inconsistent state
+                    lower = min([state.current_cost + state.h for _, state in open_list] +
+                                [state.current_cost + state.h for state in inconsistent] +
+                                [incumbent.current_cost])
+                    self.publish(incumbent, max(incumbent.current_cost / lower, 1.0) if lower else 1.0)
+
+            open_states = [state for state in [state for _, state in open_list] + inconsistent
+                           if best[self.key(state)] is state]
+            lower = min([state.current_cost + state.h for state in open_states] or [INFINITY])
+            if incumbent is None:
+                return None
+            bound = max(min(weight, incumbent.current_cost / lower) if lower else weight, 1.0)
+            if bound < self.stats.suboptimality:
+                self.publish(incumbent, bound)
+            if weight <= 1.0 or incumbent.current_cost <= lower:
+                return self.finish(incumbent)
+            weight = max(weight - self.weight_step, 1.0)
+
+    def publish(self, state, bound):
+        """Store an improved anytime solution and announce it to the hooks"""
+        self.solution = self.finish(state)
+        self.stats.solved = True
+        self.stats.moves = len(self.solution)
+        self.stats.suboptimality = bound
+        if self.instrumentation is not None:
+            self.update_stats()
+            self.instrumentation.emit('solution', self.stats)
+
     def get_solution(self):
         return self.solution
-
@@ -0,0 +1,34 @@
+# Compact storage for the paths of closed search nodes
+# Instead of keeping every closed GameState alive through parent links, a
+# closed node is reduced to its parent's index and the code of the move that
+# reached it, packed into two flat arrays.
+#
+# Path: modules/trail.py
+
+from array import array
+
+
+class MoveTrail(object):
+    """Parallel arrays of parent indexes and move codes for closed nodes"""
+
+    def __init__(self, typecode='B'):
+        self.parents = array('l')
+        self.moves = array(typecode)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def add(self, parent, move):
+        """Record a closed node and return its index; the root has parent -1"""
+        self.parents.append(parent)
+        self.moves.append(move)
+        return len(self.parents) - 1
+
+    def path(self, index):
+        """Get the move codes from the root to the node with the given index"""
+        moves = []
+        while self.parents[index] >= 0:
+            moves.append(self.moves[index])
+            index = self.parents[index]
+        moves.reverse()
+        return moves
@@ -0,0 +1,56 @@
+# Fixed-size transposition table for depth-first strategies
+# The table lives in preallocated flat arrays, so its memory use is set once
+# by a cap and never grows with the search.
+#
+# Path: modules/transposition.py
+
+from array import array
+
+# Bytes used by one entry: a 64-bit key plus 32-bit cost and iteration stamp
+ENTRY_SIZE = 16
+
+
+class TranspositionTable(object):
+    """Remember the lowest cost at which each state was reached in an iteration
+
+    Every key maps to exactly one slot. A slot is overwritten when it is
+    empty, left over from an earlier iteration, holds the same state, or holds
+    a state reached at a higher cost; otherwise the shallower entry is kept,
+    since it cuts off the larger subtree.
+    """
+
+    def __init__(self, memory_limit=64):
+        self.size = max(1, memory_limit * 1024 * 1024 // ENTRY_SIZE)
+        self.keys = array('Q', [0]) * self.size
+        self.costs = array('i', [0]) * self.size
+        self.stamps = array('i', [0]) * self.size
+        self.iteration = 0
+        self.hits = 0
+        self.replacements = 0
+
+    def new_iteration(self):
+        """Invalidate every entry without clearing the arrays"""
+        self.iteration += 1
+
+    def visit(self, key, cost):
+        """Record a state and tell if it still needs to be searched
+
+        Returns False when the state was already searched in this iteration at
+        the same or a lower cost, since that search had at least as much of
+        the threshold left.
+        """
+        key &= 0xFFFFFFFFFFFFFFFF
+        slot = key % self.size
+        if self.stamps[slot] == self.iteration:
+            if self.keys[slot] == key:
+                if self.costs[slot] <= cost:
+                    self.hits += 1
+                    return False
+            elif self.costs[slot] < cost:
+                return True
+            else:
+                self.replacements += 1
+        self.keys[slot] = key
+        self.costs[slot] = cost
+        self.stamps[slot] = self.iteration
+        return True
@@ -0,0 +1,330 @@
+# Batched successor generation with NumPy
+# A chunk of frontier nodes is expanded at once: box layouts become boolean
+# rows of a (nodes x cells) array, so legality, player regions, dead-square
+# checks and table heuristics are computed for the whole chunk with array
+# operations. Only the surviving children are turned back into GameStates.
+# The hungarian heuristic is updated for all pushed children together: each
+# one re-inserts the moved box into its parent's assignment, and the steps of
+# those augmenting paths run side by side over (children x targets) arrays.
+#
+# Path: modules/vectorized.py
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from modules.game_state import GameState
+from modules.heuristic import INFINITY, UNREACHABLE
+from modules.level import DIRECTIONS
+
+# Fewest pushed children whose hungarian assignments are updated as one batch;
+# below it the per-child update, usually a one- or two-step augmenting path,
+# is faster than the fixed cost of the array operations
+BATCH_REASSIGN = 128
+# Fewest nodes expanded as one array batch; a smaller chunk is expanded one
+# node at a time by the solver, which is faster than setting up the arrays
+BATCH_EXPAND = 16
+
+
+def shift(cells, offset):
+    """Shift every row of a (nodes x cells) array so out[:, i] = cells[:, i - offset]"""
+    out = np.zeros_like(cells)
+    if offset > 0:
+        out[:, offset:] = cells[:, :-offset]
+    elif offset < 0:
+        out[:, :offset] = cells[:, -offset:]
+    else:
+        out[:] = cells
+    return out
+
+
+class BatchExpander(object):
+    """Expand many nodes of one solver at once
+
+    The block and freeze deadlock rules are not vectorized; they run per
+    surviving child, which is a small share of the generated nodes once dead
+    squares are filtered out.
+    """
+
+    def __init__(self, solver):
+        if np is None:
+            raise Exception('Batched expansion needs NumPy')
+        self.solver = solver
+        self.min_chunk = BATCH_EXPAND
+        level = solver.initial_state.level
+        self.level = level
+        self.size = level.size
+        self.mask_bytes = (level.size + 7) // 8
+        self.walls = np.frombuffer(bytes(level.walls), dtype=np.uint8).astype(bool)
+        self.deadlocks = solver.deadlocks
+        if self.deadlocks is not None:
+            self.dead = np.frombuffer(bytes(self.deadlocks.dead_squares), dtype=np.uint8).astype(bool)
+        else:
+            self.dead = np.zeros(level.size, dtype=bool)
+        self.heuristic = solver.heuristic
+        # Per-cell cost tables of the heuristics that are a plain sum over boxes
+        self.table = None
+        if self.heuristic.method == 'greedy':
+            self.table = np.array(self.heuristic.nearest, dtype=np.int64)
+        elif self.heuristic.method == 'manhattan':
+            self.table = self.manhattan_table()
+        # Push distances as a (targets x cells) array for the batched hungarian
+        self.distances = None
+        if self.heuristic.method == 'hungarian' and self.heuristic.targets:
+            self.distances = np.array(self.heuristic.distances, dtype=np.int64)
+
+    def manhattan_table(self):
+        """Get the Manhattan distance from every cell to its nearest target"""
+        level = self.level
+        rows, cols = np.divmod(np.arange(level.size), level.stride)
+        table = np.zeros(level.size, dtype=np.int64)
+        if level.target_cells:
+            target_rows, target_cols = np.divmod(np.array(level.target_cells), level.stride)
+            table = (np.abs(rows[:, None] - target_rows[None, :]) +
+                     np.abs(cols[:, None] - target_cols[None, :])).min(axis=1)
+        return table
+
+    def unpack(self, masks):
+        """Convert box masks to a (nodes x cells) boolean array"""
+        raw = b''.join(mask.to_bytes(self.mask_bytes, 'little') for mask in masks)
+        bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder='little')
+        return bits.reshape(len(masks), -1)[:, :self.size].astype(bool)
+
+    def flood(self, region, free):
+        """Grow player regions over the free cells until none of them changes"""
+        deltas = self.level.deltas
+        while True:
+            grown = region.copy()
+            for delta in deltas:
+                grown |= shift(region, delta)
+            grown &= free
+            if np.array_equal(grown, region):
+                return region
+            region = grown
+
+    def expand(self, states):
+        """Get the children of every state, with their heuristic already set
+
+        Returns one list of children per state. Children whose heuristic is
+        infinite are dropped.
+        """
+        solver = self.solver
+        boxes = self.unpack([state.box_mask for state in states])
+        if solver.mode == 'push':
+            children = self.expand_pushes(states, boxes)
+        else:
+            children = self.expand_moves(states, boxes)
+        solver.expanded_states += len(states)
+        for state, state_children in zip(states, children):
+            solver.generated_states += len(state_children)
+            if solver.trail is not None:
+                solver.compact(state, state_children)
+        return children
+
+    def parent_costs(self, states, boxes):
+        """Get the table heuristic of every state"""
+        costs = boxes.astype(np.int64) @ self.table
+        for state, cost in zip(states, costs.tolist()):
+            if state.h is None:
+                state.h = INFINITY if cost >= UNREACHABLE else cost
+        return costs
+
+    def expand_moves(self, states, boxes):
+        level = self.level
+        nodes = np.arange(len(states))
+        players = np.array([state.player_cell for state in states])
+        costs = self.parent_costs(states, boxes) if self.table is not None else None
+        children = []
+        for direction in DIRECTIONS:
+            delta = level.delta[direction]
+            new_cells = players + delta
+            beyond = np.clip(new_cells + delta, 0, self.size - 1)
+            pushing = boxes[nodes, new_cells]
+            legal = ~self.walls[new_cells] & (~pushing | (~self.walls[beyond] & ~boxes[nodes, beyond]))
+            pushing &= legal
+            dead = pushing & self.dead[beyond]
+            if self.deadlocks is not None:
+                self.deadlocks.pruned['dead_square'] += int(dead.sum())
+                legal &= ~dead
+            if costs is not None:
+                child_costs = costs + np.where(pushing, self.table[beyond] - self.table[new_cells], 0)
+                child_costs = child_costs.tolist()
+            for index in np.nonzero(legal)[0].tolist():
+                state = states[index]
+                new_cell = int(new_cells[index])
+                if pushing[index]:
+                    box_cell = new_cell + delta
+                    mask = state.box_mask ^ (1 << new_cell) ^ (1 << box_cell)
+                    if self.deadlocks is not None and self.deadlocks.is_stuck(mask, box_cell):
+                        continue
+                    zobrist = state.zobrist ^ level.zobrist_box[new_cell] ^ level.zobrist_box[box_cell]
+                else:
+                    mask = state.box_mask
+                    zobrist = state.zobrist
+                zobrist ^= level.zobrist_player[state.player_cell] ^ level.zobrist_player[new_cell]
+                child = GameState.create(level, new_cell, mask, zobrist, state.current_cost + 1,
+                                         state, direction)
+                children.append((index, child, child_costs[index] if costs is not None else None))
+        return self.survivors(states, children)
+
+    def expand_pushes(self, states, boxes):
+        level = self.level
+        free = ~self.walls & ~boxes
+        region = np.zeros_like(boxes)
+        region[np.arange(len(states)), [state.player_cell for state in states]] = True
+        region = self.flood(region, free)
+        costs = self.parent_costs(states, boxes) if self.table is not None else None
+
+        # Every legal push of the chunk as parallel arrays
+        parents, box_cells, directions = [], [], []
+        for index, direction in enumerate(DIRECTIONS):
+            delta = level.delta[direction]
+            pushable = boxes & shift(region, delta) & shift(free, -delta)
+            if self.deadlocks is not None:
+                dead = pushable & shift(self.dead[None, :], -delta)
+                self.deadlocks.pruned['dead_square'] += int(dead.sum())
+                pushable &= ~dead
+            node, cell = np.nonzero(pushable)
+            parents.append(node)
+            box_cells.append(cell)
+            directions.append(np.full(len(node), index))
+        parents = np.concatenate(parents)
+        box_cells = np.concatenate(box_cells)
+        directions = np.concatenate(directions)
+        # In the order GameState.get_possible_pushes lists them, so ties in the
+        # open list are broken exactly as in the serial search
+        order = np.lexsort((directions, box_cells, parents))
+        parents, box_cells, directions = parents[order], box_cells[order], directions[order]
+        new_cells = box_cells + np.array(level.deltas)[directions]
+
+        # Normalize every child at once: its player region starts on the pushed box's old cell
+        child_boxes = boxes[parents]
+        pushes = np.arange(len(parents))
+        child_boxes[pushes, box_cells] = False
+        child_boxes[pushes, new_cells] = True
+        child_region = np.zeros_like(child_boxes)
+        child_region[pushes, box_cells] = True
+        child_region = self.flood(child_region, ~self.walls & ~child_boxes)
+        lowest = child_region.argmax(axis=1)
+        if costs is not None:
+            child_costs = (costs[parents] - self.table[box_cells] + self.table[new_cells]).tolist()
+
+        children = []
+        for push, (index, box_cell, new_cell, direction, player) in enumerate(zip(
+                parents.tolist(), box_cells.tolist(), new_cells.tolist(), directions.tolist(),
+                lowest.tolist())):
+            state = states[index]
+            mask = state.box_mask ^ (1 << box_cell) ^ (1 << new_cell)
+            if self.deadlocks is not None and self.deadlocks.is_stuck(mask, new_cell):
+                continue
+            zobrist = (state.zobrist ^ level.zobrist_player[state.player_cell] ^ level.zobrist_player[player]
+                       ^ level.zobrist_box[box_cell] ^ level.zobrist_box[new_cell])
+            child = GameState.create(level, player, mask, zobrist, state.current_cost + 1,
+                                     state, (box_cell, DIRECTIONS[direction]))
+            children.append((index, child, child_costs[push] if costs is not None else None))
+        return self.survivors(states, children)
+
+    def survivors(self, states, children):
+        """Set the heuristic of (parent index, child, table cost) triples
+
+        Returns one list per state of its children that can still reach the goal.
+        """
+        pending = []
+        for index, child, cost in children:
+            if cost is not None:
+                child.h = INFINITY if cost >= UNREACHABLE else cost
+            elif self.distances is not None and self.can_reassign(states[index], child):
+                pending.append((states[index], child))
+            else:
+                self.heuristic.evaluate(child, states[index])
+        if len(pending) >= BATCH_REASSIGN:
+            self.reassign(pending)
+        else:
+            for parent, child in pending:
+                self.heuristic.evaluate(child, parent)
+        survivors = [[] for _ in states]
+        for index, child, _ in children:
+            if child.h != INFINITY:
+                survivors[index].append(child)
+        return survivors
+
+    def can_reassign(self, parent, child):
+        """Check if a child's assignment is its parent's with one row re-inserted"""
+        data = parent.heuristic_data
+        return (parent.h is not None and data is not None and parent.box_mask != child.box_mask
+                and len(data[0]) - 1 == len(self.heuristic.targets))
+
+    def reassign(self, pending):
+        """Run Heuristic.reassign for many (parent, child) pairs at once
+
+        Every child moves one box of its parent, so its row is unassigned and
+        re-inserted with a shortest augmenting path. The loops below are the
+        ones of Heuristic._insert with one row of every array per child;
+        children whose path is complete simply stop changing. Ties are broken
+        the same way, so the assignments match the serial ones exactly.
+        """
+        distances = self.distances
+        count = len(pending)
+        m = distances.shape[0]
+        big = np.int64(1) << 60
+        nodes = np.arange(count)
+        # Children of one parent share its arrays until they are copied out below
+        parents = {}
+        owner = np.array([parents.setdefault(id(parent), len(parents)) for parent, _ in pending])
+        data = list({id(parent): parent.heuristic_data for parent, _ in pending}.values())
+        rows = np.array([[0] + rows[1:] for rows, _, _, _ in data], dtype=np.int64)[owner]
+        u = np.array([u for _, u, _, _ in data], dtype=np.int64)[owner]
+        v = np.array([v for _, _, v, _ in data], dtype=np.int64)[owner]
+        p = np.array([p for _, _, _, p in data], dtype=np.int64)[owner]
+
+        # Unassign the moved box's row
+        old_cells = [((parent.box_mask & ~child.box_mask).bit_length() - 1) for parent, child in pending]
+        new_cells = [((child.box_mask & ~parent.box_mask).bit_length() - 1) for parent, child in pending]
+        row = (rows == np.array(old_cells)[:, None]).argmax(axis=1)
+        rows[nodes, row] = new_cells
+        p[(p == row[:, None]) & (np.arange(m + 1) > 0)] = 0
+        u[nodes, row] = 0
+
+        # Shortest augmenting path from the unassigned row, for every child
+        minv = np.full((count, m + 1), big, dtype=np.int64)
+        used = np.zeros((count, m + 1), dtype=bool)
+        way = np.zeros((count, m + 1), dtype=np.int64)
+        p[:, 0] = row
+        j0 = np.zeros(count, dtype=np.int64)
+        active = np.ones(count, dtype=bool)
+        while active.any():
+            used[nodes[active], j0[active]] = True
+            i0 = p[nodes, j0]
+            current = distances[:, rows[nodes, i0]].T - u[nodes, i0][:, None] - v[:, 1:]
+            free = ~used[:, 1:] & active[:, None]
+            better = free & (current < minv[:, 1:])
+            minv[:, 1:] = np.where(better, current, minv[:, 1:])
+            way[:, 1:] = np.where(better, j0[:, None], way[:, 1:])
+            candidates = np.where(free, minv[:, 1:], big)
+            j1 = candidates.argmin(axis=1) + 1
+            delta = np.where(active, candidates[nodes, j1 - 1], 0)
+            settled = used & active[:, None]
+            owners, columns = np.nonzero(settled)
+            u[owners, p[owners, columns]] += delta[owners]
+            v -= np.where(settled, delta[:, None], 0)
+            minv -= np.where(~used & active[:, None], delta[:, None], 0)
+            j0 = np.where(active, j1, j0)
+            active &= p[nodes, j0] != 0
+
+        # Flip the assignments along the augmenting paths
+        active = j0 != 0
+        while active.any():
+            j1 = way[nodes, j0]
+            p[nodes[active], j0[active]] = p[nodes[active], j1[active]]
+            j0 = np.where(active, j1, j0)
+            active = j0 != 0
+
+        assigned = p[:, 1:]
+        costs = np.where(assigned != 0, distances[np.arange(m)[None, :], rows[nodes[:, None], assigned]], 0)
+        for (_, child), total, child_rows, child_u, child_v, child_p in zip(
+                pending, costs.sum(axis=1).tolist(), rows.tolist(), u.tolist(), v.tolist(),
+                p.tolist()):
+            child.h = INFINITY if total >= UNREACHABLE else total
+            child_rows[0] = None
+            child.heuristic_data = (child_rows, child_u, child_v, child_p)
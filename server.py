@@ -0,0 +1,38 @@
+import argparse
+import signal
+
+from modules.server import SolveServer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Answer JSON Lines solve requests from stdin or a Unix socket')
+    parser.add_argument('--socket', help='Listen on this Unix socket instead of stdin')
+    parser.add_argument('--workers', help='Number of warm solver processes', type=int)
+    parser.add_argument(
+        '--deadline', help='Deadline in seconds of requests that set none', type=float)
+    parser.add_argument(
+        '--strategy', help='The strategy of requests that set none', default='astar')
+    parser.add_argument(
+        '--mode', help='The search mode of requests that set none', choices=['move', 'push'],
+        default='push')
+    parser.add_argument(
+        '--heuristic', help='The heuristic of requests that set none',
+        choices=['hungarian', 'greedy', 'manhattan'], default='hungarian')
+    parser.add_argument('--cache', help='SQLite file caching solutions across requests')
+    args = parser.parse_args()
+
+    defaults = {'strategy': args.strategy, 'mode': args.mode, 'heuristic': args.heuristic}
+    server = SolveServer(args.workers, args.deadline, defaults, args.cache)
+    server.start()
+    # Stop on SIGTERM as on Ctrl+C, closing the workers and the socket
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if args.socket:
+            server.serve_socket(args.socket)
+        else:
+            server.serve()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,21 @@
+# Shared test setup: make the modules package importable from the repository root
+#
+# Path: tests/conftest.py
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def load_test_map(name):
+    """Load the first level of a file under maps/ or benchmarks/levels/ as a map"""
+    from modules.collection import load_levels
+
+    for directory in ('maps', os.path.join('benchmarks', 'levels')):
+        path = os.path.join(ROOT, directory, name)
+        if os.path.exists(path):
+            return load_levels(path)[0][2]
+    raise IOError('No test map named %s' % name)
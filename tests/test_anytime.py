@@ -0,0 +1,47 @@
+import time
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.instrumentation import Instrumentation
+from modules.replay import replay
+from modules.server import solve_request
+from modules.solver import Solver
+
+
+def anytime(name, **options):
+    events = []
+    instrumentation = Instrumentation(60.0, [lambda event, stats: events.append(
+        (event, stats.moves, stats.suboptimality)) if event == 'solution' else None])
+    solver = Solver(GameState(load_test_map(name)), 'anytime', 'push', weight=5.0,
+                    instrumentation=instrumentation, **options)
+    return solver, events
+
+
+def test_every_improvement_is_published():
+    solver, events = anytime('microban_3.xsb')
+    solver.solve()
+    # The first solution is published before its round ends and proves it optimal
+    assert len(events) == 2
+    assert events[-1][1] == len(solver.solution)
+    bounds = [bound for _, _, bound in events]
+    assert bounds[0] > bounds[1] == solver.stats.suboptimality == 1.0
+
+
+def test_deadline_returns_the_incumbent():
+    solver, events = anytime('microban_3.xsb')
+
+    def stop(event, stats):
+        if event == 'solution':
+            solver.deadline = 0  # The next expansion is past the deadline
+    solver.instrumentation.add_hook(stop)
+    solver.solve()
+    assert solver.stats.deadline_reached
+    assert len(events) == 1
+    assert replay(solver.initial_state, solver.solution)[0].check_solved()
+
+
+def test_server_reports_a_timeout():
+    level = GameState(load_test_map('original_1.xsb')).level
+    result = solve_request(level, {'strategy': 'anytime', 'mode': 'push'}, time.time(),
+                           lambda: False, None)
+    assert result['status'] == 'timeout'
@@ -0,0 +1,33 @@
+import json
+
+from conftest import load_test_map
+from modules import batch
+from modules.batch import BatchRunner
+
+
+def report_twice(level_id, title, map, config, memory_limit, level_cache, results):
+    # A result queued again after the first one was handled, like the result
+    # of a worker that was stopped at its timeout right after queueing it
+    result = dict.fromkeys(batch.FIELDS)
+    result.update(id=level_id, title=title, status='unsolved')
+    results.put(result)
+    results.put(dict(result, status='solved'))
+
+
+def test_late_results_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'solve_level', report_twice)
+    levels = [('a', 'A', load_test_map('microban_1.xsb')), ('b', 'B', load_test_map('microban_2.xsb'))]
+    output = tmp_path / 'results.jsonl'
+    assert BatchRunner(levels, str(output), workers=1).run() == 2
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert sorted(result['id'] for result in results) == ['a', 'b']
+    assert all(result['status'] == 'unsolved' for result in results)
+
+
+def test_solves_and_records_every_level(tmp_path):
+    levels = [('a', 'A', load_test_map('microban_1.xsb')), ('d', 'D', load_test_map('demo4.txt'))]
+    output = tmp_path / 'results.jsonl'
+    BatchRunner(levels, str(output), config={'strategy': 'astar', 'mode': 'push'}).run()
+    results = {result['id']: result for result in map(json.loads, output.read_text().splitlines())}
+    assert results['a']['status'] == 'solved'
+    assert results['d']['status'] == 'invalid'
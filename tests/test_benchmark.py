@@ -0,0 +1,24 @@
+import time
+
+from conftest import load_test_map
+from modules.benchmark import Benchmark
+
+
+def test_a_case_that_dies_is_an_error_even_without_a_timeout():
+    benchmark = Benchmark([], [], timeout=None)
+    start_time = time.time()
+    # The solver raises in the child before any result is put
+    result = benchmark.run_once(load_test_map('microban_1.xsb'), {'strategy': 'no_such_strategy'})
+    assert result['status'] == 'error'
+    assert time.time() - start_time < 10
+
+
+def test_peak_rss_leaves_out_the_memory_of_the_parent():
+    # Pages a forked child shares with its parent count in its RSS
+    held = bytearray(b'\x01') * (64 * 1024 * 1024)
+    benchmark = Benchmark([], [], timeout=60)
+    result = benchmark.run_once(load_test_map('microban_1.xsb'),
+                                {'strategy': 'astar', 'mode': 'push'})
+    assert result['status'] == 'solved'
+    assert 0 <= result['peak_rss_kb'] < 32 * 1024
+    del held
@@ -0,0 +1,32 @@
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+
+
+@pytest.mark.parametrize('name', ['microban_1.xsb', 'microban_3.xsb', 'microban_5.xsb',
+                                  'demo.txt', 'demo3.txt'])
+def test_bidirectional_finds_the_fewest_pushes(name):
+    map = load_test_map(name)
+    astar = Solver(GameState(map), 'astar', 'push')
+    astar.solve()
+    solver = Solver(GameState(map), 'bidirectional', 'push')
+    solver.solve()
+    final, pushes = replay(GameState(map), solver.solution)
+    assert final.check_solved()
+    assert pushes == replay(GameState(map), astar.solution)[1]
+    assert solver.moves_to_goal == len(solver.solution)
+
+
+def test_bidirectional_returns_none_when_boxes_and_targets_differ():
+    solver = Solver(GameState(load_test_map('demo4.txt')), 'bidirectional', 'push')
+    solver.solve()
+    assert solver.solution is None
+    assert solver.get_solution() is None
+
+
+def test_bidirectional_needs_push_mode():
+    with pytest.raises(Exception):
+        Solver(GameState(load_test_map('microban_1.xsb')), 'bidirectional', 'move').solve()
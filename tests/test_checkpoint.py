@@ -0,0 +1,123 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from conftest import load_test_map
+from modules.checkpoint import KEY_MASK, Checkpoint, read_snapshot
+from modules.game_state import GameState
+from modules.solver import Solver
+
+
+def solve(path, kill_after=None, resume=False, strategy='astar', full_every=1000, killed=None,
+          interval=0):
+    """Solve microban_5 with a save after every expansion, optionally killed midway
+
+    At a kill, the keys of the open nodes and of the node being expanded are
+    added to the killed set.
+    """
+    checkpoint = Checkpoint(str(path), interval=interval, full_every=full_every)
+    solver = Solver(GameState(load_test_map('microban_5.xsb')), strategy, 'push',
+                    checkpoint=checkpoint, resume=resume)
+    if kill_after is not None:
+        successors = solver.successors
+
+        def dying(state):
+            if solver.expanded_states == kill_after:
+                nodes = checkpoint.open_list.states() + [state]
+                killed.update(solver.key(node) & KEY_MASK for node in nodes)
+                raise KeyboardInterrupt
+            return successors(state)
+        solver.successors = dying
+    solver.solve()
+    return solver
+
+
+@pytest.mark.parametrize('strategy', ['astar', 'ucs'])
+def test_resume_after_a_kill_gives_the_same_search(tmp_path, strategy):
+    reference = solve(tmp_path / 'reference', strategy=strategy)
+    path = tmp_path / 'run'
+    with pytest.raises(KeyboardInterrupt):
+        solve(path, kill_after=12, strategy=strategy, killed=set())
+    resumed = solve(path, resume=True, strategy=strategy)
+    assert resumed.solution == reference.solution
+    assert resumed.expanded_states == reference.expanded_states
+
+
+def test_deltas_rebuild_the_frontier_at_the_kill(tmp_path):
+    path = tmp_path / 'run'
+    killed = set()
+    with pytest.raises(KeyboardInterrupt):
+        solve(path, kill_after=12, killed=killed)
+    snapshot = read_snapshot(str(path))
+    assert snapshot['counters']['expanded_states'] == 12
+    assert set(snapshot['frontier']) == killed
+
+
+def test_deltas_only_carry_changed_nodes(tmp_path):
+    sizes = {}
+    for full_every in (1, 1000):
+        checkpoint = Checkpoint(str(tmp_path / str(full_every)), interval=0,
+                                full_every=full_every)
+        solver = Solver(GameState(load_test_map('microban_5.xsb')), 'astar', 'push',
+                        checkpoint=checkpoint)
+        solver.solve()
+        sizes[full_every] = checkpoint.bytes_written / checkpoint.saves
+    # A delta does not re-save the open list, so it stays well under a full snapshot
+    assert sizes[1000] * 3 < sizes[1]
+
+
+def test_sigterm_stops_a_background_solve_at_a_saved_snapshot(tmp_path):
+    reference = solve(tmp_path / 'reference')
+    path = tmp_path / 'run'
+    # No periodic save before the signal, so the snapshot comes from the stop
+    checkpoint = Checkpoint(str(path), interval=3600)
+    solver = Solver(GameState(load_test_map('microban_5.xsb')), 'astar', 'push',
+                    checkpoint=checkpoint)
+    successors = solver.successors
+
+    def signalled(state):
+        if solver.expanded_states == 12:
+            os.kill(os.getpid(), signal.SIGTERM)
+            while not solver.stop_requested:
+                time.sleep(0.01)
+        return successors(state)
+    solver.successors = signalled
+    previous = signal.signal(signal.SIGTERM, lambda signum, frame: solver.stop())
+    try:
+        # As in the window, the solver runs off the main thread, where the handler runs
+        thread = threading.Thread(target=solver.solve)
+        thread.start()
+        while thread.is_alive():
+            thread.join(0.05)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
+    assert solver.solution is None
+    assert solver.stats.stopped
+    assert checkpoint.saves == 1
+    # The expansion that saw the stop finished before the save
+    assert read_snapshot(str(path))['counters']['expanded_states'] == 13
+    resumed = solve(path, resume=True)
+    assert resumed.solution == reference.solution
+    assert resumed.expanded_states == reference.expanded_states
+
+
+def test_saves_after_a_torn_record_are_not_lost(tmp_path):
+    reference = solve(tmp_path / 'reference')
+    path = tmp_path / 'run'
+    with pytest.raises(KeyboardInterrupt):
+        solve(path, kill_after=12, killed=set())
+    saved = read_snapshot(str(path))['size']
+    # A kill during the last save left only part of its record
+    with open(str(path), 'r+b') as f:
+        f.truncate(saved - 5)
+    assert read_snapshot(str(path))['size'] < saved - 5
+    with pytest.raises(KeyboardInterrupt):
+        solve(path, kill_after=20, resume=True, killed=set())
+    # The deltas of the resumed run replace the torn record instead of following it
+    assert read_snapshot(str(path))['counters']['expanded_states'] == 20
+    resumed = solve(path, resume=True)
+    assert resumed.solution == reference.solution
+    assert resumed.expanded_states == reference.expanded_states
@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+
+# Each map has one push, of the box at (row, col) in the direction, that only
+# the named rule prunes
+CASES = {
+    # Pushing the box up puts it on the top wall, where no target is
+    'dead_square': ([
+        '#######',
+        '#     #',
+        '#  $  #',
+        '#  @ .#',
+        '#######',
+    ], (2, 3), 'U'),
+    # Pushing the right box left closes a square of two boxes under two walls
+    'block': ([
+        '########',
+        '#      #',
+        '# ##   #',
+        '# $ $@.#',
+        '#     .#',
+        '########',
+    ], (3, 4), 'L'),
+    # Pushing the right box left leaves two boxes holding each other against
+    # the walls at opposite sides, with no 2x2 square
+    'freeze': ([
+        '#########',
+        '#  #    #',
+        '#  $ $@ #',
+        '#   #  .#',
+        '#.      #',
+        '#########',
+    ], (2, 5), 'L'),
+}
+
+
+def pushes(rows, deadlocks):
+    """Get the (box_cell, direction) pushes the push-mode solver generates, and the solver"""
+    solver = Solver(GameState([list(row) for row in rows]), 'astar', 'push', deadlocks=deadlocks)
+    children = solver.successors(solver.start_state())
+    return set(child.action for child in children), solver
+
+
+@pytest.mark.parametrize('rule', sorted(CASES))
+def test_rule_prunes_its_deadlocked_push(rule):
+    rows, (row, col), direction = CASES[rule]
+    allowed, _ = pushes(rows, deadlocks=False)
+    kept, solver = pushes(rows, deadlocks=True)
+    push = (solver.initial_state.level.cell(row, col), direction)
+    assert push in allowed
+    assert push not in kept
+    assert solver.deadlocks.pruned[rule] >= 1
+    assert all(count == 0 for name, count in solver.deadlocks.pruned.items()
+               if name not in (rule, 'dead_square'))
+
+
+@pytest.mark.parametrize('name', ['microban_1.xsb', 'microban_3.xsb', 'original_1.xsb'])
+def test_pruning_keeps_the_optimal_push_count(name):
+    map = load_test_map(name)
+    counts = []
+    for deadlocks in (False, True):
+        solver = Solver(GameState(map), 'astar', 'push', deadlocks=deadlocks)
+        solver.solve()
+        final, count = replay(GameState(map), solver.solution)
+        assert final.check_solved()
+        counts.append(count)
+    assert counts[0] == counts[1]
@@ -0,0 +1,53 @@
+import heapq
+import os
+
+import pytest
+
+from conftest import load_test_map
+from modules import external_search
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+
+
+def test_delayed_duplicate_detection():
+    runs = [[b'a', b'c', b'd'], [b'b', b'c', b'e'], [b'a', b'e']]
+    children = external_search.unique(heapq.merge(*runs))
+    closed = [b'a', b'd', b'f']
+    assert list(external_search.subtract(children, closed)) == [b'b', b'c', b'e']
+
+
+@pytest.mark.parametrize('mode', ['push', 'move'])
+@pytest.mark.parametrize('name', ['microban_1.xsb', 'microban_3.xsb', 'demo2.txt'])
+def test_spilling_search_matches_bfs(tmp_path, monkeypatch, name, mode):
+    spills = []
+    spill = external_search.ExternalSearch.spill
+
+    def counted(self, workspace, depth, index, buffer):
+        spills.append(len(buffer))
+        return spill(self, workspace, depth, index, buffer)
+    monkeypatch.setattr(external_search.ExternalSearch, 'spill', counted)
+    map = load_test_map(name)
+    bfs = Solver(GameState(map), 'bfs', mode)
+    bfs.solve()
+    # A zero budget spills a run after every expanded node with children
+    solver = Solver(GameState(map), 'external', mode, memory_budget=0, spill_dir=str(tmp_path))
+    solver.solve()
+    final, pushes = replay(GameState(map), solver.solution)
+    assert final.check_solved()
+    if mode == 'push':
+        assert pushes == replay(GameState(map), bfs.solution)[1]
+    else:
+        assert len(solver.solution) == len(bfs.solution)
+    assert len(spills) > 1
+    assert solver.stats.spilled_bytes > 0
+    # The layer, closed and run files are all removed with the workspace
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_workspace_is_removed_after_an_unsolvable_search(tmp_path):
+    solver = Solver(GameState(load_test_map('demo4.txt')), 'external', 'push', memory_budget=0,
+                    spill_dir=str(tmp_path))
+    solver.solve()
+    assert solver.solution is None
+    assert os.listdir(str(tmp_path)) == []
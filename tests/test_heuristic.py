@@ -0,0 +1,20 @@
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.heuristic import Heuristic
+from modules.solver import Solver
+
+
+def test_root_heuristic_is_not_shared_between_solvers():
+    state = GameState(load_test_map('demo2.txt'))
+    fresh = Heuristic(state.level, 'hungarian').evaluate(GameState(load_test_map('demo2.txt')))
+
+    Solver(state, 'astar', heuristic='manhattan').solve()
+    solver = Solver(state, 'astar', heuristic='hungarian')
+
+    assert solver.heuristic.evaluate(solver.start_state()) == fresh
+
+
+def test_solve_leaves_initial_state_unevaluated():
+    state = GameState(load_test_map('demo2.txt'))
+    Solver(state, 'astar', mode='move').solve()
+    assert state.h is None
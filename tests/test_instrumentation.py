@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Imports the solver as on a platform without the resource module
+WITHOUT_RESOURCE = '''
+import sys
+sys.modules['resource'] = None
+from modules.batch import BatchRunner
+from modules.benchmark import Benchmark
+from modules.collection import load_levels
+from modules.game_state import GameState
+from modules.solver import Solver
+solver = Solver(GameState(load_levels('benchmarks/levels/microban_1.xsb')[0][2]), 'astar', 'push')
+solver.solve()
+assert solver.solution is not None
+assert solver.stats.peak_rss_kb is None
+result = Benchmark([], []).run_once(solver.initial_state.map, {'strategy': 'astar', 'mode': 'push'})
+assert result['status'] == 'solved' and result['peak_rss_kb'] is None
+'''
+
+
+def test_solver_runs_without_the_resource_module():
+    subprocess.run([sys.executable, '-c', WITHOUT_RESOURCE], cwd=ROOT, check=True)
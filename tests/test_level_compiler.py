@@ -0,0 +1,47 @@
+import os
+
+from conftest import ROOT, load_test_map
+from main import load_map
+from modules.level_compiler import compile_level, dump, load, validate
+from modules.macros import get_goal_room, get_tunnels
+
+
+def test_load_map_keeps_indentation():
+    path = os.path.join(ROOT, 'benchmarks', 'levels', 'original_1.xsb')
+    assert load_map(path) == load_test_map('original_1.xsb')
+    assert validate(load_map(path)) == []
+
+
+def test_validate_reports_a_map_with_shifted_rows():
+    path = os.path.join(ROOT, 'benchmarks', 'levels', 'original_1.xsb')
+    with open(path) as f:
+        rows = [list(line.strip()) for line in f if not line.startswith(';')]
+    assert 'the player can walk off the map' in validate(rows)
+
+
+def test_validate_counts():
+    assert validate(load_test_map('demo4.txt')) == ['5 boxes for 3 targets']
+    assert validate([list('#####'), list('#$.$#'), list('#####')]) == [
+        'expected one player, found 0', '2 boxes for 1 targets']
+
+
+def test_artifact_round_trip():
+    level = compile_level(load_test_map('original_1.xsb'))
+    loaded = load(dump(level))
+    assert loaded.walls == level.walls
+    assert loaded.start_boxes == level.start_boxes
+    assert loaded.push_tables == level.push_tables
+    assert loaded.dead_squares == level.dead_squares
+
+
+def test_macro_tables_are_built_on_first_use():
+    level = compile_level(load_test_map('original_1.xsb'))
+    assert level.tunnels is None
+    assert level.goal_room is None
+    assert load(dump(level)).goal_room is None
+
+    get_tunnels(level)
+    get_goal_room(level)
+    loaded = load(dump(level))
+    assert loaded.tunnels == level.tunnels
+    assert loaded.goal_room == level.goal_room
@@ -0,0 +1,31 @@
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+
+
+def solve(name, **options):
+    solver = Solver(GameState(load_test_map(name)), 'astar', 'push', **options)
+    solver.solve()
+    return solver
+
+
+def test_macros_expand_fewer_nodes_for_the_same_pushes():
+    plain = solve('original_1.xsb')
+    macros = solve('original_1.xsb', macros=True)
+    assert macros.macros.applied['tunnel'] > 0
+    assert macros.macros.applied['goal_room'] > 0
+    assert macros.expanded_states < plain.expanded_states
+    assert macros.generated_states < plain.generated_states
+
+    map = load_test_map('original_1.xsb')
+    final, pushes = replay(GameState(map), macros.solution)
+    assert final.check_solved()
+    assert pushes == replay(GameState(map), plain.solution)[1]
+
+
+def test_macros_change_nothing_without_tunnels_or_a_goal_room():
+    plain = solve('microban_3.xsb')
+    macros = solve('microban_3.xsb', macros=True)
+    assert macros.expanded_states == plain.expanded_states
+    assert macros.solution == plain.solution
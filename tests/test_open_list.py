@@ -0,0 +1,98 @@
+import pytest
+
+from modules.open_list import BucketQueue
+
+
+def test_pops_lowest_f_then_lowest_h():
+    queue = BucketQueue('h')
+    queue.push('a', 'a', 5, 3)
+    queue.push('b', 'b', 4, 4)
+    queue.push('c', 'c', 5, 1)
+    queue.push('d', 'd', 5, 2)
+    assert [queue.pop() for _ in range(4)] == [(4, 'b'), (5, 'c'), (5, 'd'), (5, 'a')]
+    assert not queue
+
+
+def test_lifo_ignores_h_within_a_bucket():
+    queue = BucketQueue('lifo')
+    queue.push('a', 'a', 5, 1)
+    queue.push('b', 'b', 5, 3)
+    queue.push('c', 'c', 5, 2)
+    assert [queue.pop()[1] for _ in range(3)] == ['c', 'b', 'a']
+
+
+def test_equal_h_pops_last_pushed_first():
+    queue = BucketQueue('h')
+    queue.push('a', 'a', 3, 1)
+    queue.push('b', 'b', 3, 1)
+    assert queue.pop() == (3, 'b')
+
+
+def test_decrease_key_replaces_the_queued_entry():
+    queue = BucketQueue()
+    assert queue.push('a', 'old', 9, 2)
+    assert not queue.push('a', 'worse', 10, 2)
+    assert not queue.push('a', 'same', 9, 2)
+    assert queue.push('a', 'new', 7, 2)
+    assert len(queue) == 1
+    assert queue.pop() == (7, 'new')
+    assert not queue
+    assert queue.decreases == 1
+
+
+def test_remove_leaves_no_stale_slot_behind():
+    queue = BucketQueue('h')
+    queue.push('a', 'a', 6, 0)
+    queue.push('b', 'b', 6, 4)
+    queue.remove('a')
+    # The lowest slot of bucket 6 is now empty and must be skipped
+    assert queue.pop() == (6, 'b')
+    queue.push('c', 'c', 6, 2)
+    queue.push('d', 'd', 6, 1)
+    assert queue.pop() == (6, 'd')
+    assert queue.pop() == (6, 'c')
+
+
+def test_push_below_the_current_minimum():
+    queue = BucketQueue()
+    queue.push('a', 'a', 8, 0)
+    queue.push('b', 'b', 9, 0)
+    assert queue.pop() == (8, 'a')
+    queue.push('c', 'c', 3, 0)
+    assert queue.peek_f() == 3
+    assert queue.pop() == (3, 'c')
+    assert queue.pop() == (9, 'b')
+
+
+def test_empty_queue_raises():
+    queue = BucketQueue()
+    with pytest.raises(IndexError):
+        queue.pop()
+    with pytest.raises(IndexError):
+        queue.peek_f()
+
+
+def test_report_counts_duplicates():
+    queue = BucketQueue()
+    queue.push('a', 'a', 4, 1)
+    queue.push('b', 'b', 4, 2)
+    queue.push('a', 'a2', 3, 1)
+    queue.push('b', 'b2', 5, 2)
+    queue.pop()
+    assert queue.report() == {'size': 1, 'peak': 2, 'offered': 4, 'duplicates': 2,
+                              'decreases': 1, 'duplicate_rate': 0.5}
+
+
+def test_invalid_tie_break():
+    with pytest.raises(Exception):
+        BucketQueue('fifo')
+
+
+def test_peek_reports_the_slot_of_the_best_node():
+    queue = BucketQueue('h')
+    queue.push('a', 'a', 5, 3)
+    queue.push('b', 'b', 5, 1)
+    assert queue.peek() == (5, 1)
+    queue.remove('b')
+    assert queue.peek() == (5, 3)
+    assert queue.pop() == (5, 'a')
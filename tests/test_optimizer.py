@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.optimizer import PostOptimizer
+from modules.replay import replay
+from modules.solver import Solver
+
+OPPOSITE = {'U': 'D', 'D': 'U', 'L': 'R', 'R': 'L'}
+
+
+def solve(name, strategy, mode):
+    solver = Solver(GameState(load_test_map(name)), strategy, mode)
+    solver.solve()
+    return solver.solution
+
+
+def cost(map, moves, metric):
+    final, pushes = replay(GameState(map), moves)
+    assert final.check_solved()
+    return (len(moves), pushes) if metric == 'moves' else (pushes, len(moves))
+
+
+@pytest.mark.parametrize('name', ['microban_4.xsb', 'microban_5.xsb', 'demo2.txt'])
+@pytest.mark.parametrize('mode', ['move', 'push'])
+def test_result_replays_and_is_never_longer(name, mode):
+    map = load_test_map(name)
+    metric = 'pushes' if mode == 'push' else 'moves'
+    moves = solve(name, 'greedy', mode)
+    optimized = PostOptimizer(GameState(map), metric).optimize(moves)
+    assert cost(map, optimized, metric) <= cost(map, moves, metric)
+
+
+def test_detours_are_cut():
+    map = load_test_map('microban_5.xsb')
+    moves = solve('microban_5.xsb', 'astar', 'move')
+    # Walk one step away and back wherever that pushes nothing
+    padded = []
+    state = GameState(map)
+    for move in moves:
+        for step in 'UDLR':
+            away = state.move(step)
+            if away.player_cell != state.player_cell and away.box_mask == state.box_mask:
+                padded += [step, OPPOSITE[step]]
+                break
+        padded.append(move)
+        state = state.move(move)
+    assert len(padded) > len(moves)
+    optimized = PostOptimizer(GameState(map), 'moves').optimize(padded)
+    assert cost(map, optimized, 'moves') == cost(map, moves, 'moves')
+
+
+def test_time_limit_keeps_the_given_solution():
+    map = load_test_map('microban_5.xsb')
+    moves = solve('microban_5.xsb', 'greedy', 'move')
+    optimizer = PostOptimizer(GameState(map), 'moves', time_limit=0)
+    assert optimizer.optimize(moves) == moves
+    assert optimizer.report['moves_after'] == len(moves)
+
+
+def test_rejects_moves_that_do_not_solve():
+    with pytest.raises(Exception):
+        PostOptimizer(GameState(load_test_map('microban_5.xsb'))).optimize(['U'])
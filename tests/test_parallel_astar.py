@@ -0,0 +1,60 @@
+import queue
+
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.heuristic import Heuristic
+from modules.parallel_astar import IDLE, Worker, owner
+from modules.replay import replay
+from modules.solver import Solver
+
+
+def test_single_worker_expands_like_astar():
+    map = load_test_map('original_1.xsb')
+    serial = Solver(GameState(map), 'astar', 'push')
+    serial.solve()
+    parallel = Solver(GameState(map), 'hdastar', 'push', workers=1)
+    parallel.solve()
+    assert parallel.expanded_states == serial.expanded_states
+    assert len(parallel.solution) == len(serial.solution)
+
+
+@pytest.mark.parametrize('option', ['macros', 'compact_paths'])
+def test_hdastar_rejects_options_its_workers_ignore(option):
+    with pytest.raises(Exception):
+        Solver(GameState(load_test_map('original_1.xsb')), 'hdastar', 'push', **{option: True})
+
+
+def test_workers_only_assign_the_root_from_scratch(monkeypatch):
+    # Two workers stepped in turn in this process, with plain queues between them
+    map = load_test_map('original_1.xsb')
+    assigned = []
+    assign = Heuristic.assign
+
+    def counted(self, boxes):
+        assigned.append(boxes)
+        return assign(self, boxes)
+    monkeypatch.setattr(Heuristic, 'assign', counted)
+    config = {'mode': 'push', 'deadlocks': True, 'heuristic': 'hungarian', 'tie_break': 'h'}
+    inboxes = [queue.Queue(), queue.Queue()]
+    replies = queue.Queue()
+    bests = [IDLE, IDLE]
+    workers = [Worker(index, 2, map, config, inboxes, replies, bests) for index in range(2)]
+    root = workers[0].solver.start_state()
+    workers[owner(root.zobrist, 2)].insert(root.player_cell, root.box_mask, root.zobrist, 0,
+                                           None, None, None, None, 0)
+    assigned.clear()
+
+    while replies.empty():
+        for worker in workers:
+            worker.read_inbox(block=False)
+            worker.publish()
+            if worker.may_expand():
+                worker.expand()
+                worker.publish()
+            worker.flush()
+    assert assigned == []
+    serial = Solver(GameState(map), 'astar', 'push')
+    serial.solve()
+    assert replies.get()[1] == replay(GameState(map), serial.solution)[1]
@@ -0,0 +1,27 @@
+import multiprocessing
+import time
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.portfolio import Portfolio
+from modules.replay import replay
+
+
+def test_first_valid_solution_wins_and_the_rest_are_stopped():
+    state = GameState(load_test_map('original_1.xsb'))
+    members = [
+        {'strategy': 'bfs', 'mode': 'push'},  # Still searching when the race ends
+        {'strategy': 'no_such_strategy'},  # Dies without a result
+        {'strategy': 'astar', 'mode': 'push'},
+    ]
+    portfolio = Portfolio(members, workers=len(members))
+    start_time = time.time()
+    solution, winner, reports = portfolio.run(state)
+    assert time.time() - start_time < 30
+    assert winner == 2
+    final, _ = replay(state, solution)
+    assert final.check_solved()
+    assert reports[2]['status'] == 'solved'
+    assert reports[0]['status'] == 'cancelled'
+    assert reports[1]['status'] in ('failed', 'cancelled')
+    assert multiprocessing.active_children() == []
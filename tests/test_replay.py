@@ -0,0 +1,60 @@
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import SPEEDS, Playback, replay
+from modules.solver import Solver
+
+
+def playback():
+    state = GameState(load_test_map('microban_2.xsb'))
+    solver = Solver(state, 'astar', 'move')
+    solver.solve()
+    return Playback(state, solver.get_solution())
+
+
+def test_tick_plays_moves_at_the_speed():
+    player = playback()
+    assert player.moves_per_second == 2
+    assert player.tick(400) == []
+    played = player.tick(850)
+    # 1250ms at 2 moves a second is two moves, with 250ms carried over
+    assert len(played) == 2
+    assert player.step == 2
+    assert player.elapsed == 250
+    assert played[1][0].move(played[1][1]) == player.state
+
+
+def test_replay_ends_on_the_solved_state():
+    player = playback()
+    player.speed = len(SPEEDS) - 1
+    while not player.done:
+        player.tick(1000)
+    assert player.state.check_solved()
+    assert player.state == replay(player.initial_state, player.moves)[0]
+    assert player.tick(1000) == []
+    assert player.advance() is None
+
+
+def test_pause_and_step():
+    player = playback()
+    player.toggle_pause()
+    assert player.tick(5000) == []
+    previous, move = player.step_once()
+    assert previous == player.initial_state
+    assert move == player.moves[0]
+    assert player.paused and player.step == 1
+    player.toggle_pause()
+    assert len(player.tick(500)) == 1
+
+
+def test_speed_is_clamped_and_restart_rewinds():
+    player = playback()
+    for _ in range(len(SPEEDS) + 2):
+        player.faster()
+    assert player.moves_per_second == SPEEDS[-1]
+    for _ in range(len(SPEEDS) + 2):
+        player.slower()
+    assert player.moves_per_second == SPEEDS[0]
+    player.step_once()
+    player.restart()
+    assert player.step == 0
+    assert player.state == player.initial_state
@@ -0,0 +1,67 @@
+import io
+import json
+import os
+import signal
+import time
+
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.server import Channel, SolveServer
+
+
+def level_text(name):
+    return '\n'.join(''.join(row) for row in load_test_map(name))
+
+
+@pytest.fixture
+def server():
+    server = SolveServer(workers=1)
+    server.start()
+    yield server
+    server.close()
+
+
+def responses(output):
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_solve_request_round_trip(server):
+    output = io.StringIO()
+    lines = [json.dumps({'id': 'a', 'level': level_text('microban_1.xsb')}),
+             '{"id": "b", "level": ',
+             json.dumps(['not', 'a', 'request'])]
+    server.serve(io.StringIO('\n'.join(lines) + '\n'), output)
+    answers = responses(output)
+    assert len(answers) == 3
+    solved = next(answer for answer in answers if answer.get('id') == 'a')
+    assert solved['status'] == 'solved'
+    state = GameState(load_test_map('microban_1.xsb'))
+    moves = [move.upper() for move in solved['solution']]
+    final, pushes = replay(state, moves)
+    assert final.check_solved()
+    assert pushes == solved['pushes']
+    errors = sorted(answer['error'] for answer in answers if answer['status'] == 'error')
+    assert errors == ['Invalid JSON', 'Invalid request']
+
+
+def test_crashed_worker_is_reported_and_replaced(server):
+    output = io.StringIO()
+    channel = Channel(output)
+    # Breadth-first search of this level runs long enough to be killed mid-solve
+    server.submit({'id': 'slow', 'level': level_text('original_3_reduced.xsb'),
+                   'strategy': 'bfs'}, channel)
+    process = server.slots[0][0]
+    time.sleep(0.5)
+    os.kill(process.pid, signal.SIGKILL)
+    channel.wait()
+    crashed, = responses(output)
+    assert crashed['id'] == 'slow'
+    assert crashed['status'] == 'error'
+    assert server.slots[0][0] is not process
+
+    server.submit({'id': 'after', 'level': level_text('microban_1.xsb')}, channel)
+    channel.wait()
+    assert responses(output)[1]['status'] == 'solved'
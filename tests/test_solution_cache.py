@@ -0,0 +1,35 @@
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solution_cache import SYMMETRIES, SolutionCache, fingerprint, transform
+from modules.solver import Solver
+
+
+def orientations(name):
+    """Get a level in each of the 8 orientations, as maps"""
+    map = load_test_map(name)
+    width = max(len(row) for row in map)
+    rows = [''.join(row).ljust(width) for row in map]
+    return [[list(row) for row in transform(rows, symmetry)] for symmetry in SYMMETRIES]
+
+
+@pytest.mark.parametrize('stored', range(len(SYMMETRIES)))
+def test_a_solution_replays_from_every_orientation(tmp_path, stored):
+    maps = orientations('microban_3.xsb')
+    # Every orientation of this level is a different map with the same fingerprint
+    assert len(set('\n'.join(''.join(row) for row in map) for map in maps)) == len(maps)
+    assert len(set(fingerprint(map)[0] for map in maps)) == 1
+
+    solver = Solver(GameState(maps[stored]), 'astar', 'push')
+    solver.solve()
+    cache = SolutionCache(str(tmp_path / 'cache.db'))
+    cache.store(maps[stored], solver.get_solution(), 'astar', 'pushes')
+    for index, map in enumerate(maps):
+        moves = cache.lookup(map, 'pushes')
+        assert moves is not None
+        assert len(moves) == len(solver.get_solution())
+        assert replay(GameState(map), moves)[0].check_solved(), index
+    assert cache.hits == len(maps)
+    cache.close()
@@ -0,0 +1,54 @@
+import pytest
+
+from conftest import load_test_map
+from modules import solver as solver_module
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+from modules.transposition import ENTRY_SIZE, TranspositionTable
+
+
+def test_table_size_follows_the_memory_limit():
+    table = TranspositionTable(1)
+    assert table.size == 1024 * 1024 // ENTRY_SIZE
+    assert len(table.keys) == len(table.costs) == len(table.stamps) == table.size
+
+
+def test_visit_keeps_the_cheaper_entry_of_a_slot():
+    table = TranspositionTable(0)
+    assert table.size == 1
+    table.new_iteration()
+    assert table.visit(1, 5)
+    assert not table.visit(1, 5)  # Already searched at this cost
+    assert table.visit(1, 3)  # Reached cheaper, searched again
+    assert table.visit(2, 4)  # Costlier than the entry it collides with: searched, not stored
+    assert not table.visit(1, 3)
+    assert table.visit(2, 2)  # Cheaper, so it evicts the entry
+    assert table.replacements == 1
+    table.new_iteration()
+    assert table.visit(2, 2)  # Entries of an earlier iteration do not count
+    assert len(table.keys) == 1
+
+
+@pytest.mark.parametrize('table_memory', [0, 64])
+@pytest.mark.parametrize('name', ['microban_1.xsb', 'microban_3.xsb', 'microban_5.xsb'])
+def test_idastar_matches_astar_pushes(name, table_memory, monkeypatch):
+    tables = []
+
+    def recorded(memory_limit):
+        table = TranspositionTable(memory_limit)
+        tables.append(table)
+        return table
+    monkeypatch.setattr(solver_module, 'TranspositionTable', recorded)
+    map = load_test_map(name)
+    astar = Solver(GameState(map), 'astar', 'push')
+    astar.solve()
+    idastar = Solver(GameState(map), 'idastar', 'push', table_memory=table_memory)
+    idastar.solve()
+    final, pushes = replay(GameState(map), idastar.solution)
+    assert final.check_solved()
+    assert pushes == replay(GameState(map), astar.solution)[1]
+    # The table never grows past the size its memory limit set
+    table, = tables
+    assert len(table.keys) == len(table.costs) == len(table.stamps) == table.size
+    assert table.size == max(1, table_memory * 1024 * 1024 // ENTRY_SIZE)
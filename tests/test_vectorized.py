@@ -0,0 +1,75 @@
+import pytest
+
+from conftest import load_test_map
+from modules.game_state import GameState
+from modules.replay import replay
+from modules.solver import Solver
+
+np = pytest.importorskip('numpy')
+
+from modules import vectorized  # noqa: E402
+
+
+@pytest.mark.parametrize('name', ['microban_1.xsb', 'microban_3.xsb', 'microban_4.xsb'])
+@pytest.mark.parametrize('mode', ['move', 'push'])
+def test_batched_astar_is_as_short_as_astar(name, mode, monkeypatch):
+    # Expand every chunk and update every batch of assignments with the array code
+    monkeypatch.setattr(vectorized, 'BATCH_EXPAND', 1)
+    monkeypatch.setattr(vectorized, 'BATCH_REASSIGN', 1)
+    map = load_test_map(name)
+    serial = Solver(GameState(map), 'astar', mode)
+    serial.solve()
+    batched = Solver(GameState(map), 'astar', mode, batch_size=16)
+    batched.solve()
+    final, pushes = replay(GameState(map), batched.solution)
+    assert final.check_solved()
+    if mode == 'move':
+        assert len(batched.solution) == len(serial.solution)
+    else:
+        assert pushes == replay(GameState(map), serial.solution)[1]
+
+
+def test_batched_assignments_match_the_serial_ones(monkeypatch):
+    monkeypatch.setattr(vectorized, 'BATCH_EXPAND', 1)
+    monkeypatch.setattr(vectorized, 'BATCH_REASSIGN', 1)
+    checked = []
+    reassign = vectorized.BatchExpander.reassign
+
+    def check(self, pending):
+        reassign(self, pending)
+        for parent, child in pending:
+            batched = (child.h, child.heuristic_data)
+            child.h = child.heuristic_data = None
+            self.heuristic.evaluate(child, parent)
+            assert (child.h, child.heuristic_data) == batched
+            checked.append(child)
+
+    monkeypatch.setattr(vectorized.BatchExpander, 'reassign', check)
+    Solver(GameState(load_test_map('original_1.xsb')), 'astar', 'push', batch_size=16).solve()
+    assert checked
+
+
+@pytest.mark.parametrize('name', ['original_1.xsb', 'microban_3.xsb', 'microban_5.xsb'])
+@pytest.mark.parametrize('batch_expand', [1, vectorized.BATCH_EXPAND])
+def test_batched_astar_expands_no_more_than_astar(name, batch_expand, monkeypatch):
+    monkeypatch.setattr(vectorized, 'BATCH_EXPAND', batch_expand)
+    map = load_test_map(name)
+    serial = Solver(GameState(map), 'astar', 'push')
+    serial.solve()
+    for batch_size in (64, 256):
+        batched = Solver(GameState(map), 'astar', 'push', batch_size=batch_size)
+        batched.solve()
+        assert batched.expanded_states <= serial.expanded_states
+
+
+def test_batch_size_rejects_macros():
+    with pytest.raises(Exception):
+        Solver(GameState(load_test_map('microban_1.xsb')), 'astar', 'push', batch_size=16,
+               macros=True)
+
+
+def test_batched_astar_gives_up_on_an_unsolvable_start():
+    solver = Solver(GameState(load_test_map('demo4.txt')), 'astar', 'push', batch_size=16)
+    solver.solve()
+    assert solver.solution is None
+    assert solver.expanded_states == 0